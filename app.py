@@ -13,10 +13,37 @@ from config import (
     DARK_THEME,
 )
 import config
-from db import init_db, SessionLocal, get_user_by_email, create_user, add_log, get_followed_user_ids, User, Log, Follow
+from db import (
+    init_db,
+    SessionLocal,
+    ReadSessionLocal,
+    get_user_by_email,
+    create_user,
+    add_log,
+    bump_user_version,
+    record_goal_change,
+    add_excused_period,
+    cheer_log,
+    follow_user,
+    unfollow_user,
+    get_feed,
+    backfill_timeline,
+    drop_timeline_author,
+    User,
+    Goal,
+    ExcusedPeriod,
+)
 from utils.auth import hash_password, verify_password
 from charts import plot_12week_line, plot_calendar_heatmap
+from shared_cache import SharedCache
+from stats import daily_totals, logs_frame, load_goals, load_excused, user_stats
+from archive import logs_between, user_history
+import snapshot
 import api
+import images
+import jobs
+import memory
+from user_context import current_user
 
 
 # Display units for each activity
@@ -46,44 +73,97 @@ GOAL_UNITS = {
     "Reading": "pages/day",
 }
 
+RANK_WINDOWS = {"week": "This week", "month": "This month", "all": "All time"}
+
 
-def render_leaderboard():
+def render_leaderboard(viewer_ids=None):
+    """Main-streak board and activity rankings; ``viewer_ids`` (the viewer and who
+    they follow) turns on the Friends scope."""
     st.header("🏆 Leaderboard (Main Streak)")
-    users = db.query(User).all()
-    board = []
-    for u in users:
-        u_logs = db.query(Log).filter_by(user_id=u.id).all()
-        df_u = pd.DataFrame([
-            {"timestamp": l.timestamp, "activity": l.activity, "value": l.value}
-            for l in u_logs
-        ])
-        streak = 0
-        d = date.today()
-        while True:
-            ok = True
-            for act in ["Sleep", "Anki"]:
-                total = df_u[(df_u['timestamp'].dt.date == d) & (df_u['activity'] == act)]['value'].sum()
-                goal_val = next((g.target for g in u.goals if g.activity == act), 0)
-                if total < goal_val:
-                    ok = False
-            week_start = pd.Timestamp(d - timedelta(days=6)).normalize()
-            workout_total = df_u[(df_u['timestamp'] >= week_start) & (df_u['timestamp'] < pd.Timestamp(d + timedelta(days=1))) & (df_u['activity'] == "Running")]['value'].sum()
-            workout_goal = next((g.target for g in u.goals if g.activity == "Running"), 0)
-            if not ok or workout_total < workout_goal:
-                break
-            streak += 1
-            d -= timedelta(days=1)
-        board.append({"User": u.name or u.email, "MainStreak": streak})
-    df_board = pd.DataFrame(board).sort_values("MainStreak", ascending=False)
-    st.table(df_board.head(10))
+    today = date.today()
+    board = cache.cached(
+        "leaderboard", today.isoformat(), lambda: get_warm_state().board(read_db, today), config.AGGREGATE_CACHE_TTL
+    )
+    st.table(pd.DataFrame(board, columns=["User", "MainStreak"]).head(10))
+
+    st.subheader("Activity Rankings")
+    col_act, col_win, col_scope = st.columns(3)
+    act = col_act.selectbox("Activity", ACTIVITIES, key="rank_activity")
+    window = col_win.radio("Period", list(RANK_WINDOWS), format_func=RANK_WINDOWS.get, key="rank_window")
+    scopes = ["Everyone", "Friends"] if viewer_ids else ["Everyone"]
+    scope = col_scope.radio("Show", scopes, key="rank_scope")
+    rankings = get_rankings()
+    rankings.refresh(read_db)
+    if scope == "Friends":
+        rows = rankings.among(act, window, viewer_ids)
+    else:
+        rows = rankings.top(act, window, k=10)
+    if not rows:
+        st.write("No logs for this period yet.")
+        return
+    names = user_names()
+    st.table(pd.DataFrame(
+        [{"Rank": i, "User": names.get(uid, uid), f"Total ({UNITS.get(act, 'units')})": score}
+         for i, (uid, score) in enumerate(rows, start=1)]
+    ).set_index("Rank"))
+
+
+def user_names():
+    """``{user id: display name}`` for everyone, cached until a sign-up bumps "users"."""
+    rows = cache.cached(
+        "users", "directory", lambda: [(u.id, u.name or u.email) for u in db.query(User).order_by(User.id)], 300
+    )
+    return dict(rows)
+
+
+def invalidate_user(user_id):
+    """Drop shared aggregates that depend on ``user_id``'s logs or goals."""
+    cache.bump(f"user:{user_id}")
+    cache.bump("leaderboard")
 
 def logout():
     if st.sidebar.button("Logout"):
         st.session_state.clear()
-        st.experimental_rerun()
+        st.rerun()
+
+@st.cache_resource
+def get_warm_state():
+    # One per worker process, restored from the last snapshot so a machine
+    # started from zero doesn't rebuild rankings and streaks from every log
+    state = snapshot.restore(read_db)
+    snapshot.start_autosave(state)
+    return state
+
+
+def get_rankings():
+    # refresh() keeps it in step with every worker's writes
+    return get_warm_state().rankings
+
+@st.cache_resource
+def start_job_workers():
+    queue = jobs.get_queue()
+    queue.start()
+    return queue
+
+
+def rerun_session(key, factory):
+    # A session and its transaction reference each other, so an abandoned one
+    # holds its pooled connection until the cycle collector runs; close the
+    # previous rerun's explicitly
+    previous = st.session_state.pop(key, None)
+    if previous is not None:
+        previous.close()
+    st.session_state[key] = session = factory()
+    return session
+
 
 init_db()
-db = SessionLocal()
+db = rerun_session("_db", SessionLocal)
+read_db = rerun_session("_read_db", ReadSessionLocal)
+memory.check()
+cache = SharedCache()
+if config.JOB_QUEUE_ENABLED:
+    start_job_workers()
 os.makedirs("uploads", exist_ok=True)
 port = int(os.environ.get("PORT", 8501))
 
@@ -140,8 +220,9 @@ if "email" not in st.session_state:
                     st.error("An account with this email already exists.")
                 else:
                     create_user(db, email.lower().strip(), name.strip(), hash_password(password))
+                    cache.bump("users")
                     st.success("Account created! Please log in.")
-                    st.experimental_rerun()
+                    st.rerun()
     else:
         st.title("🔒 Please Log In")
         with st.form("login_form"):
@@ -159,58 +240,88 @@ if "email" not in st.session_state:
                         st.error("Invalid email or password")
                     else:
                         st.session_state['email'] = user.email
-                        st.experimental_rerun()
+                        st.rerun()
     st.header("🏆 Leaderboard")
     render_leaderboard()
     st.stop()
 
 email = st.session_state['email']
-user = get_user_by_email(db, email)
+# Loaded once per session; reruns only check the user's version counter
+user = current_user(db, email, st.session_state)
+if user is None:  # account deleted since login
+    st.session_state.clear()
+    st.rerun()
 
 st.sidebar.write(f"Logged in as: **{user.name or email}**")
 logout()
 
 st.sidebar.subheader("Your Goals")
-for goal in user.goals:
-    unit_label = GOAL_UNITS.get(goal.activity, "units/week")
+goals_changed = False
+goals = dict(user.goals)
+for activity, target in user.goals.items():
+    unit_label = GOAL_UNITS.get(activity, "units/week")
     if unit_label.endswith("/day"):
-        step = 0.5 if "hours" in unit_label else 1
+        step = 0.5 if "hours" in unit_label else 1.0
         new_target = st.sidebar.number_input(
-            f"{goal.activity} ({unit_label})",
-            min_value=0.0 if step == 0.5 else 0,
-            value=float(goal.target),
+            f"{activity} ({unit_label})",
+            min_value=0.0,
+            value=float(target),
             step=step,
         )
     else:
         step = 1
         new_target = st.sidebar.number_input(
-            f"{goal.activity} ({unit_label})",
+            f"{activity} ({unit_label})",
             min_value=0,
-            value=int(goal.target),
+            value=int(target),
             step=step,
         )
-    goal.target = new_target
+    if new_target != target:
+        record_goal_change(db, user.id, activity, target, new_target)
+        db.query(Goal).filter_by(user_id=user.id, activity=activity).update({Goal.target: new_target})
+        goals[activity] = new_target
+        goals_changed = True
+if goals_changed:
+    bump_user_version(db, user.id)
 db.commit()
+if goals_changed:
+    invalidate_user(user.id)
+
+with st.sidebar.expander("Excused Days"):
+    st.caption("Declared days off don't break your streaks.")
+    excuse_range = st.date_input("Days", (date.today(), date.today()), key="excuse_range")
+    excuse_reason = st.selectbox("Reason", config.EXCUSE_REASONS, key="excuse_reason")
+    if st.button("Excuse these days") and len(excuse_range) == 2:
+        add_excused_period(db, user.id, excuse_range[0], excuse_range[1], excuse_reason)
+        db.commit()
+        invalidate_user(user.id)
+        st.success("Excused days saved.")
+    periods = (
+        db.query(ExcusedPeriod)
+        .filter(ExcusedPeriod.user_id == user.id, ExcusedPeriod.end_date >= date.today() - timedelta(days=90))
+        .order_by(ExcusedPeriod.start_date.desc())
+    )
+    for period in periods:
+        st.write(f"{period.start_date} – {period.end_date}: {period.reason}")
 
 st.sidebar.markdown("***")
 
 st.sidebar.subheader("Follow Others")
-all_users = db.query(User).all()
-followed_ids = {f.followed_id for f in user.following}
-for other in all_users:
-    if other.id == user.id:
+names = user_names()
+for other_id, other_name in names.items():
+    if other_id == user.id:
         continue
-    key = f"follow_{other.id}"
-    if st.sidebar.checkbox(f"{other.name or other.email}", value=(other.id in followed_ids), key=key):
-        if other.id not in followed_ids:
-            user.following.append(Follow(follower=user, followed=other))
-            db.commit()
+    key = f"follow_{other_id}"
+    if st.sidebar.checkbox(other_name, value=(other_id in user.followed_ids), key=key):
+        if other_id not in user.followed_ids:
+            follow_user(db, db.get(User, user.id), db.get(User, other_id))
+            if config.FEED_FANOUT:
+                backfill_timeline(db, user.id, other_id)
     else:
-        if other.id in followed_ids:
-            follow_obj = db.query(Follow).filter_by(follower_id=user.id, followed_id=other.id).first()
-            if follow_obj:
-                db.delete(follow_obj)
-                db.commit()
+        if other_id in user.followed_ids:
+            if unfollow_user(db, user.id, other_id):
+                if config.FEED_FANOUT:
+                    drop_timeline_author(db, user.id, other_id)
 
 
 tabs = st.tabs(["📝 Log", "📊 Dashboard", "💬 Feed", "📜 History", "🏆 Leaderboard"])
@@ -246,81 +357,30 @@ with tabs[0]:
             with open(proof_path, "wb") as f:
                 f.write(proof.getbuffer())
             add_log(db, user, activity, value, timestamp, proof_path, distance)
+            if not config.JOB_QUEUE_ENABLED:
+                images.submit(proof_path)
+            invalidate_user(user.id)
             st.success("Activity logged!")
-            st.experimental_rerun()
+            st.rerun()
 
 with tabs[1]:
     st.header("Dashboard")
-    logs = db.query(Log).filter_by(user_id=user.id).all()
-    df_logs = pd.DataFrame([
-        {
-            "timestamp": log.timestamp,
-            "activity": log.activity,
-            "value": log.value,
-            "distance": log.distance,
-        }
-        for log in logs
-    ])
     today = date.today()
-    compliance = {}
-    streaks = {}
-    for act in ["Sleep", "Meditation", "Anki", "Journaling", "Reading"]:
-        count_met = 0
-        s = 0
-        d = today
-        for i in range(7):
-            total = df_logs[
-                (df_logs['timestamp'].dt.date == d - timedelta(days=i)) &
-                (df_logs['activity'] == act)
-            ]['value'].sum()
-            goal_val = next((g.target for g in user.goals if g.activity == act), 0)
-            if total >= goal_val:
-                count_met += 1
-            if total >= goal_val and s == i:
-                s += 1
-        compliance[act] = round(count_met / 7 * 100, 1)
-        streaks[act] = s
-    for act in ["Running", "Walking", "Cycling", "Strength Training", "Yoga"]:
-        weekly_totals = []
-        for w in range(12):
-            start = pd.Timestamp(today - timedelta(days=7*w + 6)).normalize()
-            end = pd.Timestamp(today - timedelta(days=7*w)).normalize()
-            total = df_logs[
-                (df_logs['timestamp'] >= start) & (df_logs['timestamp'] < end) &
-                (df_logs['activity'] == act)
-            ]['value'].sum()
-            weekly_totals.append(total)
-        met_weeks = sum(1 for total in weekly_totals if total >= next((g.target for g in user.goals if g.activity == act), 0))
-        compliance[act] = round(met_weeks / 12 * 100, 1)
-        s = 0
-        for total in weekly_totals:
-            if total >= next((g.target for g in user.goals if g.activity == act), 0):
-                s += 1
-            else:
-                break
-        streaks[act] = s
-    main_streak = 0
-    day = today
-    while True:
-        daily_ok = all(
-            df_logs[
-                (df_logs['timestamp'].dt.date == day) &
-                (df_logs['activity'] == act)
-            ]['value'].sum() >= next((g.target for g in user.goals if g.activity == act), 0)
-            for act in ["Sleep", "Anki"]
-        )
-        weekly_start = pd.Timestamp(day - timedelta(days=6)).normalize()
-        weekly_total = df_logs[
-            (df_logs['timestamp'] >= weekly_start) &
-            (df_logs['timestamp'] < pd.Timestamp(day + timedelta(days=1))) &
-            (df_logs['activity'] == "Running")
-        ]['value'].sum()
-        workout_goal = next((g.target for g in user.goals if g.activity == "Running"), 0)
-        if daily_ok and weekly_total >= workout_goal:
-            main_streak += 1
-            day -= timedelta(days=1)
-        else:
-            break
+    # Charts only need the hot window; streaks also read archived daily totals
+    window_start = datetime.combine(today - timedelta(weeks=12), time.min)
+    df_logs = logs_frame(logs_between(db, window_start, datetime.combine(today + timedelta(days=1), time.min), user.id))
+    compliance, streaks, main_streak = cache.cached(
+        f"user:{user.id}",
+        f"dashboard:{today.isoformat()}",
+        lambda: user_stats(
+            # Streaks only need daily totals; summing them in SQL skips loading every log
+            daily_totals(db, user.id) if config.MEMORY_BUDGET else logs_frame(user_history(db, user.id)),
+            load_goals(db, [user.id])[user.id],
+            today,
+            load_excused(db, [user.id])[user.id],
+        ),
+        config.AGGREGATE_CACHE_TTL,
+    )
     st.metric("Main 🔥 Streak (days)", main_streak)
     cols = st.columns(len(ACTIVITIES))
     for idx, act in enumerate(ACTIVITIES):
@@ -328,7 +388,7 @@ with tabs[1]:
         st_val = streaks.get(act, 0)
         cols[idx].metric(act, f"{pct}%", f"{st_val} 🔥")
     if not df_logs.empty:
-        line_chart = plot_12week_line(df_logs, {g.activity: g.target for g in user.goals})
+        line_chart = plot_12week_line(df_logs, goals)
         st.altair_chart(line_chart, use_container_width=True)
         heatmap = plot_calendar_heatmap(df_logs)
         st.altair_chart(heatmap, use_container_width=False)
@@ -337,49 +397,46 @@ with tabs[1]:
 
 with tabs[2]:
     st.header("Social Feed")
-    follow_ids = get_followed_user_ids(db, user) + [user.id]
-    feed_logs = db.query(Log).filter(Log.user_id.in_(follow_ids)).order_by(Log.timestamp.desc()).limit(20).all()
+    feed_logs = get_feed(read_db, user.id, user.followed_ids, limit=20)
     if not feed_logs:
         st.write("No recent activity to show.")
     else:
         for log in feed_logs:
-            log_user = db.query(User).get(log.user_id)
             with st.container():
-                st.subheader(f"{log_user.name or log_user.email} - {log.activity}")
+                st.subheader(f"{names.get(log.user_id, log.user_id)} - {log.activity}")
                 unit = UNITS.get(log.activity, "units")
                 val_str = f"{log.value} {unit}"
                 if log.distance is not None:
                     val_str += f", {log.distance} km"
                 st.write(f"Value: {val_str}")
                 if log.proof_url:
-                    st.image(log.proof_url, caption="Proof", use_column_width=True)
+                    st.image(images.display_path(log.proof_url), caption="Proof", use_column_width=True)
                 cheers_key = f"cheer_{log.id}"
                 if st.button(f"🙌 Cheer ({log.cheers})", key=cheers_key):
-                    log.cheers += 1
-                    db.commit()
-                    st.experimental_rerun()
+                    cheer_log(db, log, user.id)
+                    st.rerun()
 
 with tabs[3]:
     st.header("History")
     sel_date = st.date_input("Select Date", date.today())
-    hist_logs = db.query(Log).filter(
-        (Log.timestamp >= datetime.combine(sel_date, time.min)) &
-        (Log.timestamp < datetime.combine(sel_date + timedelta(days=1), time.min))
-    ).all()
+    hist_logs = logs_between(
+        read_db,
+        datetime.combine(sel_date, time.min),
+        datetime.combine(sel_date + timedelta(days=1), time.min),
+    )
     if not hist_logs:
         st.write("No logs on this date.")
     else:
         for log in hist_logs:
-            u = db.query(User).get(log.user_id)
-            st.subheader(f"{u.name or u.email} - {log.activity}")
+            st.subheader(f"{names.get(log.user_id, log.user_id)} - {log.activity}")
             unit = UNITS.get(log.activity, "units")
             val_str = f"{log.value} {unit}"
             if log.distance is not None:
                 val_str += f", {log.distance} km"
             st.write(f"Value: {val_str}")
             if log.proof_url:
-                st.image(log.proof_url, use_column_width=True)
+                st.image(images.display_path(log.proof_url), use_column_width=True)
             st.write(f"Cheers: {log.cheers}")
 
 with tabs[4]:
-    render_leaderboard()
+    render_leaderboard([user.id, *user.followed_ids])
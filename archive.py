@@ -0,0 +1,185 @@
+# archive.py
+"""Hot/cold tiers for ``Log`` rows.
+
+Logs older than ``config.ARCHIVE_HORIZON_DAYS`` are moved out of the ``logs``
+table into ``log_archive``: one zlib-compressed JSON partition per user and
+month.  Their per-day activity totals go to ``daily_rollups`` so lifetime
+streaks still see the whole history.  ``logs_between`` reads the cold tier only
+when the requested range reaches an archived month.
+
+Run periodically (e.g. daily from cron)::
+
+    python archive.py [--horizon-days N]
+"""
+
+import argparse
+import json
+import zlib
+from datetime import date, datetime, time, timedelta
+from types import SimpleNamespace
+
+from sqlalchemy import func
+
+import config
+from db import SessionLocal, Log, LogArchive, DailyRollup, FeedEntry, init_db
+
+_FIELDS = ("id", "user_id", "activity", "value", "distance", "timestamp", "proof_url", "cheers")
+# Keep ``IN (...)`` lists well under SQLite's bound-parameter limit
+_DELETE_BATCH = 500
+
+
+def _month_start(d: date) -> datetime:
+    return datetime(d.year, d.month, 1)
+
+
+def _next_month(d: datetime) -> datetime:
+    return datetime(d.year + d.month // 12, d.month % 12 + 1, 1)
+
+
+def _row(log) -> list:
+    row = [getattr(log, field) for field in _FIELDS]
+    row[_FIELDS.index("timestamp")] = log.timestamp.isoformat()
+    return row
+
+
+def _pack(rows) -> bytes:
+    return zlib.compress(json.dumps(rows, separators=(",", ":")).encode(), 6)
+
+
+def _unpack(payload: bytes):
+    for row in json.loads(zlib.decompress(payload)):
+        row = dict(zip(_FIELDS, row))
+        row["timestamp"] = datetime.fromisoformat(row["timestamp"])
+        yield SimpleNamespace(**row)
+
+
+def _archive_month(db_session, user_id: int, start: datetime, end: datetime) -> int:
+    logs = (
+        db_session.query(Log)
+        .filter(Log.user_id == user_id, Log.timestamp >= start, Log.timestamp < end)
+        .order_by(Log.timestamp)
+        .all()
+    )
+    if not logs:
+        return 0
+    rows = [_row(log) for log in logs]
+    month = start.strftime("%Y-%m")
+    partition = db_session.query(LogArchive).filter_by(user_id=user_id, month=month).first()
+    if partition is None:
+        partition = LogArchive(user_id=user_id, month=month, row_count=0)
+        db_session.add(partition)
+    else:
+        # A later run with a mid-month cutoff appends to the same partition
+        rows = [_row(r) for r in _unpack(partition.payload)] + rows
+    partition.payload = _pack(rows)
+    partition.row_count = len(rows)
+
+    rollups = {
+        (r.day, r.activity): r
+        for r in db_session.query(DailyRollup).filter(
+            DailyRollup.user_id == user_id,
+            DailyRollup.day >= start.date(),
+            DailyRollup.day < end.date(),
+        )
+    }
+    for log in logs:
+        key = (log.timestamp.date(), log.activity)
+        rollup = rollups.get(key)
+        if rollup is None:
+            rollup = rollups[key] = DailyRollup(
+                user_id=user_id, day=key[0], activity=log.activity, total=0.0, count=0
+            )
+            db_session.add(rollup)
+        rollup.total += log.value or 0
+        rollup.count += 1
+
+    ids = [log.id for log in logs]
+    for i in range(0, len(ids), _DELETE_BATCH):
+        batch = ids[i:i + _DELETE_BATCH]
+        db_session.query(FeedEntry).filter(FeedEntry.log_id.in_(batch)).delete(synchronize_session=False)
+        db_session.query(Log).filter(Log.id.in_(batch)).delete(synchronize_session=False)
+    db_session.commit()
+    return len(logs)
+
+
+def archive_logs(db_session, horizon_days: int = None, today: date = None) -> int:
+    """Move logs older than the horizon into the cold tier; return how many moved.
+
+    Each user-month is archived and deleted from ``logs`` in its own
+    transaction, so an interrupted run leaves no log in both tiers.
+    """
+    horizon = config.ARCHIVE_HORIZON_DAYS if horizon_days is None else horizon_days
+    cutoff = datetime.combine((today or date.today()) - timedelta(days=horizon), time.min)
+    oldest = dict(
+        db_session.query(Log.user_id, func.min(Log.timestamp))
+        .filter(Log.timestamp < cutoff)
+        .group_by(Log.user_id)
+        .all()
+    )
+    moved = 0
+    for user_id, first in oldest.items():
+        start = _month_start(first)
+        while start < cutoff:
+            end = min(_next_month(start), cutoff)
+            moved += _archive_month(db_session, user_id, start, end)
+            start = _next_month(start)
+    return moved
+
+
+def archived_through(db_session):
+    """Latest archived month as ``"YYYY-MM"``, or ``None`` if nothing is archived."""
+    return db_session.query(func.max(LogArchive.month)).scalar()
+
+
+def logs_between(db_session, start: datetime, end: datetime, user_id: int = None):
+    """Logs with ``start <= timestamp < end`` from both tiers, oldest first.
+
+    Hot rows are ``Log`` objects; archived rows are read-only objects with the
+    same attributes.
+    """
+    query = db_session.query(Log).filter(Log.timestamp >= start, Log.timestamp < end)
+    if user_id is not None:
+        query = query.filter(Log.user_id == user_id)
+    logs = query.all()
+    last = archived_through(db_session)
+    if last is not None and start.strftime("%Y-%m") <= last:
+        cold = db_session.query(LogArchive).filter(
+            LogArchive.month >= start.strftime("%Y-%m"),
+            LogArchive.month <= (end - timedelta(microseconds=1)).strftime("%Y-%m"),
+        )
+        if user_id is not None:
+            cold = cold.filter(LogArchive.user_id == user_id)
+        for partition in cold:
+            logs.extend(r for r in _unpack(partition.payload) if start <= r.timestamp < end)
+        logs.sort(key=lambda log: log.timestamp)
+    return logs
+
+
+def rollup_as_log(rollup: DailyRollup):
+    """A day's archived total in the shape ``stats.logs_frame`` expects."""
+    return SimpleNamespace(
+        user_id=rollup.user_id,
+        timestamp=datetime.combine(rollup.day, time.min),
+        activity=rollup.activity,
+        value=rollup.total,
+        distance=None,
+    )
+
+
+def user_history(db_session, user_id: int):
+    """Hot logs plus archived daily totals for one user, for streak calculations."""
+    rollups = db_session.query(DailyRollup).filter_by(user_id=user_id).order_by(DailyRollup.day)
+    return [rollup_as_log(r) for r in rollups] + db_session.query(Log).filter_by(user_id=user_id).all()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Move old logs into the compressed archive tier.")
+    parser.add_argument("--horizon-days", type=int, default=config.ARCHIVE_HORIZON_DAYS)
+    args = parser.parse_args()
+    init_db()
+    session = SessionLocal()
+    try:
+        count = archive_logs(session, args.horizon_days)
+        print(f"Archived {count} logs older than {args.horizon_days} days (through {archived_through(session)})")
+    finally:
+        session.close()
@@ -0,0 +1,373 @@
+# backup.py
+"""Online backups of the SQLite database and the ``uploads/`` volume.
+
+Copying ``habits.db`` while the app runs can capture a half-applied
+transaction, so the database is copied with SQLite's online backup API
+instead: ``BACKUP_PAGES_PER_STEP`` pages at a time, sleeping
+``BACKUP_STEP_SLEEP`` seconds between steps so writers get the lock in
+between.  The copy is integrity-checked and stored gzip-compressed.
+
+Uploads are stored by content: each file is zlib-compressed into
+``objects/<sha256>`` once, and a snapshot only lists ``path -> hash``, so a
+backup copies only proofs that are new since the last one.  Files whose size
+and mtime match the previous snapshot aren't even re-hashed.
+
+Layout under ``config.BACKUP_DIR``::
+
+    objects/ab/ab12...          compressed upload contents, shared by snapshots
+    snapshots/20260101T030000123456Z/
+        habits.db.gz
+        manifest.json           database hash and counts, uploads, metrics
+
+The database is copied before uploads are listed, so every proof the
+snapshot's logs refer to is in it.  Usage::
+
+    python backup.py [create] [--uploads DIR]
+    python backup.py list
+    python backup.py verify [SNAPSHOT]
+    python backup.py restore SNAPSHOT --db PATH --uploads DIR
+    python backup.py prune [--keep N]
+"""
+
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+import zlib
+from datetime import datetime
+from pathlib import Path
+
+from sqlalchemy.engine import make_url
+
+import config
+
+_CHUNK = 1 << 20
+# Row counts recorded in the manifest and compared on verify
+_COUNTED_TABLES = ("users", "logs", "log_archive")
+# Writes during a stepped copy restart it; past this many, copy in one step
+_MAX_RESTARTS = 100
+_BUSY = (5, 6)  # SQLITE_BUSY, SQLITE_LOCKED: sqlite3 sleeps and retries itself
+
+
+def sqlite_path(url: str = None) -> str:
+    """The database file behind ``url`` (``config.DATABASE_URL`` by default)."""
+    url = make_url(url or config.DATABASE_URL)
+    if url.get_backend_name() != "sqlite" or not url.database or url.database == ":memory:":
+        raise ValueError(f"online backups need a SQLite file database, not {url.render_as_string()}; "
+                         "use the server's own tools (e.g. pg_dump) for PostgreSQL")
+    return url.database
+
+
+def _sha256_file(path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(_CHUNK), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _table_counts(conn) -> dict:
+    tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    return {name: conn.execute(f'SELECT COUNT(*) FROM "{name}"').fetchone()[0]
+            for name in _COUNTED_TABLES if name in tables}
+
+
+def _integrity_ok(conn) -> bool:
+    return conn.execute("PRAGMA integrity_check").fetchone()[0] == "ok"
+
+
+class _TooManyRestarts(Exception):
+    pass
+
+
+def copy_database(src_path: str, dest_path: str, pages: int = None, sleep: float = None) -> dict:
+    """Online-copy ``src_path`` to ``dest_path`` in page steps; return timing metrics.
+
+    Each step holds a read lock on the source only while copying its own
+    pages, so ``max_step_ms`` bounds how long a writer can wait on the
+    backup.  SQLite restarts the copy when another connection writes to the
+    source mid-way (``restarts``); after ``_MAX_RESTARTS`` of those the
+    database is copied in one step instead (``single_step``), which briefly
+    holds writers off but always finishes.
+    """
+    pages = pages or config.BACKUP_PAGES_PER_STEP
+    sleep = config.BACKUP_STEP_SLEEP if sleep is None else sleep
+    steps = []
+    state = {"last": 0.0, "remaining": None, "restarts": 0, "total": 0}
+
+    def progress(status, remaining, total):
+        steps.append(time.perf_counter() - state["last"])
+        if state["remaining"] is not None and remaining > state["remaining"]:
+            state["restarts"] += 1
+            if state["restarts"] > _MAX_RESTARTS:
+                raise _TooManyRestarts
+        state["remaining"] = remaining
+        state["total"] = total
+        # sqlite3's own ``sleep`` only follows a busy step; pause after the
+        # others too so writers get the lock between every step
+        if remaining and status not in _BUSY:
+            time.sleep(sleep)
+        state["last"] = time.perf_counter()
+
+    started = time.perf_counter()
+    single_step = False
+    # No busy timeout: a step that finds a writer returns at once and is retried
+    src = sqlite3.connect(f"file:{src_path}?mode=ro", uri=True, timeout=0)
+    dest = sqlite3.connect(dest_path)
+    try:
+        state["last"] = time.perf_counter()
+        try:
+            src.backup(dest, pages=pages, progress=progress, sleep=sleep)
+        except _TooManyRestarts:
+            single_step = True
+            state["last"] = time.perf_counter()
+            src.backup(dest, pages=-1, progress=progress)
+        if not _integrity_ok(dest):
+            raise RuntimeError(f"integrity check failed on the copy of {src_path}")
+        counts = _table_counts(dest)
+        page_size = dest.execute("PRAGMA page_size").fetchone()[0]
+    finally:
+        dest.close()
+        src.close()
+    elapsed = time.perf_counter() - started
+    size = os.path.getsize(dest_path)
+    steps.sort()
+    return {
+        "pages": state["total"],
+        "bytes": size,
+        "page_size": page_size,
+        "counts": counts,
+        "seconds": round(elapsed, 3),
+        "mb_per_s": round(size / 2**20 / elapsed, 1) if elapsed else None,
+        "steps": len(steps),
+        "max_step_ms": round(steps[-1] * 1000, 2) if steps else 0.0,
+        "p95_step_ms": round(steps[int(0.95 * (len(steps) - 1))] * 1000, 2) if steps else 0.0,
+        "restarts": state["restarts"],
+        "single_step": single_step,
+    }
+
+
+class BackupStore:
+    """Snapshots and content-addressed upload objects under one directory."""
+
+    def __init__(self, root: str = None):
+        self.root = Path(root or config.BACKUP_DIR)
+        self.objects = self.root / "objects"
+        self.snapshots = self.root / "snapshots"
+
+    def _object_path(self, digest: str) -> Path:
+        return self.objects / digest[:2] / digest
+
+    def list(self) -> list:
+        """Snapshot names, oldest first."""
+        if not self.snapshots.exists():
+            return []
+        # Snapshots being written are hidden ``.name.*`` staging directories
+        return sorted(p.name for p in self.snapshots.iterdir()
+                      if not p.name.startswith(".") and (p / "manifest.json").exists())
+
+    def manifest(self, name: str) -> dict:
+        with open(self.snapshots / name / "manifest.json") as f:
+            return json.load(f)
+
+    def _put_object(self, path: Path, digest: str) -> int:
+        """Store ``path`` as object ``digest`` unless present; return bytes written."""
+        target = self._object_path(digest)
+        if target.exists():
+            return 0
+        target.parent.mkdir(parents=True, exist_ok=True)
+        data = zlib.compress(path.read_bytes(), 6)
+        fd, tmp = tempfile.mkstemp(dir=target.parent)
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, target)
+        return len(data)
+
+    def _snapshot_uploads(self, uploads_dir: Path, previous: dict) -> tuple:
+        files, stats = {}, {"files": 0, "new_objects": 0, "bytes_read": 0, "bytes_written": 0, "hashed": 0}
+        started = time.perf_counter()
+        if uploads_dir.exists():
+            for path in sorted(p for p in uploads_dir.rglob("*") if p.is_file()):
+                rel = path.relative_to(uploads_dir).as_posix()
+                st = path.stat()
+                known = previous.get(rel)
+                if known and known["size"] == st.st_size and known["mtime_ns"] == st.st_mtime_ns:
+                    digest = known["sha256"]
+                else:
+                    digest = _sha256_file(path)
+                    stats["hashed"] += 1
+                    stats["bytes_read"] += st.st_size
+                written = self._put_object(path, digest)
+                if written:
+                    stats["new_objects"] += 1
+                    stats["bytes_written"] += written
+                files[rel] = {"sha256": digest, "size": st.st_size, "mtime_ns": st.st_mtime_ns}
+                stats["files"] += 1
+        elapsed = time.perf_counter() - started
+        stats["seconds"] = round(elapsed, 3)
+        stats["files_per_s"] = round(stats["files"] / elapsed, 1) if elapsed else None
+        return files, stats
+
+    def create(self, db_path: str = None, uploads_dir: str = "uploads") -> str:
+        """Take a snapshot; return its name."""
+        db_path = db_path or sqlite_path()
+        self.snapshots.mkdir(parents=True, exist_ok=True)
+        # Microseconds keep back-to-back runs apart; _publish handles a clash anyway
+        name = datetime.utcnow().strftime("%Y%m%dT%H%M%S%fZ")
+        staging = Path(tempfile.mkdtemp(prefix=f".{name}.", dir=self.snapshots))
+        try:
+            raw = staging / "habits.db"
+            db_stats = copy_database(db_path, str(raw))
+            db_hash = _sha256_file(raw)
+            with open(raw, "rb") as src, gzip.open(staging / "habits.db.gz", "wb", compresslevel=6) as dest:
+                shutil.copyfileobj(src, dest, _CHUNK)
+            raw.unlink()
+            db_stats["compressed_bytes"] = (staging / "habits.db.gz").stat().st_size
+
+            previous = self.manifest(self.list()[-1])["uploads"] if self.list() else {}
+            files, upload_stats = self._snapshot_uploads(Path(uploads_dir), previous)
+            manifest = {
+                "created_at": datetime.utcnow().isoformat(),
+                "source": os.path.abspath(db_path),
+                "database": {"file": "habits.db.gz", "sha256": db_hash, "counts": db_stats.pop("counts")},
+                "uploads": files,
+                "metrics": {"database": db_stats, "uploads": upload_stats},
+            }
+            with open(staging / "manifest.json", "w") as f:
+                json.dump(manifest, f, indent=1)
+            # A snapshot appears under its name only once complete
+            name = self._publish(staging, name)
+        except BaseException:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+        return name
+
+    def _publish(self, staging: Path, name: str) -> str:
+        """Rename ``staging`` to ``name``, or to ``name-1``, ``name-2``, ... if it is taken."""
+        candidate, n = name, 0
+        while True:
+            try:
+                os.rename(staging, self.snapshots / candidate)
+                return candidate
+            except OSError:
+                # Renaming onto a finished (non-empty) snapshot fails with ENOTEMPTY/EEXIST
+                if not (self.snapshots / candidate).exists():
+                    raise
+            n += 1
+            candidate = f"{name}-{n}"
+
+    def restore(self, name: str, db_path: str, uploads_dir: str) -> dict:
+        """Write snapshot ``name`` to ``db_path`` and ``uploads_dir``, checking every hash."""
+        manifest = self.manifest(name)
+        db_path = Path(db_path)
+        db_path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=db_path.parent, suffix=".restore")
+        with os.fdopen(fd, "wb") as dest, gzip.open(self.snapshots / name / manifest["database"]["file"]) as src:
+            shutil.copyfileobj(src, dest, _CHUNK)
+        if _sha256_file(tmp) != manifest["database"]["sha256"]:
+            os.unlink(tmp)
+            raise RuntimeError(f"{name}: database hash mismatch")
+        conn = sqlite3.connect(tmp)
+        try:
+            ok, counts = _integrity_ok(conn), _table_counts(conn)
+        finally:
+            conn.close()
+        if not ok or counts != manifest["database"]["counts"]:
+            os.unlink(tmp)
+            raise RuntimeError(f"{name}: restored database failed its integrity or row-count check")
+        os.replace(tmp, db_path)
+
+        uploads_dir = Path(uploads_dir)
+        for rel, info in manifest["uploads"].items():
+            data = zlib.decompress(self._object_path(info["sha256"]).read_bytes())
+            if hashlib.sha256(data).hexdigest() != info["sha256"]:
+                raise RuntimeError(f"{name}: object for {rel} is corrupt")
+            target = uploads_dir / rel
+            target.parent.mkdir(parents=True, exist_ok=True)
+            target.write_bytes(data)
+        return {"counts": counts, "files": len(manifest["uploads"])}
+
+    def verify(self, name: str = None) -> dict:
+        """Restore ``name`` (the latest by default) into a scratch directory and check it."""
+        name = name or self.list()[-1]
+        started = time.perf_counter()
+        with tempfile.TemporaryDirectory() as scratch:
+            result = self.restore(name, os.path.join(scratch, "habits.db"), os.path.join(scratch, "uploads"))
+        result.update(snapshot=name, seconds=round(time.perf_counter() - started, 3))
+        return result
+
+    def prune(self, keep: int = None) -> dict:
+        """Delete all but the newest ``keep`` snapshots and objects none of them use.
+
+        Don't run it during ``create``: a new snapshot's objects aren't
+        referenced until its manifest lands.
+        """
+        keep = config.BACKUP_KEEP if keep is None else keep
+        names = self.list()
+        doomed = names[:-keep] if keep else names
+        for name in doomed:
+            shutil.rmtree(self.snapshots / name)
+        live = {info["sha256"] for name in self.list() for info in self.manifest(name)["uploads"].values()}
+        removed = 0
+        if self.objects.exists():
+            for path in self.objects.glob("*/*"):
+                if path.name not in live:
+                    path.unlink()
+                    removed += 1
+        return {"snapshots": len(doomed), "objects": removed}
+
+
+def _print_metrics(name: str, manifest: dict):
+    db, up = manifest["metrics"]["database"], manifest["metrics"]["uploads"]
+    print(f"{name}: database {db['bytes'] / 2**20:.1f} MB ({db['pages']} pages) in {db['seconds']}s "
+          f"= {db['mb_per_s']} MB/s, {db['steps']} steps, longest {db['max_step_ms']} ms "
+          f"(p95 {db['p95_step_ms']} ms), {db['restarts']} restarts"
+          f"{' then one step' if db['single_step'] else ''}, "
+          f"{db['compressed_bytes'] / 2**20:.1f} MB compressed")
+    print(f"{name}: uploads {up['files']} files ({up['new_objects']} new, {up['hashed']} hashed) in "
+          f"{up['seconds']}s = {up['files_per_s']} files/s, {up['bytes_written'] / 2**20:.1f} MB written")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Online backups of the SQLite database and uploads.")
+    parser.add_argument("--dest", default=config.BACKUP_DIR, help="backup directory")
+    sub = parser.add_subparsers(dest="command")
+    create = sub.add_parser("create", help="take a snapshot (the default)")
+    create.add_argument("--db", help="SQLite file (default: from DATABASE_URL)")
+    create.add_argument("--uploads", default="uploads")
+    sub.add_parser("list", help="list snapshots")
+    verify = sub.add_parser("verify", help="trial-restore a snapshot and check hashes and row counts")
+    verify.add_argument("snapshot", nargs="?")
+    restore = sub.add_parser("restore", help="restore a snapshot")
+    restore.add_argument("snapshot")
+    restore.add_argument("--db", required=True)
+    restore.add_argument("--uploads", required=True)
+    prune = sub.add_parser("prune", help="drop old snapshots and unused objects")
+    prune.add_argument("--keep", type=int, default=config.BACKUP_KEEP)
+    args = parser.parse_args()
+    store = BackupStore(args.dest)
+
+    if args.command in (None, "create"):
+        try:
+            name = store.create(getattr(args, "db", None), getattr(args, "uploads", "uploads"))
+        except ValueError as exc:
+            sys.exit(str(exc))
+        _print_metrics(name, store.manifest(name))
+    elif args.command == "list":
+        for name in store.list():
+            manifest = store.manifest(name)
+            print(name, manifest["database"]["counts"], f"{len(manifest['uploads'])} uploads")
+    elif args.command == "verify":
+        if not store.list():
+            sys.exit("no snapshots")
+        print(json.dumps(store.verify(args.snapshot)))
+    elif args.command == "restore":
+        print(json.dumps(store.restore(args.snapshot, args.db, args.uploads)))
+    elif args.command == "prune":
+        print(json.dumps(store.prune(args.keep)))
@@ -0,0 +1,136 @@
+# benchmarks/cold_start.py
+"""Time to first leaderboard render from a cold process, with and without a snapshot.
+
+Each run starts a fresh interpreter (as a Fly.io machine waking from zero
+does) that imports the app's dependencies, runs ``init_db()``, restores
+``snapshot.WarmState`` and renders the main-streak board and the top
+rankings.  Runs:
+
+* ``no snapshot``: everything is rebuilt from the logs;
+* ``snapshot``: the snapshot matches the database;
+* ``snapshot + writes``: some users logged after the snapshot was saved, so
+  rankings catch up and only those users' streaks are recomputed.
+
+Run from the repository root::
+
+    python -m benchmarks.cold_start
+"""
+
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+from sqlalchemy import create_engine, insert, update
+from sqlalchemy.orm import sessionmaker
+
+from db import Base, User, Goal, Log, UserVersion
+
+USERS = 1000
+DAYS = 120
+CHANGED_USERS = 50
+
+# Runs in the child process; prints phase timings as JSON
+_PROBE = """
+import json, time
+t0 = time.perf_counter()
+import streamlit, pandas
+from datetime import date
+import db, snapshot
+t1 = time.perf_counter()
+db.init_db()
+session = db.ReadSessionLocal()
+t2 = time.perf_counter()
+state = snapshot.restore(session)
+t3 = time.perf_counter()
+board = state.board(session, date.today())
+top = state.rankings.top("Running", "month", k=10)
+t4 = time.perf_counter()
+if SAVE:
+    snapshot.save(state)
+print(json.dumps({"imports": t1 - t0, "init_db": t2 - t1, "restore": t3 - t2, "render": t4 - t3,
+                  "leader": board[0]["MainStreak"], "top": top[0][1] if top else None}))
+"""
+
+
+def _seed(url: str):
+    engine = create_engine(url)
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine)()
+    session.execute(insert(User), [
+        {"id": i, "email": f"user{i}@example.com", "name": f"user{i}", "hashed_password": ""}
+        for i in range(1, USERS + 1)
+    ])
+    session.execute(insert(Goal), [
+        {"user_id": i, "activity": act, "target": target}
+        for i in range(1, USERS + 1)
+        for act, target in (("Sleep", 7.0), ("Anki", 1.0), ("Running", 150))
+    ])
+    start = datetime.combine(date.today(), datetime.min.time()) - timedelta(days=DAYS)
+    session.execute(insert(Log), [
+        {"user_id": i, "activity": act, "value": value, "timestamp": start + timedelta(days=d, hours=12)}
+        for i in range(1, USERS + 1)
+        for d in range(i % DAYS, DAYS + 1)
+        for act, value in (("Sleep", 8.0), ("Anki", 5.0), ("Running", 30.0))
+    ])
+    session.execute(insert(UserVersion), [
+        {"user_id": i, "version": 1, "updated_at": datetime.utcnow()} for i in range(1, USERS + 1)
+    ])
+    session.commit()
+    return engine, session
+
+
+def _write_more(session):
+    """New logs for ``CHANGED_USERS`` users, bumping their versions as ``add_log`` callers do."""
+    now = datetime.now()
+    session.execute(insert(Log), [
+        {"user_id": i, "activity": "Running", "value": 45.0, "timestamp": now} for i in range(1, CHANGED_USERS + 1)
+    ])
+    session.execute(
+        update(UserVersion).where(UserVersion.user_id <= CHANGED_USERS).values(version=UserVersion.version + 1)
+    )
+    session.commit()
+
+
+def _cold_run(env: dict, save: bool = False) -> dict:
+    started = time.perf_counter()
+    out = subprocess.run(
+        [sys.executable, "-c", f"SAVE = {save}\n{_PROBE}"],
+        env=env, capture_output=True, text=True, check=True,
+    )
+    result = json.loads(out.stdout.strip().splitlines()[-1])
+    result["total"] = time.perf_counter() - started
+    return result
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        url = f"sqlite:///{Path(tmp) / 'bench.db'}"
+        _, session = _seed(url)
+        snapshot_path = Path(tmp) / "snapshot.pkl"
+        env = dict(os.environ, DATABASE_URL=url, DATABASE_REPLICA_URL="",
+                   SNAPSHOT_PATH=str(snapshot_path), PYTHONPATH=os.getcwd())
+        print(f"{USERS} users, {session.query(Log).count()} logs; each run is a fresh interpreter")
+        print(f"{'run':<20} {'imports':>8} {'init_db':>8} {'restore':>8} {'render':>8} {'total':>8}")
+        runs = [("no snapshot", True), ("snapshot", False), ("snapshot + writes", False)]
+        results = []
+        for name, save in runs:
+            if name == "snapshot + writes":
+                _write_more(session)
+            r = _cold_run(env, save)
+            results.append(r)
+            print(f"{name:<20} {r['imports']:>8.3f} {r['init_db']:>8.3f} {r['restore']:>8.3f} "
+                  f"{r['render']:>8.3f} {r['total']:>8.3f}")
+        print(f"snapshot size: {snapshot_path.stat().st_size / 1024:.0f} KiB")
+        # Warm runs must agree with a cold rebuild
+        snapshot_path.unlink()
+        check = _cold_run(env)
+        assert (check["leader"], check["top"]) == (results[-1]["leader"], results[-1]["top"]), (check, results[-1])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+# benchmarks/excused_streaks.py
+"""Main streaks with excused days over long histories: vectorized vs. a per-day walk.
+
+Generates users with ten years of logs and random excused ranges, then
+computes main streaks two ways and checks they agree:
+
+* ``WeeklyEngine.main_streaks`` with ``excused.masks``, as the apps do;
+* a reference that walks back day by day, testing each day against the
+  user's list of excused ranges.
+
+Run from the repository root::
+
+    python -m benchmarks.excused_streaks
+"""
+
+import random
+import time
+from datetime import date, timedelta
+
+import numpy as np
+
+from excused import Intervals, masks
+from weekly import WeeklyEngine
+
+USERS = 200
+YEARS = 10
+GOALS = np.array([7.0, 1.0, 150.0])  # Sleep, Anki daily; Running weekly
+DAILY, WEEKLY = [0, 1], [2]
+
+
+def _history(rng, today, n_days):
+    """Logs that mostly meet the goals, with occasional gaps, plus excused ranges."""
+    rows = []
+    for user in range(USERS):
+        miss_rate = rng.choice([0.0005, 0.002, 0.01])
+        for back in range(n_days):
+            day = today.toordinal() - back
+            if rng.random() < miss_rate:
+                continue
+            rows.append((user, 0, day, 8.0))
+            rows.append((user, 1, day, 5.0))
+            rows.append((user, 2, day, 25.0))
+    excused = []
+    for _ in range(USERS):
+        ranges = []
+        for _ in range(rng.randint(0, 40)):
+            start = today - timedelta(days=rng.randrange(n_days))
+            ranges.append((start, start + timedelta(days=rng.randint(0, 14))))
+        excused.append(ranges)
+    return rows, excused
+
+
+def reference_streak(daily_totals, ranges, today, n_days):
+    """Walk back from ``today``; excused days (checked against the list) are skipped."""
+    def is_excused(ordinal):
+        return any(s.toordinal() <= ordinal <= e.toordinal() for s, e in ranges)
+
+    end = today.toordinal()
+    streak = 0
+    for back in range(n_days):
+        day = end - back
+        if is_excused(day):
+            continue
+        if any(daily_totals[a][back] < GOALS[a] for a in DAILY):
+            break
+        week = range(back, min(back + 7, n_days))
+        excused_in_week = sum(is_excused(end - b) for b in week)
+        target = GOALS[2] * (1 - excused_in_week / 7)
+        if sum(daily_totals[2][b] for b in week) < target:
+            break
+        streak += 1
+    return streak
+
+
+def main():
+    rng = random.Random(0)
+    today = date.today()
+    n_days = 365 * YEARS
+    rows, excused = _history(rng, today, n_days)
+    users, acts, days, values = map(np.array, zip(*rows))
+    print(f"{USERS} users x {n_days} days, {len(rows)} logs, {sum(map(len, excused))} excused ranges")
+
+    started = time.perf_counter()
+    engine = WeeklyEngine.from_codes(users, acts, days, values, USERS, len(GOALS), today,
+                                     start=today - timedelta(days=n_days - 1), boundary="rolling")
+    index = [Intervals(ranges) for ranges in excused]
+    fast = engine.main_streaks(GOALS[None, :].repeat(USERS, 0), DAILY, WEEKLY,
+                               excused=masks(index, today, n_days))
+    fast_seconds = time.perf_counter() - started
+
+    totals = engine.day_totals(n_days)
+    started = time.perf_counter()
+    slow = [reference_streak(totals[u], excused[u], today, n_days) for u in range(USERS)]
+    slow_seconds = time.perf_counter() - started
+
+    mismatches = [(u, int(fast[u]), slow[u]) for u in range(USERS) if fast[u] != slow[u]]
+    assert not mismatches, mismatches[:10]
+    print(f"{'approach':<28} {'seconds':>8}")
+    print(f"{'interval index + engine':<28} {fast_seconds:>8.3f}")
+    print(f"{'per-day walk over a list':<28} {slow_seconds:>8.3f}")
+    print(f"streaks agree; longest {max(slow)}, median {int(np.median(slow))}")
+
+
+if __name__ == "__main__":
+    main()
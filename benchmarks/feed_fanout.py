@@ -0,0 +1,104 @@
+# benchmarks/feed_fanout.py
+"""Compare pull vs push (fan-out-on-write) feeds at different follower counts.
+
+Run from the repository root::
+
+    python -m benchmarks.feed_fanout
+"""
+
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+
+import config
+from db import Base, User, Log, Follow, FeedEntry, add_log, get_feed, get_followed_user_ids
+
+COUNTS = [10, 100, 1000, 5000]
+POSTS_PER_AUTHOR = 20
+READS = 50
+WRITES = 50
+
+
+def _session(path: Path):
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(bind=engine)
+    return sessionmaker(bind=engine)()
+
+
+def _seed(session, n_users: int):
+    session.execute(insert(User), [
+        {"id": i, "email": f"user{i}@example.com", "name": f"user{i}", "hashed_password": ""}
+        for i in range(1, n_users + 2)
+    ])
+    session.commit()
+
+
+def _bench_write(n_followers: int, fanout: bool) -> float:
+    """Mean seconds per ``add_log`` for an author with ``n_followers``."""
+    config.FEED_FANOUT = fanout
+    with tempfile.TemporaryDirectory() as tmp:
+        session = _session(Path(tmp) / "bench.db")
+        _seed(session, n_followers)
+        session.execute(insert(Follow), [
+            {"follower_id": i, "followed_id": 1} for i in range(2, n_followers + 2)
+        ])
+        session.commit()
+        author = session.get(User, 1)
+        start = time.perf_counter()
+        for i in range(WRITES):
+            add_log(session, author, "Running", 30, datetime.now() + timedelta(seconds=i))
+        return (time.perf_counter() - start) / WRITES
+
+
+def _bench_read(n_following: int, fanout: bool) -> float:
+    """Mean seconds per feed read for a viewer following ``n_following`` authors."""
+    config.FEED_FANOUT = fanout
+    with tempfile.TemporaryDirectory() as tmp:
+        session = _session(Path(tmp) / "bench.db")
+        _seed(session, n_following)
+        viewer_id = n_following + 1
+        session.execute(insert(Follow), [
+            {"follower_id": viewer_id, "followed_id": i} for i in range(1, n_following + 1)
+        ])
+        now = datetime.now()
+        session.execute(insert(Log), [
+            {"user_id": a, "activity": "Running", "value": 30.0, "timestamp": now - timedelta(minutes=a * POSTS_PER_AUTHOR + p)}
+            for a in range(1, n_following + 1)
+            for p in range(POSTS_PER_AUTHOR)
+        ])
+        session.commit()
+        if fanout:
+            # Equivalent to running fanout_log for every seeded log.
+            session.execute(insert(FeedEntry), [
+                {"owner_id": owner_id, "author_id": log_user, "log_id": log_id, "timestamp": ts}
+                for log_id, log_user, ts in session.query(Log.id, Log.user_id, Log.timestamp)
+                for owner_id in (log_user, viewer_id)
+            ])
+            session.commit()
+        followed_ids = get_followed_user_ids(session, session.get(User, viewer_id))
+        start = time.perf_counter()
+        for _ in range(READS):
+            get_feed(session, viewer_id, followed_ids, limit=20)
+        return (time.perf_counter() - start) / READS
+
+
+def main():
+    original = config.FEED_FANOUT
+    try:
+        print(f"{'count':>6} {'write pull ms':>14} {'write push ms':>14} {'read pull ms':>13} {'read push ms':>13}")
+        for n in COUNTS:
+            print(
+                f"{n:>6} "
+                f"{_bench_write(n, False) * 1000:>14.2f} {_bench_write(n, True) * 1000:>14.2f} "
+                f"{_bench_read(n, False) * 1000:>13.2f} {_bench_read(n, True) * 1000:>13.2f}"
+            )
+    finally:
+        config.FEED_FANOUT = original
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+# benchmarks/goal_lookup.py
+"""Goal lookups for the leaderboard: per-user relationship scans vs. one goal map.
+
+The old streak code fetched each target with
+``next((g.target for g in u.goals if g.activity == act), 0)`` once per day per
+activity per user, lazy-loading ``u.goals`` (one query per user) on first use.
+``stats.load_goals`` loads every user's goals and goal history in two queries
+and expands them into per-day target arrays.
+
+Run from the repository root::
+
+    python -m benchmarks.goal_lookup
+"""
+
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+from sqlalchemy import create_engine, event, insert
+from sqlalchemy.orm import sessionmaker
+
+from db import Base, User, Goal, Log
+from stats import MAIN_STREAK_ACTIVITIES, load_goals, main_streak_board
+
+USERS = 2000
+DAYS = 60
+
+
+def _seed(session):
+    session.execute(insert(User), [
+        {"id": i, "email": f"user{i}@example.com", "name": f"user{i}", "hashed_password": ""}
+        for i in range(1, USERS + 1)
+    ])
+    session.execute(insert(Goal), [
+        {"user_id": i, "activity": act, "target": target}
+        for i in range(1, USERS + 1)
+        for act, target in (("Sleep", 7.0), ("Anki", 1.0), ("Running", 150), ("Reading", 10), ("Yoga", 60))
+    ])
+    session.commit()
+
+
+def _timed(engine, func):
+    statements = []
+    listener = lambda *args: statements.append(1)  # noqa: E731
+    event.listen(engine, "before_cursor_execute", listener)
+    started = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - started
+    event.remove(engine, "before_cursor_execute", listener)
+    return result, elapsed, len(statements)
+
+
+def scan_lookups(session):
+    """The old pattern: one ``next(...)`` scan per user per day per activity."""
+    total = 0.0
+    for u in session.query(User).all():
+        for _ in range(DAYS):
+            for act in MAIN_STREAK_ACTIVITIES:
+                total += next((g.target for g in u.goals if g.activity == act), 0)
+    return total
+
+
+def map_lookups(session):
+    """One goal map for all users, expanded to per-day targets."""
+    today = date.today()
+    return sum(
+        float(goals.schedule(MAIN_STREAK_ACTIVITIES, today, DAYS).sum())
+        for goals in load_goals(session).values()
+    )
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{Path(tmp) / 'bench.db'}")
+        Base.metadata.create_all(bind=engine)
+        Session = sessionmaker(bind=engine)
+        _seed(Session())
+        print(f"{USERS} users x {len(MAIN_STREAK_ACTIVITIES)} activities x {DAYS} days")
+        print(f"{'approach':<22} {'seconds':>8} {'queries':>8}")
+        results = []
+        for name, func in (("next() over u.goals", scan_lookups), ("load_goals map", map_lookups)):
+            session = Session()
+            total, elapsed, queries = _timed(engine, lambda: func(session))
+            results.append(total)
+            session.close()
+            print(f"{name:<22} {elapsed:>8.3f} {queries:>8}")
+        assert abs(results[0] - results[1]) < 1e-6, results
+
+        session = Session()
+        start = datetime.combine(date.today(), datetime.min.time()) - timedelta(days=DAYS)
+        session.execute(insert(Log), [
+            {"user_id": i, "activity": act, "value": value, "timestamp": start + timedelta(days=d, hours=12)}
+            for i in range(1, USERS + 1)
+            for d in range(DAYS + 1)
+            for act, value in (("Sleep", 8.0), ("Anki", 5.0), ("Running", 30.0))
+        ])
+        session.commit()
+        _, elapsed, queries = _timed(engine, lambda: main_streak_board(session))
+        print(f"{'main_streak_board':<22} {elapsed:>8.3f} {queries:>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,433 @@
+# benchmarks/loadtest.py
+"""Drive the Streamlit apps headlessly with many concurrent simulated users.
+
+Each simulated user is a Streamlit ``AppTest`` session running a realistic
+flow against one entrypoint: sign up, log in, log an activity with a proof
+image, open the dashboard, scroll the feed, cheer, view the leaderboard.
+The report gives p50/p95/p99 rerun latency overall and per step, SQL
+statements per rerun and peak RSS, on a synthetic database seeded fresh for
+each app.
+
+``AppTest`` keeps global state while a script runs, so sessions can't share
+a process; each one gets its own worker process (like a server started with
+``WEB_CONCURRENCY`` workers).  Workers import the app and render it once
+untimed, then all start their flows together.  The apps read and write
+files relative to the working directory (and ``db_utils`` next to its
+module), so each run copies the sources to a temporary workspace and the
+repository isn't touched.
+
+Run from the repository root::
+
+    python -m benchmarks.loadtest [--app app.py] [--sessions 8] [--iterations 3] [--users 200]
+
+``main.py`` has no feed or cheers, so its flow skips those steps.
+"""
+
+import argparse
+import io
+import json
+import os
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+import numpy as np
+
+APPS = ["app.py", "main.py", "habits_tracker_web.py"]
+REPO = Path(__file__).resolve().parent.parent
+PASSWORD = "loadtest"
+# Seeded users log these now and then besides their core activities
+SEED_EXTRAS = ["Walking", "Yoga", "Reading", "Meditation"]
+
+
+# ── seeding (runs in a child process inside the workspace) ───────────────────
+def _seed_rows(users: int, days: int, core: list, rng: random.Random):
+    """``(user index, activity, value, timestamp)`` for ``days`` days of mostly-kept habits."""
+    start = datetime.combine(date.today() - timedelta(days=days - 1), datetime.min.time())
+    values = {"Sleep": 8.0, "Running": 30.0, "Workout": 40.0, "Studying": 2.0}
+    for u in range(users):
+        miss = rng.choice([0.02, 0.1, 0.3])
+        for d in range(days):
+            if rng.random() < miss:
+                continue
+            at = start + timedelta(days=d, hours=12)
+            for act in core:
+                yield u, act, values.get(act, 5.0), at
+            if rng.random() < 0.3:
+                yield u, rng.choice(SEED_EXTRAS), 20.0, at
+
+
+def seed_sql(users: int, days: int, rng: random.Random):
+    from sqlalchemy import insert
+    import config
+    from db import SessionLocal, User, Goal, Log, Follow, UserVersion, init_db
+    from stats import MAIN_STREAK_ACTIVITIES
+    from utils.auth import hash_password
+
+    init_db()
+    session = SessionLocal()
+    ids = range(1, users + 1)
+    session.execute(insert(User), [
+        {"id": i, "email": f"user{i}@example.com", "name": f"User {i}", "hashed_password": hash_password(PASSWORD)}
+        for i in ids
+    ])
+    session.execute(insert(Goal), [
+        {"user_id": i, "activity": act, "target": target}
+        for i in ids for act, target in config.DEFAULT_GOALS.items()
+    ])
+    session.execute(insert(Log), [
+        {"user_id": u + 1, "activity": act, "value": value, "timestamp": at, "cheers": rng.randint(0, 3)}
+        for u, act, value, at in _seed_rows(users, days, MAIN_STREAK_ACTIVITIES, rng)
+    ])
+    session.execute(insert(Follow), [
+        {"follower_id": i, "followed_id": j}
+        for i in ids for j in rng.sample([k for k in ids if k != i], min(10, users - 1))
+    ])
+    session.execute(insert(UserVersion), [{"user_id": i, "version": 1, "updated_at": datetime.utcnow()} for i in ids])
+    session.commit()
+
+
+def seed_local(users: int, days: int, rng: random.Random):
+    import config
+    from db_utils import add_user_habit, batched, db, log_habits, update_user_name
+    from utils.auth import hash_password
+
+    with batched():
+        for i in range(1, users + 1):
+            email = f"user{i}@example.com"
+            update_user_name(email, f"User {i}")
+            profile = db[f"user:{email}:profile"]
+            profile["hashed_password"] = hash_password(PASSWORD)
+            db[f"user:{email}:profile"] = profile
+            for act in ("Sleep", "Running"):
+                add_user_habit(email, act, config.DEFAULT_GOALS[act])
+        log_habits(
+            (f"user{u + 1}@example.com", act, value, at.date().isoformat(), None)
+            for u, act, value, at in _seed_rows(users, days, ["Sleep", "Running"], rng)
+        )
+
+
+def seed_json(users: int, days: int, rng: random.Random):
+    emails = [f"user{i}@example.com" for i in range(1, users + 1)]
+    goals = {"Sleep": 7.0, "Anki": 1, "Workout": 150, "Studying": 5.0}
+    data = {"users": {
+        email: {"name": f"User {i}", "goals": dict(goals), "logs": [],
+                "follows": rng.sample([e for e in emails if e != email], min(10, users - 1))}
+        for i, email in enumerate(emails, start=1)
+    }}
+    for u, act, value, at in _seed_rows(users, days, ["Sleep", "Anki", "Workout"], rng):
+        data["users"][emails[u]]["logs"].append({
+            "id": uuid.uuid4().hex, "timestamp": at.isoformat(), "activity": act,
+            "value": value, "proof": None, "cheers": rng.randint(0, 3),
+        })
+    with open("habits_data.json", "w") as f:
+        json.dump(data, f)
+
+
+SEEDERS = {"app.py": seed_sql, "main.py": seed_local, "habits_tracker_web.py": seed_json}
+
+
+# ── flows ────────────────────────────────────────────────────────────────────
+def _labelled(widgets, label: str):
+    for widget in widgets:
+        if widget.label == label:
+            return widget
+    raise LookupError(f"no widget labelled {label!r}")
+
+
+def _first(widgets, prefix: str):
+    return next((w for w in widgets if w.label.startswith(prefix)), None)
+
+
+def _proof_png() -> bytes:
+    from PIL import Image
+
+    buf = io.BytesIO()
+    Image.new("RGB", (640, 480), (200, 120, 40)).save(buf, "PNG")
+    return buf.getvalue()
+
+
+def _credentials(at, email: str, name: str = None, confirm: bool = False):
+    _labelled(at.text_input, "Email address").input(email)
+    if name is not None:
+        _labelled(at.text_input, "Full name").input(name)
+    _labelled(at.text_input, "Password").input(PASSWORD)
+    if confirm:
+        _labelled(at.text_input, "Confirm password").input(PASSWORD)
+
+
+def _sign_up_and_log_in(at, step, email: str, new_user: bool, logged_in: str):
+    """The account forms ``app.py`` and ``main.py`` share."""
+    if new_user:
+        _labelled(at.sidebar.selectbox, "Access").select("Sign Up")
+        step("open sign up", at.run)
+        _credentials(at, email, name=email.split("@")[0], confirm=True)
+        step("sign up", _labelled(at.button, "Sign Up").click().run)
+        _labelled(at.sidebar.selectbox, "Access").select("Log In")
+        step("open log in", at.run)
+    _credentials(at, email)
+    step(logged_in, _labelled(at.button, "Log In").click().run)
+
+
+def _save_with_proof(at, step, activity: str):
+    _labelled(at.selectbox, "Activity").select(activity)
+    at.file_uploader[0].set_value(("proof.png", _proof_png(), "image/png"))
+    step("select activity + upload", at.run)
+    step("save log", _labelled(at.button, "Save Log").click().run)
+
+
+def flow_sql(at, step, email: str, new_user: bool):
+    """app.py: the SQL app."""
+    step("landing + leaderboard", at.run)
+    _sign_up_and_log_in(at, step, email, new_user, "log in + dashboard + feed")
+    _save_with_proof(at, step, "Sleep")
+    cheer = _first(at.button, "🙌 Cheer")
+    if cheer is not None:
+        step("cheer", cheer.click().run)
+    _labelled(at.radio, "Show").set_value("Friends")
+    step("friends rankings", at.run)
+
+
+def flow_local(at, step, email: str, new_user: bool):
+    """main.py: the Replit DB / JSON app."""
+    step("landing + leaderboard", at.run)
+    _sign_up_and_log_in(at, step, email, new_user, "log in")
+    if new_user:
+        step("add habit", _labelled(at.button, "Add Habit").click().run)
+    _labelled(at.sidebar.radio, "Navigation").set_value("Log Today's Habits")
+    step("open log", at.run)
+    at.file_uploader[0].set_value(("proof.png", _proof_png(), "image/png"))
+    step("upload", at.run)
+    step("save log", _labelled(at.button, "Save Log").click().run)
+    _labelled(at.sidebar.radio, "Navigation").set_value("Past Logs")
+    step("past logs", at.run)
+    _labelled(at.sidebar.radio, "Navigation").set_value("Leaderboard")
+    step("leaderboard", at.run)
+
+
+def flow_json(at, step, email: str, new_user: bool):
+    """habits_tracker_web.py: logging in with a new email signs up."""
+    step("landing", at.run)
+    _labelled(at.sidebar.text_input, "Email address:").input(email)
+    step("log in + dashboard + feed", _labelled(at.sidebar.button, "Login").click().run)
+    _save_with_proof(at, step, "Sleep")
+    cheer = _first(at.button, "Cheer")
+    if cheer is not None:
+        step("cheer", cheer.click().run)
+    _labelled(at.checkbox, "Show all users").check()
+    step("feed: all users", at.run)
+
+
+FLOWS = {"app.py": flow_sql, "main.py": flow_local, "habits_tracker_web.py": flow_json}
+
+
+# ── worker (runs in a child process inside the workspace) ────────────────────
+def _count_sql():
+    """Count every statement any engine executes; returns a callable reading the total."""
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+
+    count = [0]
+
+    @event.listens_for(Engine, "before_cursor_execute")
+    def _count(conn, cursor, statement, parameters, context, executemany):
+        count[0] += 1
+
+    return lambda: count[0]
+
+
+def run_worker(app: str, session: int, iterations: int, users: int, timeout: float) -> dict:
+    from streamlit.testing.v1 import AppTest
+
+    # Relative paths resolve against this file, not the workspace
+    script = os.path.abspath(app)
+    sql_count = _count_sql()
+    # Imports, caches and the first render happen before the clock starts
+    AppTest.from_file(script, default_timeout=timeout).run()
+    print("ready", flush=True)
+    sys.stdin.readline()
+
+    flow = FLOWS[app]
+    rng = random.Random(session)
+    timings = defaultdict(list)
+    errors = []
+    statements_before = sql_count()
+    started = time.perf_counter()
+    for i in range(iterations):
+        # The first flow signs up a new account; later ones are seeded users
+        new_user = i == 0
+        email = f"load{session}@example.com" if new_user else f"user{rng.randint(1, users)}@example.com"
+        at = AppTest.from_file(script, default_timeout=timeout)
+
+        def step(name, run):
+            t0 = time.perf_counter()
+            run()
+            timings[name].append(time.perf_counter() - t0)
+            errors.extend(f"{name}: {e.message}" for e in at.exception)
+
+        try:
+            flow(at, step, email, new_user)
+        except Exception as exc:
+            shown = "; ".join(e.value for e in at.error)
+            errors.append(f"{email}: {type(exc).__name__}: {exc}" + (f" [{shown}]" if shown else ""))
+    wall = time.perf_counter() - started
+    return {
+        "wall": wall,
+        "steps": timings,
+        "sql": sql_count() - statements_before,
+        # ru_maxrss is KiB on Linux
+        "rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "errors": errors,
+    }
+
+
+# ── driver ───────────────────────────────────────────────────────────────────
+def _workspace(tmp: Path) -> Path:
+    ws = tmp / "ws"
+    ws.mkdir()
+    for path in REPO.glob("*.py"):
+        shutil.copy2(path, ws)
+    shutil.copytree(REPO / "utils", ws / "utils", ignore=shutil.ignore_patterns("__pycache__"))
+    shutil.copy2(REPO / "requirements.txt", ws)
+    return ws
+
+
+def _child_env(ws: Path) -> dict:
+    return dict(
+        os.environ,
+        DATABASE_URL=f"sqlite:///{ws / 'habits.db'}",
+        DATABASE_REPLICA_URL="",
+        SNAPSHOT_PATH=str(ws / "habits_snapshot.pkl"),
+        SHARED_CACHE_PATH=str(ws / "habits_cache.db"),
+        IMAGE_WORKERS="1",
+        STREAMLIT_SERVER_FILE_WATCHER_TYPE="none",
+        # Workspace copies first; the benchmarks package from the repository
+        PYTHONPATH=os.pathsep.join([str(ws), str(REPO)]),
+    )
+
+
+def _last_json(out: str, stderr: str, what: str) -> dict:
+    lines = out.strip().splitlines()
+    if not lines or not lines[-1].startswith("{"):
+        raise RuntimeError(f"{what} failed:\n{stderr[-3000:]}")
+    return json.loads(lines[-1])
+
+
+def _seed(ws: Path, app: str, users: int, days: int) -> float:
+    out = subprocess.run(
+        [sys.executable, "-m", "benchmarks.loadtest", "--seed", app, str(users), str(days)],
+        cwd=ws, env=_child_env(ws), capture_output=True, text=True,
+    )
+    return _last_json(out.stdout, out.stderr, f"seeding {app}")["seconds"]
+
+
+def _load(ws: Path, app: str, sessions: int, iterations: int, users: int, timeout: float) -> dict:
+    """Start one worker per session, wait until all are warm, then release them together."""
+    workers = [
+        subprocess.Popen(
+            [sys.executable, "-m", "benchmarks.loadtest", "--worker", app, str(n), str(iterations), str(users),
+             str(timeout)],
+            cwd=ws, env=_child_env(ws), stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+            text=True,
+        )
+        for n in range(sessions)
+    ]
+    for worker in workers:
+        # Apps may print while importing; the worker says "ready" on its own line
+        for line in worker.stdout:
+            if line.strip() == "ready":
+                break
+    started = time.perf_counter()
+    for worker in workers:
+        worker.stdin.write("go\n")
+        worker.stdin.flush()
+    results = []
+    for n, worker in enumerate(workers):
+        out, err = worker.communicate()
+        results.append(_last_json(out, err, f"{app} session {n}"))
+    steps = defaultdict(list)
+    for r in results:
+        for name, ts in r["steps"].items():
+            steps[name].extend(ts)
+    return {
+        "app": app,
+        "sessions": sessions,
+        "wall": time.perf_counter() - started,
+        "steps": dict(steps),
+        "latency": [t for ts in steps.values() for t in ts],
+        "sql": sum(r["sql"] for r in results),
+        "peak_rss_mb": max(r["rss_mb"] for r in results),
+        "total_rss_mb": sum(r["rss_mb"] for r in results),
+        "errors": [e for r in results for e in r["errors"]],
+    }
+
+
+def _ms(values, q) -> float:
+    return float(np.percentile(values, q)) * 1000 if values else float("nan")
+
+
+def report(result: dict):
+    lat = result["latency"]
+    print(f"{result['app']}: {result['sessions']} sessions, {len(lat)} reruns in {result['wall']:.1f}s, "
+          f"{result['sql']} SQL statements ({result['sql'] / max(len(lat), 1):.1f}/rerun)")
+    # RUSAGE_SELF leaves out the `images.py --one` subprocesses that process proof uploads
+    print(f"  peak RSS {result['peak_rss_mb']:.0f} MB per session process, {result['total_rss_mb']:.0f} MB in all")
+    print(f"  {'step':<28} {'n':>5} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for name, ts in list(result["steps"].items()) + [("all reruns", lat)]:
+        print(f"  {name:<28} {len(ts):>5} {_ms(ts, 50):>8.0f} {_ms(ts, 95):>8.0f} {_ms(ts, 99):>8.0f}")
+    if result["errors"]:
+        print(f"  {len(result['errors'])} errors, e.g.:")
+        for error in result["errors"][:5]:
+            print(f"    {error.splitlines()[0][:160]}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the Streamlit apps with concurrent AppTest sessions.")
+    parser.add_argument("--app", action="append", choices=APPS, help="entrypoint(s) to test (default: all)")
+    parser.add_argument("--sessions", type=int, default=8, help="concurrent simulated users")
+    parser.add_argument("--iterations", type=int, default=3, help="flows per simulated user (the first signs up)")
+    parser.add_argument("--users", type=int, default=200, help="seeded users")
+    parser.add_argument("--days", type=int, default=90, help="days of seeded history")
+    parser.add_argument("--timeout", type=float, default=120, help="seconds allowed per rerun")
+    parser.add_argument("--json", action="store_true", help="print raw results as JSON")
+    parser.add_argument("--seed", nargs=3, metavar=("APP", "USERS", "DAYS"), help=argparse.SUPPRESS)
+    parser.add_argument("--worker", nargs=5, metavar=("APP", "SESSION", "ITERATIONS", "USERS", "TIMEOUT"),
+                        help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.seed:
+        app, users, days = args.seed
+        started = time.perf_counter()
+        SEEDERS[app](int(users), int(days), random.Random(0))
+        print(json.dumps({"seconds": time.perf_counter() - started}))
+        return
+    if args.worker:
+        app, session, iterations, users, timeout = args.worker
+        print(json.dumps(run_worker(app, int(session), int(iterations), int(users), float(timeout))))
+        return
+
+    results = []
+    for app in args.app or APPS:
+        with tempfile.TemporaryDirectory() as tmp:
+            ws = _workspace(Path(tmp))
+            seconds = _seed(ws, app, args.users, args.days)
+            if not args.json:
+                print(f"\n{app}: seeded {args.users} users x {args.days} days in {seconds:.1f}s", flush=True)
+            result = _load(ws, app, args.sessions, args.iterations, args.users, args.timeout)
+        results.append(result)
+        if not args.json:
+            report(result)
+    if args.json:
+        print(json.dumps(results))
+
+
+if __name__ == "__main__":
+    main()
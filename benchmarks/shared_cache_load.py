@@ -0,0 +1,103 @@
+# benchmarks/shared_cache_load.py
+"""Leaderboard throughput with 1..N worker processes sharing one SharedCache.
+
+Each worker process plays the role of a Streamlit worker serving leaderboard
+views; a writer process bumps the leaderboard version periodically, as
+``add_log`` does, so workers keep recomputing and sharing fresh boards.
+
+Run from the repository root::
+
+    python -m benchmarks.shared_cache_load
+"""
+
+import multiprocessing as mp
+import os
+import random
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+
+from db import Base, User, Goal, Log
+from shared_cache import SharedCache
+from stats import main_streak_board
+
+USERS = 20
+DAYS = 30
+DURATION = 5.0
+WRITE_INTERVAL = 2.0
+WORKER_COUNTS = [1, 2, 4]
+
+
+def _seed(db_path: Path):
+    engine = create_engine(f"sqlite:///{db_path}")
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine)()
+    session.execute(insert(User), [
+        {"id": i, "email": f"user{i}@example.com", "name": f"user{i}", "hashed_password": ""}
+        for i in range(1, USERS + 1)
+    ])
+    session.execute(insert(Goal), [
+        {"user_id": i, "activity": act, "target": target}
+        for i in range(1, USERS + 1)
+        for act, target in (("Sleep", 7.0), ("Anki", 1.0), ("Running", 150))
+    ])
+    rng = random.Random(0)
+    start = datetime.combine(date.today(), datetime.min.time()) - timedelta(days=DAYS)
+    session.execute(insert(Log), [
+        {"user_id": i, "activity": act, "value": value, "timestamp": start + timedelta(days=d, hours=12)}
+        for i in range(1, USERS + 1)
+        for d in range(rng.randint(0, DAYS), DAYS + 1)
+        for act, value in (("Sleep", 8.0), ("Anki", 5.0), ("Running", 30.0))
+    ])
+    session.commit()
+
+
+def _worker(db_path, cache_path, deadline, counter):
+    session = sessionmaker(bind=create_engine(f"sqlite:///{db_path}"))()
+    cache = SharedCache(cache_path)
+    today = date.today()
+    served = 0
+    while time.time() < deadline:
+        cache.cached("leaderboard", today.isoformat(), lambda: main_streak_board(session, today))
+        served += 1
+    with counter.get_lock():
+        counter.value += served
+
+
+def _writer(cache_path, deadline):
+    cache = SharedCache(cache_path)
+    while time.time() < deadline:
+        time.sleep(WRITE_INTERVAL)
+        cache.bump("leaderboard")
+
+
+def run(db_path: Path, cache_path: Path, workers: int) -> float:
+    deadline = time.time() + DURATION
+    counter = mp.Value("l", 0)
+    procs = [mp.Process(target=_worker, args=(db_path, cache_path, deadline, counter)) for _ in range(workers)]
+    procs.append(mp.Process(target=_writer, args=(cache_path, deadline)))
+    for proc in procs:
+        proc.start()
+    for proc in procs:
+        proc.join()
+    return counter.value / DURATION
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = Path(tmp) / "bench.db"
+        _seed(db_path)
+        print(f"{os.cpu_count()} CPUs, {USERS} users, {DAYS} days of logs, version bump every {WRITE_INTERVAL}s")
+        print(f"{'workers':>7} {'req/s':>10}")
+        for workers in WORKER_COUNTS:
+            cache_path = Path(tmp) / f"cache_{workers}.db"
+            SharedCache(str(cache_path))
+            print(f"{workers:>7} {run(db_path, str(cache_path), workers):>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+# changefeed.py
+"""Consume the ``change_events`` outbox incrementally.
+
+Every write path in ``db.py`` (``add_log``, ``cheer_log``,
+``record_goal_change``, ``follow_user``/``unfollow_user``,
+``add_excused_period``) adds a ``ChangeEvent`` in the same transaction as the
+change itself.  So a committed change always has its event, and an event
+always describes a committed change.  Derived systems (aggregates, feeds,
+caches, exports) tail the events by ``seq`` instead of rescanning ``logs``.
+
+``ChangeConsumer`` keeps a named checkpoint in ``change_checkpoints``.
+``consume`` hands each batch to a handler and then advances the checkpoint,
+so delivery is at-least-once.  A handler that writes to the same session
+commits together with the checkpoint, which makes it exactly-once.
+``seek`` moves the checkpoint anywhere, e.g. ``seek(session, 0)`` to replay
+from the beginning.
+
+Sequence numbers are handed out at insert time, so on PostgreSQL a
+transaction can commit after one with a higher ``seq``.  Reads stop at such a
+gap until the rows after it are ``config.CHANGEFEED_SETTLE_SECONDS`` old; a
+gap still open by then is a rolled-back transaction.
+
+Stream events as JSON lines with::
+
+    python changefeed.py --consumer export [--from-seq 0] [--follow]
+"""
+
+import argparse
+import json
+import sys
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+from sqlalchemy import func
+
+import config
+from db import SessionLocal, ChangeEvent, ChangeCheckpoint, init_db
+
+Change = namedtuple("Change", "seq kind user_id entity_id payload created_at")
+
+
+def read_changes(db_session, after: int, limit: int = None, settle_seconds: float = None) -> list:
+    """Up to ``limit`` changes with ``seq > after`` in order, stopping at a fresh gap."""
+    limit = limit or config.CHANGEFEED_BATCH
+    settle = config.CHANGEFEED_SETTLE_SECONDS if settle_seconds is None else settle_seconds
+    settled_before = datetime.utcnow() - timedelta(seconds=settle)
+    rows = (
+        db_session.query(ChangeEvent)
+        .filter(ChangeEvent.seq > after)
+        .order_by(ChangeEvent.seq)
+        .limit(limit)
+        .all()
+    )
+    changes = []
+    expected = after + 1
+    for row in rows:
+        # Only skip past a gap once the rows after it have settled
+        if row.seq != expected and row.created_at > settled_before:
+            break
+        changes.append(Change(row.seq, row.kind, row.user_id, row.entity_id, json.loads(row.payload or "{}"), row.created_at))
+        expected = row.seq + 1
+    return changes
+
+
+def latest_seq(db_session) -> int:
+    return db_session.query(func.max(ChangeEvent.seq)).scalar() or 0
+
+
+class ChangeConsumer:
+    def __init__(self, name: str, batch_size: int = None):
+        self.name = name
+        self.batch_size = batch_size or config.CHANGEFEED_BATCH
+
+    def position(self, db_session) -> int:
+        """The last ``seq`` processed (0 if never run)."""
+        checkpoint = db_session.get(ChangeCheckpoint, self.name)
+        return checkpoint.seq if checkpoint else 0
+
+    def seek(self, db_session, seq: int):
+        """Continue after ``seq`` next time: 0 replays everything, ``latest_seq`` skips to now."""
+        db_session.merge(ChangeCheckpoint(consumer=self.name, seq=seq, updated_at=datetime.utcnow()))
+        db_session.commit()
+
+    def poll(self, db_session) -> list:
+        """The next batch after the checkpoint, without advancing it."""
+        return read_changes(db_session, self.position(db_session), self.batch_size)
+
+    def consume(self, db_session, handler, max_batches: int = None) -> int:
+        """Feed batches to ``handler(changes)`` until caught up; return changes handled."""
+        handled = batches = 0
+        while max_batches is None or batches < max_batches:
+            changes = self.poll(db_session)
+            if not changes:
+                break
+            handler(changes)
+            self.seek(db_session, changes[-1].seq)
+            handled += len(changes)
+            batches += 1
+        return handled
+
+    def follow(self, handler, interval: float = 1.0, session_factory=SessionLocal):
+        """``consume`` forever, polling every ``interval`` seconds when caught up."""
+        session = session_factory()
+        try:
+            while True:
+                if not self.consume(session, handler):
+                    session.rollback()  # end the read transaction so new rows show up
+                    time.sleep(interval)
+        finally:
+            session.close()
+
+
+def _print_changes(changes):
+    for change in changes:
+        record = change._asdict()
+        record["created_at"] = change.created_at.isoformat()
+        sys.stdout.write(json.dumps(record) + "\n")
+    sys.stdout.flush()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stream change events as JSON lines from a named checkpoint.")
+    parser.add_argument("--consumer", default="export")
+    parser.add_argument("--from-seq", type=int, help="reset the checkpoint first (0 replays everything)")
+    parser.add_argument("--follow", action="store_true", help="keep tailing new events")
+    args = parser.parse_args()
+    init_db()
+    consumer = ChangeConsumer(args.consumer)
+    session = SessionLocal()
+    if args.from_seq is not None:
+        consumer.seek(session, args.from_seq)
+    if args.follow:
+        session.close()
+        consumer.follow(_print_changes)
+    else:
+        count = consumer.consume(session, _print_changes)
+        print(f"{count} changes; checkpoint {consumer.position(session)}", file=sys.stderr)
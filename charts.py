@@ -12,7 +12,7 @@ def plot_12week_line(logs_df: pd.DataFrame, goals: dict):
     df = logs_df.copy()
     df['date'] = pd.to_datetime(df['timestamp'])
     df['week'] = df['date'].dt.to_period('W').apply(lambda r: r.start_time)
-    weekly = df.groupby(['week', 'activity'])['value'].sum().reset_index()
+    weekly = df.groupby(['week', 'activity'], observed=True)['value'].sum().reset_index()
     recent = weekly[weekly['week'] >= (pd.Timestamp.now() - pd.Timedelta(weeks=12))]
     chart = alt.Chart(recent).mark_line(point=True).encode(
         x=alt.X('week:T', title='Week'),
@@ -1,15 +1,48 @@
+# cli.py
+"""Habits Tracker CLI.
+
+Without arguments it runs the interactive menu.  Subcommands script bulk work::
+
+    python cli.py log --file entries.csv [--user ID]
+    python cli.py report --user ID [--since YYYY-MM-DD] [--until YYYY-MM-DD]
+    python cli.py excuse --user ID --start YYYY-MM-DD [--end YYYY-MM-DD] [--reason Illness]
+    python cli.py export --user ID [--since YYYY-MM-DD] [--output FILE] [--format csv|json]
+
+``log`` reads CSV with ``date,habit,value`` columns (plus ``user_id`` unless
+``--user`` is given, and an optional ``proof``); ``-`` reads stdin.  ``export``
+writes the same CSV layout, so its output can be fed back to ``log``.
+"""
+
+import argparse
+import csv
+import json
+import sys
+import time
+from contextlib import nullcontext
 from datetime import date
 
+import numpy as np
+
 from db_utils import (
     get_user_profile,
     update_user_name,
     get_user_habits,
     add_user_habit,
-    get_user_logs,
+    get_log_months,
+    get_user_logs_month,
+    get_user_logs_range,
     log_habit,
+    log_habits,
+    entry_amount,
     get_user_friends,
     add_friend,
+    get_user_excused,
+    add_user_excused,
 )
+from excused import Intervals
+from weekly import WeeklyEngine, compliance_pct, skip_run
+
+CSV_FIELDS = ["user_id", "date", "habit", "value", "proof"]
 
 
 def input_nonempty(prompt: str) -> str:
@@ -33,7 +66,8 @@ def menu(user_id: str):
         print("2) Log Today's Habits")
         print("3) Past Logs")
         print("4) Friends (optional)")
-        print("5) Quit")
+        print("5) Excused Days")
+        print("6) Quit")
         choice = input_nonempty("Select an option: ")
         if choice == "1":
             habit_name = input_nonempty("Habit Name: ")
@@ -61,14 +95,17 @@ def menu(user_id: str):
                     log_habit(user_id, habit, val_num, today, None)
                 print("Logs saved for today.")
         elif choice == "3":
-            logs = get_user_logs(user_id)
-            if not logs:
+            months = get_log_months(user_id)
+            if not months:
                 print("No logs yet.")
-            else:
+            for i, month in enumerate(reversed(months)):
+                logs = get_user_logs_month(user_id, month)
                 for log_date, entries in sorted(logs.items(), reverse=True):
                     print(f"\n{log_date}:")
                     for habit, val in entries.items():
                         print(f"  {habit}: {val}")
+                if i + 1 < len(months) and input("\nShow older logs? (y/N): ").strip().lower() != "y":
+                    break
         elif choice == "4":
             friend_id = input_nonempty("Enter friend's user ID to add: ")
             add_friend(user_id, friend_id)
@@ -77,11 +114,186 @@ def menu(user_id: str):
             if friends:
                 print("Your friends:", ", ".join(friends))
         elif choice == "5":
+            for period in get_user_excused(user_id):
+                print(f"  {period['start']} to {period['end']}: {period.get('reason', '')}")
+            start = input("Excuse from (YYYY-MM-DD, blank to skip): ").strip()
+            if start:
+                end = input(f"Until (YYYY-MM-DD, default {start}): ").strip() or start
+                reason = input("Reason (default Illness): ").strip() or "Illness"
+                try:
+                    add_user_excused(user_id, date.fromisoformat(start), date.fromisoformat(end), reason)
+                    print("Excused days saved; streaks will skip them.")
+                except ValueError as exc:
+                    print(f"Not saved: {exc}")
+        elif choice == "6":
             break
         else:
             print("Invalid option.")
 
 
+def _open_input(path: str):
+    return nullcontext(sys.stdin) if path == "-" else open(path, newline="", encoding="utf-8")
+
+
+def _open_output(path: str):
+    return nullcontext(sys.stdout) if path in (None, "-") else open(path, "w", newline="", encoding="utf-8")
+
+
+def cmd_log(args) -> int:
+    """Bulk-log entries from CSV with a single persist at the end."""
+    started = time.perf_counter()
+    skipped = []
+    users = set()
+
+    def entries(reader):
+        for line_no, row in enumerate(reader, start=2):
+            try:
+                user_id = args.user or row["user_id"].strip()
+                day = date.fromisoformat(row["date"].strip()).isoformat()
+                habit = row["habit"].strip()
+                value = float(row["value"])
+            except (KeyError, AttributeError, TypeError, ValueError) as exc:
+                skipped.append((line_no, exc))
+                continue
+            if not user_id or not habit:
+                skipped.append((line_no, "missing user_id or habit"))
+                continue
+            users.add(user_id)
+            yield user_id, habit, value, day, (row.get("proof") or "").strip() or None
+
+    with _open_input(args.file) as fp:
+        count = log_habits(entries(csv.DictReader(fp)))
+    elapsed = time.perf_counter() - started
+    for line_no, reason in skipped[:10]:
+        print(f"line {line_no}: skipped ({reason})", file=sys.stderr)
+    print(
+        f"Logged {count} entries for {len(users)} users in {elapsed:.2f}s "
+        f"({count / max(elapsed, 1e-9):,.0f} entries/s); {len(skipped)} skipped"
+    )
+    return 1 if skipped and not count else 0
+
+
+def summarize(user_id: str, since: str = None, until: str = None):
+    """Per-habit totals, goal compliance and streaks over ``[since, until]``.
+
+    Uses ``WeeklyEngine`` like the web apps' dashboards; each habit's goal is
+    daily, as in the interactive menu.  Excused days are left out of
+    compliance and skipped by streaks.
+    """
+    until = date.fromisoformat(until) if until else date.today()
+    logs = get_user_logs_range(user_id, since, until.isoformat())
+    habits = get_user_habits(user_id)
+    names = sorted(set(habits) | {h for entries in logs.values() for h in entries})
+    if not names:
+        return []
+    index = {h: i for i, h in enumerate(names)}
+    days, codes, values = [], [], []
+    for day, entries in logs.items():
+        for habit, entry in entries.items():
+            days.append(date.fromisoformat(day).toordinal())
+            codes.append(index[habit])
+            values.append(entry_amount(entry))
+    start = date.fromisoformat(since) if since else (date.fromordinal(min(days)) if days else until)
+    engine = WeeklyEngine.from_codes(
+        np.zeros(len(days)), codes, days, values, 1, len(names), until, start=min(start, until)
+    )
+    n_days = engine.end - engine.start + 1
+    totals = engine.day_totals(n_days)[0]
+    goals = np.array([entry_amount(habits.get(h, {}).get("goal", 0)) for h in names])
+    met = totals >= goals[:, None]
+    logged = np.zeros((len(names), n_days), dtype=bool)
+    for d, c in zip(days, codes):
+        logged[c, engine.end - d] = True
+    excused = Intervals.from_records(get_user_excused(user_id)).mask(until, n_days)
+    streaks = skip_run(met & logged, excused)
+    return [
+        {
+            "habit": h,
+            "goal": float(goals[i]),
+            "total": round(float(totals[i].sum()), 2),
+            "days_logged": int(logged[i].sum()),
+            "days_met": int((met[i] & logged[i]).sum()),
+            "compliance": compliance_pct(met[i] & logged[i], ~excused),
+            "streak": int(streaks[i]),
+        }
+        for i, h in enumerate(names)
+    ]
+
+
+def cmd_report(args) -> int:
+    rows = summarize(args.user, args.since, args.until)
+    if not rows:
+        print("No habits or logs found.")
+        return 0
+    period = f"{args.since or 'first log'} to {args.until or date.today().isoformat()}"
+    print(f"Report for {args.user}, {period}")
+    print(f"{'Habit':<20} {'Goal':>8} {'Total':>10} {'Logged':>7} {'Met':>5} {'Comp %':>7} {'Streak':>7}")
+    for r in rows:
+        print(
+            f"{r['habit']:<20} {r['goal']:>8g} {r['total']:>10g} {r['days_logged']:>7} "
+            f"{r['days_met']:>5} {r['compliance']:>7} {r['streak']:>7}"
+        )
+    return 0
+
+
+def cmd_excuse(args) -> int:
+    add_user_excused(args.user, args.start, args.end or args.start, args.reason)
+    print(f"Excused {args.user} from {args.start} to {args.end or args.start} ({args.reason})")
+    return 0
+
+
+def cmd_export(args) -> int:
+    logs = get_user_logs_range(args.user, args.since, args.until)
+    rows = (
+        {"user_id": args.user, "date": day, "habit": habit, "value": entry_amount(entry),
+         "proof": entry.get("proof") if isinstance(entry, dict) else None}
+        for day in sorted(logs)
+        for habit, entry in logs[day].items()
+    )
+    count = 0
+    with _open_output(args.output) as fp:
+        if args.format == "json":
+            for row in rows:
+                fp.write(json.dumps(row) + "\n")
+                count += 1
+        else:
+            writer = csv.DictWriter(fp, fieldnames=CSV_FIELDS)
+            writer.writeheader()
+            for row in rows:
+                writer.writerow(row)
+                count += 1
+    print(f"Exported {count} entries", file=sys.stderr)
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Habits Tracker CLI (interactive without a subcommand).")
+    sub = parser.add_subparsers(dest="command")
+    log = sub.add_parser("log", help="bulk-log entries from a CSV file")
+    log.add_argument("--file", required=True, help="CSV path, or - for stdin")
+    log.add_argument("--user", help="user ID for every row (otherwise a user_id column)")
+    log.set_defaults(func=cmd_log)
+    report = sub.add_parser("report", help="print per-habit totals, compliance and streaks")
+    report.add_argument("--user", required=True)
+    report.add_argument("--since", help="first date (YYYY-MM-DD)")
+    report.add_argument("--until", help="last date (YYYY-MM-DD), default today")
+    report.set_defaults(func=cmd_report)
+    excuse = sub.add_parser("excuse", help="declare days that don't break streaks")
+    excuse.add_argument("--user", required=True)
+    excuse.add_argument("--start", required=True, type=date.fromisoformat, help="first day (YYYY-MM-DD)")
+    excuse.add_argument("--end", type=date.fromisoformat, help="last day, default --start")
+    excuse.add_argument("--reason", default="Illness")
+    excuse.set_defaults(func=cmd_excuse)
+    export = sub.add_parser("export", help="write logs as CSV (or JSON lines)")
+    export.add_argument("--user", required=True)
+    export.add_argument("--since")
+    export.add_argument("--until")
+    export.add_argument("--output", help="file path, default stdout")
+    export.add_argument("--format", choices=["csv", "json"], default="csv")
+    export.set_defaults(func=cmd_export)
+    return parser
+
+
 def main():
     print("Welcome to Habits Tracker CLI\n")
     user_id = input_nonempty("Enter your user ID: ")
@@ -91,6 +303,9 @@ def main():
 
 
 if __name__ == "__main__":
+    args = build_parser().parse_args()
+    if args.command:
+        sys.exit(args.func(args))
     try:
         main()
     except KeyboardInterrupt:
@@ -52,6 +52,126 @@ DEFAULT_GOALS = {
 
 # --- Database Configuration ---
 DATABASE_URL = os.environ.get("DATABASE_URL", "sqlite:///./habits.db")
+# Optional read replica for read-only pages (feed, history, leaderboard)
+DATABASE_REPLICA_URL = os.environ.get("DATABASE_REPLICA_URL", "")
+# Hosting providers hand out postgres:// URLs; SQLAlchemy wants postgresql://
+if DATABASE_URL.startswith("postgres://"):
+    DATABASE_URL = "postgresql://" + DATABASE_URL[len("postgres://"):]
+if DATABASE_REPLICA_URL.startswith("postgres://"):
+    DATABASE_REPLICA_URL = "postgresql://" + DATABASE_REPLICA_URL[len("postgres://"):]
+# Connection pool tuning (ignored for SQLite)
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", 5))
+DB_MAX_OVERFLOW = int(os.environ.get("DB_MAX_OVERFLOW", 10))
+DB_POOL_RECYCLE = int(os.environ.get("DB_POOL_RECYCLE", 1800))
+# Rows fetched per round trip when streaming large result sets
+DB_STREAM_BATCH = int(os.environ.get("DB_STREAM_BATCH", 1000))
+
+# --- Log Archive ---
+# Logs older than this many days are moved to compressed monthly partitions
+# by ``python archive.py``; daily rollups keep lifetime streaks intact.
+ARCHIVE_HORIZON_DAYS = int(os.environ.get("ARCHIVE_HORIZON_DAYS", 180))
+
+# --- Weekly Goals ---
+# "rolling": a weekly goal is met by the 7 days ending on the day checked.
+# "iso": it is met by the Monday-Sunday calendar week (the current week so far).
+WEEK_BOUNDARY = os.environ.get("WEEK_BOUNDARY", "rolling")
+
+# --- Excused Days ---
+# Reasons offered when declaring days off; streaks skip excused days and
+# weekly targets shrink by a seventh for each one.
+EXCUSE_REASONS = ["Illness", "Injury", "Travel", "Other"]
+
+# --- Reminders ---
+# ``python reminders.py`` warns users whose main-streak goals are unmet this
+# many minutes before their day ends (midnight, as for streaks), checking
+# for new logs every REMINDER_POLL_SECONDS.  REMINDER_NOTIFIER picks the sink:
+# "outbox" (JSON lines in REMINDER_OUTBOX_PATH) or "log".
+REMINDER_LEAD_MINUTES = int(os.environ.get("REMINDER_LEAD_MINUTES", 180))
+REMINDER_POLL_SECONDS = int(os.environ.get("REMINDER_POLL_SECONDS", 60))
+REMINDER_NOTIFIER = os.environ.get("REMINDER_NOTIFIER", "outbox")
+REMINDER_OUTBOX_PATH = os.environ.get("REMINDER_OUTBOX_PATH", "reminders_outbox.jsonl")
+
+# --- Change Feed ---
+# ``changefeed.ChangeConsumer`` reads the change_events outbox this many rows
+# at a time.  A gap in sequence numbers (a transaction still in flight) holds
+# consumers back until the rows after it are CHANGEFEED_SETTLE_SECONDS old.
+CHANGEFEED_BATCH = int(os.environ.get("CHANGEFEED_BATCH", 500))
+CHANGEFEED_SETTLE_SECONDS = float(os.environ.get("CHANGEFEED_SETTLE_SECONDS", 5))
+
+# --- Rankings ---
+# Incrementally maintained leaderboards are rebuilt from the database this often
+# (seconds) as a correctness check; drift is logged.
+RANKINGS_RECOMPUTE_SECONDS = int(os.environ.get("RANKINGS_RECOMPUTE_SECONDS", 600))
+
+# --- Warm Start ---
+# Rankings and main streaks are saved here on shutdown and every
+# SNAPSHOT_INTERVAL_SECONDS (0 disables the timer), and restored on boot so a
+# machine started from zero doesn't rebuild them from every log.  Put it on a
+# persistent volume on Fly.io.
+SNAPSHOT_PATH = os.environ.get("SNAPSHOT_PATH", "habits_snapshot.pkl")
+SNAPSHOT_INTERVAL_SECONDS = int(os.environ.get("SNAPSHOT_INTERVAL_SECONDS", 300))
+
+# --- Read API ---
+# ``python read_api.py`` serves read-only JSON on this port.  When READ_API_KEY
+# is set, requests must send ``Authorization: Bearer <key>``.
+READ_API_PORT = int(os.environ.get("READ_API_PORT", 8600))
+READ_API_KEY = os.environ.get("READ_API_KEY", "")
+
+# --- Feed Timelines ---
+# When enabled, ``add_log`` pushes each new log into its followers' timelines
+# (``feed_entries``) so feed reads are a single indexed range scan.  Authors
+# with more followers than ``FEED_FANOUT_MAX_FOLLOWERS`` are pulled at read time.
+FEED_FANOUT = os.environ.get("FEED_FANOUT", "0") == "1"
+FEED_FANOUT_MAX_FOLLOWERS = int(os.environ.get("FEED_FANOUT_MAX_FOLLOWERS", 500))
+FEED_TIMELINE_SIZE = int(os.environ.get("FEED_TIMELINE_SIZE", 200))
+
+# --- Serving / Shared Cache ---
+# Number of Streamlit worker processes started by ``serve.py`` behind $PORT.
+WEB_CONCURRENCY = int(os.environ.get("WEB_CONCURRENCY", 1))
+# SQLite file holding the leaderboard/aggregate cache shared by all workers.
+SHARED_CACHE_PATH = os.environ.get("SHARED_CACHE_PATH", "habits_cache.db")
+# The app bumps a namespace on its own writes, but cli.py, job handlers,
+# archive.py, migrate_json.py and replica lag don't, so cached leaderboards
+# and dashboards also expire after this many seconds.
+AGGREGATE_CACHE_TTL = int(os.environ.get("AGGREGATE_CACHE_TTL", 60))
+
+# --- Background Jobs ---
+# When enabled, follow-up work after a save (feed fan-out, proof thumbnails)
+# is queued in JOB_QUEUE_PATH and run by worker threads instead of inline.
+JOB_QUEUE_ENABLED = os.environ.get("JOB_QUEUE_ENABLED", "0") == "1"
+JOB_QUEUE_PATH = os.environ.get("JOB_QUEUE_PATH", "habits_jobs.db")
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", 2))
+THUMBNAIL_SIZE = 256
+
+# --- Proof Images ---
+# Renditions written by images.py (directory under uploads/ -> longest side in px),
+# JPEG quality, and the size each rendition is squeezed under by lowering quality.
+IMAGE_RENDITIONS = {"thumbs": THUMBNAIL_SIZE, "display": 1280}
+IMAGE_QUALITY = int(os.environ.get("IMAGE_QUALITY", 80))
+IMAGE_TARGET_KB = int(os.environ.get("IMAGE_TARGET_KB", 300))
+IMAGE_WORKERS = int(os.environ.get("IMAGE_WORKERS", os.cpu_count() or 2))
+
+# --- Memory Budget ---
+# For small machines (Fly's 1 GB VMs).  MEMORY_BUDGET=1 aggregates per-day
+# totals in SQL instead of loading every log, and keeps log DataFrames compact
+# (categorical activity, float32 values).  Independently, when a process's
+# resident memory passes MEMORY_CAP_MB (0 disables) memory.py evicts caches
+# before the OOM killer steps in.
+MEMORY_BUDGET = os.environ.get("MEMORY_BUDGET", "0") == "1"
+MEMORY_CAP_MB = int(os.environ.get("MEMORY_CAP_MB", 0))
+# Main-streak boards evaluate this many users per vectorized pass, bounding the
+# users x activities x days array however many users there are.
+BOARD_BATCH_USERS = int(os.environ.get("BOARD_BATCH_USERS", 500))
+
+# --- Backups ---
+# ``python backup.py`` copies the SQLite database with the online backup API,
+# BACKUP_PAGES_PER_STEP pages per step with BACKUP_STEP_SLEEP seconds between
+# steps so writers aren't held up, and stores uploads by content hash.
+# ``prune`` keeps the newest BACKUP_KEEP snapshots.
+BACKUP_DIR = os.environ.get("BACKUP_DIR", "backups")
+BACKUP_PAGES_PER_STEP = int(os.environ.get("BACKUP_PAGES_PER_STEP", 256))
+BACKUP_STEP_SLEEP = float(os.environ.get("BACKUP_STEP_SLEEP", 0.005))
+BACKUP_KEEP = int(os.environ.get("BACKUP_KEEP", 7))
 
 # --- OAuth2 / External API Config ---
 GOOGLE_CLIENT_ID = os.getenv("GOOGLE_CLIENT_ID", "")
@@ -1,8 +1,26 @@
 # db.py
-from sqlalchemy import create_engine, Column, Integer, String, Float, DateTime, ForeignKey
+from sqlalchemy import (
+    create_engine,
+    Column,
+    Integer,
+    String,
+    Float,
+    Date,
+    DateTime,
+    Text,
+    LargeBinary,
+    ForeignKey,
+    Index,
+    UniqueConstraint,
+    func,
+    insert,
+    select,
+)
 from sqlalchemy.orm import declarative_base, relationship, sessionmaker
-from datetime import datetime
+from datetime import date, datetime
+import json
 import config
+import jobs
 
 Base = declarative_base()
 
@@ -28,6 +46,25 @@ class Goal(Base):
     target = Column(Float)
     user = relationship("User", back_populates="goals")
 
+class GoalHistory(Base):
+    """A goal's target from ``effective_from`` until the next row for the same goal."""
+    __tablename__ = "goal_history"
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey('users.id'), index=True)
+    activity = Column(String)
+    target = Column(Float)
+    effective_from = Column(Date)
+    __table_args__ = (UniqueConstraint("user_id", "activity", "effective_from", name="uq_goal_history_day"),)
+
+class ExcusedPeriod(Base):
+    """Days ``start_date..end_date`` on which the user is excused (illness, travel); streaks skip them."""
+    __tablename__ = "excused_periods"
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey('users.id'), index=True)
+    start_date = Column(Date, nullable=False)
+    end_date = Column(Date, nullable=False)
+    reason = Column(String, default="Illness")
+
 class Log(Base):
     __tablename__ = "logs"
     id = Column(Integer, primary_key=True)
@@ -43,19 +80,111 @@ class Log(Base):
 class Follow(Base):
     __tablename__ = "follows"
     id = Column(Integer, primary_key=True)
-    follower_id = Column(Integer, ForeignKey('users.id'))
-    followed_id = Column(Integer, ForeignKey('users.id'))
+    follower_id = Column(Integer, ForeignKey('users.id'), index=True)
+    followed_id = Column(Integer, ForeignKey('users.id'), index=True)
     follower = relationship("User", back_populates="following", foreign_keys=[follower_id])
     followed = relationship("User", back_populates="followers", foreign_keys=[followed_id])
 
-engine = create_engine(config.DATABASE_URL, echo=False, connect_args={"check_same_thread": False})
+class FeedEntry(Base):
+    """Materialized timeline row: ``log_id`` appears in ``owner_id``'s feed."""
+    __tablename__ = "feed_entries"
+    id = Column(Integer, primary_key=True)
+    owner_id = Column(Integer, ForeignKey('users.id'))
+    author_id = Column(Integer, ForeignKey('users.id'))
+    log_id = Column(Integer, ForeignKey('logs.id'))
+    timestamp = Column(DateTime)
+    __table_args__ = (Index("ix_feed_entries_owner_ts", "owner_id", "timestamp"),)
+
+class LogArchive(Base):
+    """One user's logs for one month, moved out of ``logs`` and compressed by ``archive.py``."""
+    __tablename__ = "log_archive"
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey('users.id'))
+    month = Column(String)  # YYYY-MM
+    row_count = Column(Integer, default=0)
+    payload = Column(LargeBinary)
+    __table_args__ = (
+        UniqueConstraint("user_id", "month", name="uq_log_archive_user_month"),
+        Index("ix_log_archive_month", "month"),
+    )
+
+class DailyRollup(Base):
+    """Per-day activity totals of archived logs, kept for lifetime streaks."""
+    __tablename__ = "daily_rollups"
+    user_id = Column(Integer, ForeignKey('users.id'), primary_key=True)
+    day = Column(Date, primary_key=True)
+    activity = Column(String, primary_key=True)
+    total = Column(Float, default=0)
+    count = Column(Integer, default=0)
+
+class UserVersion(Base):
+    """Counter bumped whenever a user's logs, goals, follows or cheers change."""
+    __tablename__ = "user_versions"
+    user_id = Column(Integer, ForeignKey('users.id'), primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+class ChangeEvent(Base):
+    """Transactional outbox: one row per change, written in the changing transaction.
+
+    ``seq`` increases with every insert; ``changefeed.ChangeConsumer`` tails it.
+    """
+    __tablename__ = "change_events"
+    seq = Column(Integer, primary_key=True, autoincrement=True)
+    kind = Column(String, nullable=False)  # e.g. "log.created", "follow.deleted"
+    user_id = Column(Integer, index=True)  # whose data changed
+    entity_id = Column(Integer, nullable=True)
+    payload = Column(Text, default="{}")
+    created_at = Column(DateTime, default=datetime.utcnow)
+    # Never reuse a sequence number, even after pruning the newest rows
+    __table_args__ = {"sqlite_autoincrement": True}
+
+class ChangeCheckpoint(Base):
+    """The last ``ChangeEvent.seq`` a named consumer has processed."""
+    __tablename__ = "change_checkpoints"
+    consumer = Column(String, primary_key=True)
+    seq = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+class FeedPullAuthor(Base):
+    """Authors with too many followers to fan out; their logs are pulled on read."""
+    __tablename__ = "feed_pull_authors"
+    user_id = Column(Integer, ForeignKey('users.id'), primary_key=True)
+
+def make_engine(url: str):
+    """Create an engine with settings suited to the backend behind ``url``."""
+    if url.startswith("sqlite"):
+        return create_engine(url, echo=False, connect_args={"check_same_thread": False})
+    return create_engine(
+        url,
+        echo=False,
+        pool_size=config.DB_POOL_SIZE,
+        max_overflow=config.DB_MAX_OVERFLOW,
+        pool_recycle=config.DB_POOL_RECYCLE,
+        pool_pre_ping=True,
+    )
+
+engine = make_engine(config.DATABASE_URL)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Read-only pages may use a replica; without one this is the primary.
+read_engine = make_engine(config.DATABASE_REPLICA_URL) if config.DATABASE_REPLICA_URL else engine
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
 
 def init_db():
     Base.metadata.create_all(bind=engine)
+    # create_all skips existing tables, so add indexes declared since then
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
 
 # Utility functions
 
+def stream_query(query, batch_size: int = None):
+    """Iterate ``query`` through a server-side cursor ``batch_size`` rows at a time."""
+    # yield_per implies stream_results (a server-side cursor on PostgreSQL)
+    return query.yield_per(batch_size or config.DB_STREAM_BATCH)
+
+
 def get_user_by_email(db_session, email: str):
     return db_session.query(User).filter(User.email == email).first()
 
@@ -67,6 +196,49 @@ def create_user(db_session, email: str, name: str = "", hashed_password: str = "
     db_session.commit()
     return user
 
+# Rows recording a goal as it was before its first change start here
+GOAL_HISTORY_START = date(1970, 1, 1)
+
+def record_change(db_session, kind: str, user_id: int, entity_id: int = None, **payload):
+    """Add a ``ChangeEvent``; commits with the caller's transaction."""
+    db_session.add(ChangeEvent(
+        kind=kind, user_id=user_id, entity_id=entity_id, payload=json.dumps(payload, default=str)
+    ))
+
+def record_goal_change(db_session, user_id: int, activity: str, old_target: float, new_target: float, day: date = None):
+    """Record that ``activity``'s goal is ``new_target`` from ``day`` (default today) on."""
+    day = day or date.today()
+    record_change(db_session, "goal.updated", user_id, activity=activity, old_target=old_target,
+                  target=new_target, effective_from=day)
+    rows = db_session.query(GoalHistory).filter_by(user_id=user_id, activity=activity)
+    if rows.first() is None:
+        # Days before the first change keep being judged against the old target
+        db_session.add(GoalHistory(user_id=user_id, activity=activity, target=old_target, effective_from=GOAL_HISTORY_START))
+    row = rows.filter_by(effective_from=day).first()
+    if row is not None:
+        row.target = new_target
+    else:
+        db_session.add(GoalHistory(user_id=user_id, activity=activity, target=new_target, effective_from=day))
+
+def add_excused_period(db_session, user_id: int, start: date, end: date, reason: str = "Illness"):
+    """Excuse ``user_id`` from ``start`` to ``end`` inclusive; commits with the caller's transaction."""
+    if end < start:
+        raise ValueError("excused period ends before it starts")
+    period = ExcusedPeriod(user_id=user_id, start_date=start, end_date=end, reason=reason)
+    db_session.add(period)
+    record_change(db_session, "excused.created", user_id, start=start, end=end, reason=reason)
+    bump_user_version(db_session, user_id)
+    return period
+
+def bump_user_version(db_session, user_id: int):
+    """Mark ``user_id``'s data as changed; commits with the caller's transaction."""
+    now = datetime.utcnow().replace(microsecond=0)
+    updated = db_session.query(UserVersion).filter_by(user_id=user_id).update(
+        {UserVersion.version: UserVersion.version + 1, UserVersion.updated_at: now}
+    )
+    if not updated:
+        db_session.add(UserVersion(user_id=user_id, version=1, updated_at=now))
+
 def add_log(db_session, user: User, activity: str, value: float, timestamp: datetime, proof_path: str = None, distance: float = None):
     log = Log(
         user_id=user.id,
@@ -77,9 +249,42 @@ def add_log(db_session, user: User, activity: str, value: float, timestamp: date
         proof_url=proof_path,
     )
     db_session.add(log)
+    db_session.flush()
+    if config.FEED_FANOUT and not config.JOB_QUEUE_ENABLED:
+        fanout_log(db_session, log)
+    record_change(db_session, "log.created", user.id, log.id, activity=activity, value=value,
+                  distance=distance, timestamp=timestamp, proof_url=proof_path)
+    bump_user_version(db_session, user.id)
     db_session.commit()
+    if config.JOB_QUEUE_ENABLED:
+        jobs.enqueue_log_followups(log.id, proof_path)
     return log
 
+def cheer_log(db_session, log: Log, by_user_id: int):
+    """Add a cheer to ``log`` and commit."""
+    db_session.query(Log).filter_by(id=log.id).update({Log.cheers: Log.cheers + 1})
+    record_change(db_session, "log.cheered", log.user_id, log.id, by=by_user_id)
+    bump_user_version(db_session, log.user_id)
+    db_session.commit()
+
+def follow_user(db_session, follower: User, followed: User):
+    """Make ``follower`` follow ``followed`` and commit."""
+    follower.following.append(Follow(follower=follower, followed=followed))
+    record_change(db_session, "follow.created", follower.id, followed.id)
+    bump_user_version(db_session, follower.id)
+    db_session.commit()
+
+def unfollow_user(db_session, follower_id: int, followed_id: int) -> bool:
+    """Drop the follow if it exists and commit; return whether there was one."""
+    follow = db_session.query(Follow).filter_by(follower_id=follower_id, followed_id=followed_id).first()
+    if follow is None:
+        return False
+    db_session.delete(follow)
+    record_change(db_session, "follow.deleted", follower_id, followed_id)
+    bump_user_version(db_session, follower_id)
+    db_session.commit()
+    return True
+
 def get_followed_user_ids(db_session, user: User):
     return [f.followed_id for f in user.following]
 
@@ -102,3 +307,133 @@ def get_user_token(user: User, service: str):
     if service == "apple":
         return user.apple_token
     return None
+
+# Feed timelines
+
+def follower_count(db_session, user_id: int) -> int:
+    return db_session.query(func.count(Follow.id)).filter(Follow.followed_id == user_id).scalar()
+
+
+def fanout_log(db_session, log: Log):
+    """Push ``log`` into the timelines of its author and the author's followers.
+
+    Authors above ``FEED_FANOUT_MAX_FOLLOWERS`` only get the entry in their own
+    timeline and are recorded in ``feed_pull_authors``; their followers pull
+    those logs at read time (see ``get_feed``).
+    """
+    owners = [log.user_id]
+    heavy = follower_count(db_session, log.user_id) > config.FEED_FANOUT_MAX_FOLLOWERS
+    pull_row = db_session.get(FeedPullAuthor, log.user_id)
+    if heavy and pull_row is None:
+        db_session.add(FeedPullAuthor(user_id=log.user_id))
+    elif not heavy:
+        if pull_row is not None:
+            db_session.delete(pull_row)
+        owners += [
+            row.follower_id
+            for row in db_session.query(Follow.follower_id).filter(Follow.followed_id == log.user_id)
+        ]
+    db_session.execute(insert(FeedEntry), [
+        {"owner_id": owner_id, "author_id": log.user_id, "log_id": log.id, "timestamp": log.timestamp}
+        for owner_id in set(owners)
+    ])
+    trim_timelines(db_session, set(owners))
+
+
+def backfill_timeline(db_session, owner_id: int, author_id: int):
+    """Copy an author's recent logs into a new follower's timeline."""
+    if follower_count(db_session, author_id) > config.FEED_FANOUT_MAX_FOLLOWERS:
+        return
+    recent = (
+        db_session.query(Log.id, Log.timestamp)
+        .filter(Log.user_id == author_id)
+        .order_by(Log.timestamp.desc())
+        .limit(config.FEED_TIMELINE_SIZE)
+        .all()
+    )
+    if recent:
+        db_session.execute(insert(FeedEntry), [
+            {"owner_id": owner_id, "author_id": author_id, "log_id": log_id, "timestamp": ts}
+            for log_id, ts in recent
+        ])
+        trim_timelines(db_session, [owner_id])
+    db_session.commit()
+
+
+def drop_timeline_author(db_session, owner_id: int, author_id: int):
+    """Remove an unfollowed author's logs from ``owner_id``'s timeline."""
+    db_session.query(FeedEntry).filter_by(owner_id=owner_id, author_id=author_id).delete()
+    db_session.commit()
+
+
+# Keep ``IN (...)`` lists well under SQLite's bound-parameter limit
+_TRIM_BATCH = 500
+
+
+def trim_timelines(db_session, owner_ids):
+    """Keep only the newest ``FEED_TIMELINE_SIZE`` entries of each owner's timeline.
+
+    Entries are ranked by timestamp and then id, so ties at the cut-off are
+    kept or dropped one row at a time.  Runs in the caller's transaction.
+    """
+    owner_ids = list(owner_ids)
+    for start in range(0, len(owner_ids), _TRIM_BATCH):
+        ranked = (
+            select(
+                FeedEntry.id,
+                func.row_number().over(
+                    partition_by=FeedEntry.owner_id,
+                    order_by=(FeedEntry.timestamp.desc(), FeedEntry.id.desc()),
+                ).label("rank"),
+            )
+            .where(FeedEntry.owner_id.in_(owner_ids[start:start + _TRIM_BATCH]))
+            .subquery()
+        )
+        excess = select(ranked.c.id).where(ranked.c.rank > config.FEED_TIMELINE_SIZE)
+        db_session.query(FeedEntry).filter(FeedEntry.id.in_(excess)).delete(synchronize_session=False)
+
+
+def _pull_feed(db_session, author_ids, limit: int):
+    if not author_ids:
+        return []
+    return (
+        db_session.query(Log)
+        .filter(Log.user_id.in_(author_ids))
+        .order_by(Log.timestamp.desc())
+        .limit(limit)
+        .all()
+    )
+
+
+def get_feed(db_session, user_id: int, followed_ids, limit: int = 20):
+    """Return the newest ``limit`` logs from ``user_id`` and the people they follow.
+
+    ``followed_ids`` is what the caller already holds (``UserContext.followed_ids``,
+    or ``get_followed_user_ids``), so no follow rows are queried here.
+
+    With ``FEED_FANOUT`` disabled this is the plain pull query.  Otherwise the
+    viewer's materialized timeline is read with one range scan and merged with
+    logs pulled from any followed authors that are too popular to fan out.
+    Timelines are trimmed as they are written, so this only reads and works
+    on a replica.
+    """
+    if not config.FEED_FANOUT:
+        return _pull_feed(db_session, [*followed_ids, user_id], limit)
+    pushed = (
+        db_session.query(Log)
+        .join(FeedEntry, FeedEntry.log_id == Log.id)
+        .filter(FeedEntry.owner_id == user_id)
+        .order_by(FeedEntry.timestamp.desc())
+        .limit(limit)
+        .all()
+    )
+    if not pushed:
+        # Timeline not materialized yet (e.g. fan-out just enabled).
+        return _pull_feed(db_session, [*followed_ids, user_id], limit)
+    heavy_ids = [
+        row.user_id
+        for row in db_session.query(FeedPullAuthor.user_id).filter(FeedPullAuthor.user_id.in_(list(followed_ids)))
+    ]
+    pulled = _pull_feed(db_session, heavy_ids, limit)
+    merged = {l.id: l for l in pushed + pulled}.values()
+    return sorted(merged, key=lambda l: l.timestamp, reverse=True)[:limit]
@@ -1,6 +1,10 @@
 # db_utils.py
 """Database helper functions with Replit fallback."""
 
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
 try:
     # Use Replit's built-in database when available
     from replit import db  # type: ignore
@@ -9,6 +13,8 @@ except ModuleNotFoundError:  # pragma: no cover - executed only when package mis
     # Fallback to a simple JSON file for local development/testing
     _USING_REPLIT = False
     import json
+    import os
+    import tempfile
     from pathlib import Path
 
     _DATA_FILE = Path(__file__).with_name("habits_local.json")
@@ -25,11 +31,40 @@ except ModuleNotFoundError:  # pragma: no cover - executed only when package mis
 
         def __init__(self, initial):
             super().__init__(initial)
+            self._batch_depth = 0
+            self._dirty = False
+
+        def _persist(self):
+            if self._batch_depth:
+                self._dirty = True
+                return
+            # Write a temp file and rename it over the old one, so a reader
+            # (another worker, or main.py re-importing this module) never
+            # sees a half-written file and falls back to an empty store
+            fd, tmp = tempfile.mkstemp(dir=_DATA_FILE.parent, suffix=".tmp")
+            with os.fdopen(fd, "w") as f:
+                json.dump(self, f)
+            os.replace(tmp, _DATA_FILE)
 
         def __setitem__(self, key, value):
             super().__setitem__(key, value)
-            with _DATA_FILE.open("w") as f:
-                json.dump(self, f)
+            self._persist()
+
+        def __delitem__(self, key):
+            super().__delitem__(key)
+            self._persist()
+
+        @contextmanager
+        def batch(self):
+            """Write the file once when the block ends instead of on every change."""
+            self._batch_depth += 1
+            try:
+                yield
+            finally:
+                self._batch_depth -= 1
+                if not self._batch_depth and self._dirty:
+                    self._dirty = False
+                    self._persist()
 
         def get(self, key, default=None):  # type: ignore[override]
             return super().get(key, default)
@@ -37,6 +72,122 @@ except ModuleNotFoundError:  # pragma: no cover - executed only when package mis
     db = _LocalDB(_store)
 
 
+@contextmanager
+def batched():
+    """Group many writes into one persist (Replit DB writes each key anyway)."""
+    if _USING_REPLIT:
+        yield
+    else:
+        with db.batch():
+            yield
+
+
+# Replit DB is one HTTP request per key; ``get_many`` overlaps this many
+_MULTI_GET_THREADS = 8
+
+
+def get_many(keys, default=None):
+    """Return ``{key: value}`` for ``keys``, fetched together.
+
+    Locally that is plain dict lookups; on Replit the requests run
+    concurrently instead of one round trip after another.
+    """
+    keys = list(dict.fromkeys(keys))
+    if not _USING_REPLIT or len(keys) < 2:
+        return {key: db.get(key, default) for key in keys}
+    with ThreadPoolExecutor(min(_MULTI_GET_THREADS, len(keys))) as pool:
+        return dict(zip(keys, pool.map(lambda key: db.get(key, default), keys)))
+
+
+def list_keys(prefix):
+    """Keys starting with ``prefix`` (Replit DB filters server-side)."""
+    if _USING_REPLIT:
+        return list(db.prefix(prefix))
+    return [key for key in db.keys() if key.startswith(prefix)]
+
+
+# ``index:users`` maps every user id to ``{"name": ..., "logs": count}`` so the
+# leaderboard reads one record instead of listing keys and loading every log.
+# Users are members once they have a profile (as the leaderboard always had);
+# logs stored for an id without one (e.g. ``cli.py log``) are counted when the
+# profile appears.
+# Read-modify-writes of it go through ``_index_lock`` (the KV store has no
+# transactions; this serializes writers within a process).
+_USER_INDEX_KEY = "index:users"
+_index_lock = threading.Lock()
+
+
+def _index_entry(user_id, profile):
+    logs = get_user_logs(user_id)
+    return {"name": profile.get("name", user_id), "logs": sum(len(v) for v in logs.values())}
+
+
+def _scan_user_index():
+    index = {}
+    for key in list_keys("user:"):
+        if key.endswith(":profile"):
+            uid = key[len("user:"):-len(":profile")]
+            index[uid] = _index_entry(uid, db.get(key) or {})
+    return index
+
+
+def rebuild_user_index():
+    """Recount the index from every profile and log key (slow; for repair and first use)."""
+    with _index_lock:
+        index = _scan_user_index()
+        db[_USER_INDEX_KEY] = index
+    return index
+
+
+def get_user_index():
+    """``{user_id: {"name": ..., "logs": count}}`` for every user, from one record."""
+    index = db.get(_USER_INDEX_KEY)
+    return index if index is not None else rebuild_user_index()
+
+
+def list_user_ids():
+    return list(get_user_index())
+
+
+def _update_user_index(user_id, name=None, new_logs=0):
+    with _index_lock:
+        index = db.get(_USER_INDEX_KEY)
+        if index is None:
+            # First write since the index existed: the scan already sees this change
+            db[_USER_INDEX_KEY] = _scan_user_index()
+            return
+        entry = index.get(user_id)
+        if entry is None:
+            profile = get_user_profile(user_id)
+            if profile is None:
+                return
+            # New member: count what is stored, this change included
+            entry = _index_entry(user_id, profile)
+        else:
+            entry = dict(entry)
+            entry["logs"] += new_logs
+        if name is not None:
+            entry["name"] = name
+        index[user_id] = entry
+        db[_USER_INDEX_KEY] = index
+
+
+def entry_amount(entry):
+    """The main number of a stored log entry or goal.
+
+    Values are numbers or ``{unit: number}`` dicts (duration first, then
+    distance), optionally wrapped as ``{"value": ..., "proof": ...}``.
+    """
+    if isinstance(entry, dict) and "value" in entry:
+        entry = entry["value"]
+    if isinstance(entry, dict):
+        entry = next(iter(entry.values()), 0)
+    try:
+        return float(entry or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
 def get_user_profile(user_id):
     key = f"user:{user_id}:profile"
     return db.get(key, None)
@@ -50,6 +201,7 @@ def update_user_name(user_id, name):
     if 'friends' not in profile:
         profile['friends'] = []
     db[key] = profile
+    _update_user_index(user_id, name=name)
 
 
 def get_user_habits(user_id):
@@ -64,18 +216,203 @@ def add_user_habit(user_id, habit, goal):
     db[key] = habits
 
 
+def get_user_excused(user_id):
+    """Excused day ranges as ``[{"start": ..., "end": ..., "reason": ...}]`` (ISO dates)."""
+    return db.get(f"user:{user_id}:excused", [])
+
+
+def add_user_excused(user_id, start, end, reason="Illness"):
+    if str(end) < str(start):
+        raise ValueError("excused range ends before it starts")
+    key = f"user:{user_id}:excused"
+    periods = list(db.get(key, []))
+    periods.append({'start': str(start), 'end': str(end), 'reason': reason})
+    db[key] = periods
+
+
+# Logs are stored one key per month (``user:{id}:logs:{YYYY-MM}``) with a
+# small manifest (``user:{id}:logs:index``) listing the months that exist, so a
+# write only rewrites the current month and views only fetch what they show.
+
+def _legacy_logs_key(user_id):
+    return f"user:{user_id}:logs"
+
+
+def _month_key(user_id, month):
+    return f"user:{user_id}:logs:{month}"
+
+
+def _manifest_key(user_id):
+    return f"user:{user_id}:logs:index"
+
+
+def _month_of(day):
+    return str(day)[:7]
+
+
+def _migrate_legacy_logs(user_id):
+    """Split an old single-blob ``user:{id}:logs`` value into month keys."""
+    legacy_key = _legacy_logs_key(user_id)
+    legacy = db.get(legacy_key, None)
+    if legacy is None:
+        return
+    months = {}
+    for day, entries in legacy.items():
+        months.setdefault(_month_of(day), {})[day] = entries
+    manifest = set(db.get(_manifest_key(user_id), []))
+    for month, days in months.items():
+        key = _month_key(user_id, month)
+        merged = db.get(key, {})
+        for day, entries in days.items():
+            merged.setdefault(day, {}).update(entries)
+        db[key] = merged
+        manifest.add(month)
+    db[_manifest_key(user_id)] = sorted(manifest)
+    del db[legacy_key]
+
+
+def get_log_months(user_id):
+    """Return the sorted list of ``YYYY-MM`` months with logs for ``user_id``."""
+    _migrate_legacy_logs(user_id)
+    return list(db.get(_manifest_key(user_id), []))
+
+
+def get_user_logs_month(user_id, month):
+    """Return ``{date: {habit: entry}}`` for a single ``YYYY-MM`` month."""
+    _migrate_legacy_logs(user_id)
+    return db.get(_month_key(user_id, month), {})
+
+
+def get_user_logs_range(user_id, start=None, end=None):
+    """Return logs between ``start`` and ``end`` (inclusive ISO dates).
+
+    Only the month keys overlapping the range are fetched.
+    """
+    start = str(start) if start else None
+    end = str(end) if end else None
+    logs = {}
+    for month in get_log_months(user_id):
+        if (start and month < start[:7]) or (end and month > end[:7]):
+            continue
+        for day, entries in db.get(_month_key(user_id, month), {}).items():
+            if (start and day < start) or (end and day > end):
+                continue
+            logs[day] = entries
+    return logs
+
+
 def get_user_logs(user_id):
-    key = f"user:{user_id}:logs"
-    return db.get(key, {})
+    return get_user_logs_range(user_id)
+
+
+# Each user also has a small ``user:{id}:latest`` record,
+# ``{"date": ISO date, "habits": {habit: value}}``, for their most recent
+# logged day, kept current by the log writers so overviews never read history.
+
+def _latest_key(user_id):
+    return f"user:{user_id}:latest"
+
+
+def _entry_value(entry):
+    return entry["value"] if isinstance(entry, dict) and "value" in entry else entry
+
+
+def _merged_latest(latest, day, habits):
+    """``latest`` updated with ``{habit: entry}`` logged on ``day``, or ``None`` if unchanged."""
+    day = str(day)
+    values = {habit: _entry_value(entry) for habit, entry in habits.items()}
+    if latest and day < latest["date"]:
+        return None
+    if latest and day == latest["date"]:
+        values = {**latest["habits"], **values}
+    return {"date": day, "habits": values}
+
+
+def _update_latest(user_id, day, habits):
+    """Fold entries just written for ``day`` into the user's latest-activity record."""
+    latest = db.get(_latest_key(user_id))
+    if latest is None:
+        _build_latest(user_id)  # the new entries are already in the month keys
+        return
+    latest = _merged_latest(latest, day, habits)
+    if latest:
+        db[_latest_key(user_id)] = latest
+
+
+def _build_latest(user_id):
+    # Users logged before the record existed: derive it from their last month once
+    months = get_log_months(user_id)
+    logs = get_user_logs_month(user_id, months[-1]) if months else {}
+    if not logs:
+        return None
+    day = max(logs)
+    latest = _merged_latest(None, day, logs[day])
+    db[_latest_key(user_id)] = latest
+    return latest
+
+
+def get_latest_activity(user_id):
+    """``{"date": ..., "habits": {habit: value}}`` for the user's last logged day, or ``None``."""
+    return get_latest_activities([user_id]).get(user_id)
+
+
+def get_latest_activities(user_ids):
+    """``{user_id: latest activity or None}`` with one batched read for all users."""
+    records = get_many(_latest_key(uid) for uid in user_ids)
+    return {uid: records[_latest_key(uid)] or _build_latest(uid) for uid in user_ids}
 
 
 def log_habit(user_id, habit, value, date, proof_path=None):
-    key = f"user:{user_id}:logs"
+    _migrate_legacy_logs(user_id)
+    month = _month_of(date)
+    key = _month_key(user_id, month)
     logs = db.get(key, {})
     if date not in logs:
         logs[date] = {}
+    is_new = habit not in logs[date]
     logs[date][habit] = {"value": value, "proof": proof_path}
     db[key] = logs
+    manifest = db.get(_manifest_key(user_id), [])
+    if month not in manifest:
+        db[_manifest_key(user_id)] = sorted(list(manifest) + [month])
+    if is_new:
+        _update_user_index(user_id, new_logs=1)
+    _update_latest(user_id, date, {habit: {"value": value}})
+
+
+def log_habits(entries):
+    """Store many ``(user_id, habit, value, date, proof_path)`` entries at once.
+
+    Entries are grouped so each user-month key and manifest is written once,
+    all inside one ``batched()`` persist.  Returns the number stored.
+    """
+    months = {}
+    count = 0
+    for user_id, habit, value, day, proof_path in entries:
+        month_logs = months.setdefault(user_id, {}).setdefault(_month_of(day), {})
+        month_logs.setdefault(day, {})[habit] = {"value": value, "proof": proof_path}
+        count += 1
+    with batched():
+        for user_id, by_month in months.items():
+            _migrate_legacy_logs(user_id)
+            new_logs = 0
+            for month, days in by_month.items():
+                key = _month_key(user_id, month)
+                logs = db.get(key, {})
+                for day, habits in days.items():
+                    existing = logs.setdefault(day, {})
+                    new_logs += len(habits.keys() - existing.keys())
+                    existing.update(habits)
+                db[key] = logs
+            manifest = db.get(_manifest_key(user_id), [])
+            if not set(by_month) <= set(manifest):
+                db[_manifest_key(user_id)] = sorted(set(manifest) | set(by_month))
+            last_month = by_month[max(by_month)]
+            last_day = max(last_month)
+            _update_latest(user_id, last_day, last_month[last_day])
+            if new_logs:
+                _update_user_index(user_id, new_logs=new_logs)
+    return count
 
 
 def get_user_friends(user_id):
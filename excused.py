@@ -0,0 +1,81 @@
+# excused.py
+"""Excused days (illness, travel, ...) as a sorted interval index.
+
+A user declares date ranges in advance; streaks skip those days instead of
+breaking on them, and compliance leaves them out.  ``Intervals`` keeps one
+user's ranges merged and sorted by start, so checking a day is a bisect and
+``mask`` marks every excused day of a window by slicing whole intervals
+rather than testing each day against a list.
+"""
+
+from bisect import bisect_left, bisect_right
+from datetime import date
+
+import numpy as np
+
+
+def _ordinal(day) -> int:
+    if isinstance(day, str):
+        day = date.fromisoformat(day)
+    return day if isinstance(day, int) else day.toordinal()
+
+
+class Intervals:
+    """Non-overlapping ``[start, end]`` day ranges (inclusive ordinals), sorted."""
+
+    def __init__(self, ranges=()):
+        self.starts = []
+        self.ends = []
+        for start, end in ranges:
+            self.add(start, end)
+
+    @classmethod
+    def from_records(cls, records) -> "Intervals":
+        """Build from the JSON stores' ``[{"start": "YYYY-MM-DD", "end": ..., "reason": ...}]``."""
+        return cls((r["start"], r["end"]) for r in records or ())
+
+    def add(self, start, end):
+        """Excuse ``start..end`` (dates, ISO strings or ordinals), merging touching ranges."""
+        start, end = _ordinal(start), _ordinal(end)
+        if end < start:
+            raise ValueError("excused range ends before it starts")
+        # Ranges overlapping or adjacent to [start, end] occupy positions i..j-1
+        i = bisect_left(self.ends, start - 1)
+        j = bisect_right(self.starts, end + 1)
+        if i < j:
+            start = min(start, self.starts[i])
+            end = max(end, self.ends[j - 1])
+        self.starts[i:j] = [start]
+        self.ends[i:j] = [end]
+
+    def __contains__(self, day) -> bool:
+        day = _ordinal(day)
+        i = bisect_right(self.starts, day) - 1
+        return i >= 0 and self.ends[i] >= day
+
+    def __len__(self):
+        return len(self.starts)
+
+    def __iter__(self):
+        return ((date.fromordinal(s), date.fromordinal(e)) for s, e in zip(self.starts, self.ends))
+
+    def mask(self, end, n_days: int) -> np.ndarray:
+        """Which of the ``n_days`` days up to ``end`` are excused, most recent first."""
+        last = _ordinal(end)
+        first = last - n_days + 1
+        out = np.zeros(n_days, dtype=bool)
+        i = bisect_left(self.ends, first)
+        while i < len(self.starts) and self.starts[i] <= last:
+            lo, hi = max(self.starts[i], first), min(self.ends[i], last)
+            out[last - hi:last - lo + 1] = True
+            i += 1
+        return out
+
+
+def masks(intervals, end, n_days: int):
+    """Stack ``mask`` for each ``Intervals`` (or ``None``) in order; ``None`` if none has any."""
+    intervals = list(intervals)
+    if not any(intervals):
+        return None
+    empty = np.zeros(n_days, dtype=bool)
+    return np.stack([iv.mask(end, n_days) if iv else empty for iv in intervals])
@@ -1,5 +1,7 @@
 import streamlit as st
 import os, json
+import config
+import numpy as np
 import pandas as pd
 import uuid
 from datetime import datetime, date, time, timedelta
@@ -9,7 +11,13 @@ from config import (
     CUTOFF_HOUR,
     ACTIVITIES,
     DEFAULT_GOALS,
+    EXCUSE_REASONS,
 )
+from log_store import LogStore
+from weekly import WeeklyEngine, compliance_pct, skip_run
+from excused import Intervals, masks
+import images
+import memory
 
 # ── CONFIG ─────────────────────────────────────────────────────────────────────
 DATA_FILE    = "habits_data.json"
@@ -18,6 +26,12 @@ UPLOAD_DIR   = "uploads"
 # ensure persistence directory exists
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 
+DAILY_HABITS  = ['Sleep', 'Anki']
+WEEKLY_HABITS = ['Workout', 'Studying']
+# Main streak: Sleep and Anki every day, Workout each week (Studying doesn't count)
+MAIN_ACTIVITIES = DAILY_HABITS + WEEKLY_HABITS
+_MAIN_SPLIT = ([0, 1], [2])
+
 # ── DATA I/O ───────────────────────────────────────────────────────────────────
 def load_data():
     """
@@ -64,6 +78,21 @@ def save_data(db):
     with open(DATA_FILE, 'w') as f:
         json.dump(db, f, indent=2)
 
+
+@st.cache_resource
+def load_store():
+    """
+    Load the JSON database and its columnar log store once per process.
+    Logs are appended to both in place, so reruns never re-parse the file.
+    """
+    data = load_data()
+    return data, LogStore.from_users(data['users'])
+
+
+@memory.evictor('log store indexes')
+def drop_store_indexes():
+    load_store()[1].drop_indexes()
+
 # ── UTILITIES ─────────────────────────────────────────────────────────────────
 def effective_date(ts: datetime) -> date:
     """Roll timestamp before cutoff into previous day."""
@@ -72,70 +101,83 @@ def effective_date(ts: datetime) -> date:
     return ts.date()
 
 
-def compute_compliance(user):
+def compute_compliance(user, df=None):
     """
     Compute compliance percentages, sub-streaks, and main streak days.
+    ``df`` is the user's ``LogStore.frame``; built from ``user['logs']`` if omitted.
     """
     goals = user.get('goals', DEFAULT_GOALS)
-    logs = user.get('logs', [])
-    df = pd.DataFrame(logs)
+    if df is None:
+        df = LogStore.from_users({'': user}).frame()
     if df.empty:
         # no logs
         comp = {act: 0.0 for act in ACTIVITIES}
         streaks = {act: 0 for act in ACTIVITIES}
         return comp, streaks, 0
-    df['timestamp'] = pd.to_datetime(df['timestamp'])
-    df['date'] = df['timestamp'].apply(effective_date)
     today = date.today()
+    engine, _ = WeeklyEngine.from_frame(df, MAIN_ACTIVITIES, today, date_col='date')
+    n_days = engine.end - engine.start + 1
+    g = np.array([goals.get(act, 0) for act in MAIN_ACTIVITIES])
+    # Excused days are skipped by streaks and left out of compliance
+    excused = Intervals.from_records(user.get('excused'))
+    excused_days = excused.mask(today, max(n_days, 7))
     comp = {}
     streaks = {}
-    # Daily habits: 7-day window
-    for act in ['Sleep', 'Anki']:
-        met = sum(
-            df[(df['date'] == today - timedelta(days=i)) & (df['activity'] == act)]['value'].sum() >= goals[act]
-            for i in range(7)
-        )
-        comp[act] = round(met / 7 * 100, 1)
-        s = 0
-        d = today
-        while df[(df['date'] == d) & (df['activity'] == act)]['value'].sum() >= goals[act]:
-            s += 1
-            d -= timedelta(days=1)
-        streaks[act] = s
-    # Weekly habits: 12-week window
-    for act in ['Workout', 'Studying']:
-        weeks = []
-        for w in range(12):
-            end = today - timedelta(days=7*w)
-            start = end - timedelta(days=6)
-            total = df[(df['date'] >= start) & (df['date'] <= end) & (df['activity'] == act)]['value'].sum()
-            weeks.append(total)
-        comp[act] = round(sum(1 for v in weeks if v >= goals[act]) / 12 * 100, 1)
-        s = 0
-        for v in weeks:
-            if v >= goals[act]:
-                s += 1
-            else:
-                break
-        streaks[act] = s
+    # Daily habits: 7-day window, streak back to the first miss
+    days = engine.day_totals(max(n_days, 7))[0]
+    for i, act in enumerate(DAILY_HABITS):
+        met = days[i] >= g[i]
+        comp[act] = compliance_pct(met[:7], ~excused_days[:7])
+        streaks[act] = int(skip_run(met, excused_days))
+    # Weekly habits: 12-week window, targets shrink by a seventh per excused day
+    n = len(DAILY_HABITS)
+    excused_in_week = engine.excused_weeks(excused_days[None, :n_days], 12)[0]
+    met = engine.weekly_totals(12)[0, n:] >= g[n:, None] * (1 - excused_in_week / 7)
+    runs = engine.week_streaks(met, excused_in_week >= 7)
+    for i, act in enumerate(WEEKLY_HABITS):
+        comp[act] = compliance_pct(met[i], excused_in_week < 7)
+        streaks[act] = int(runs[i])
     # Main streak: days Sleep+Anki+Workout met
-    main = 0
-    d = today
-    while True:
-        ok1 = df[(df['date'] == d) & (df['activity'] == 'Sleep')]['value'].sum() >= goals['Sleep']
-        ok2 = df[(df['date'] == d) & (df['activity'] == 'Anki')]['value'].sum() >= goals['Anki']
-        mask = (df['date'] >= d - timedelta(days=6)) & (df['date'] <= d)
-        ok3 = df[mask & (df['activity'] == 'Workout')]['value'].sum() >= goals['Workout']
-        if ok1 and ok2 and ok3:
-            main += 1
-            d -= timedelta(days=1)
-        else:
-            break
+    main = int(engine.main_streaks(g[None, :], *_MAIN_SPLIT, excused=masks([excused], today, n_days))[0])
     return comp, streaks, main
 
+def main_streaks(users: dict, df) -> dict:
+    """
+    Main streak of every user, ``config.BOARD_BATCH_USERS`` users per vectorized
+    pass so the users x activities x days array stays bounded.
+    """
+    streaks = dict.fromkeys(users, 0)
+    if df.empty:
+        return streaks
+    today = date.today()
+    # Users without logs have no streak, whatever their goals
+    present = set(df['user'].unique())
+    logged = [e for e in users if e in present]
+    codes = pd.Categorical(df['user'], categories=logged).codes
+    order = np.argsort(codes, kind='stable')
+    sorted_codes = codes[order]
+    for lo in range(0, len(logged), config.BOARD_BATCH_USERS):
+        batch = logged[lo:lo + config.BOARD_BATCH_USERS]
+        rows = order[np.searchsorted(sorted_codes, lo):np.searchsorted(sorted_codes, lo + len(batch))]
+        engine, _ = WeeklyEngine.from_frame(
+            df.take(rows), MAIN_ACTIVITIES, today, date_col='date', user_col='user', users=batch
+        )
+        g = np.array([[users[e].get('goals', DEFAULT_GOALS).get(act, 0) for act in MAIN_ACTIVITIES] for e in batch])
+        excused = masks(
+            (Intervals.from_records(users[e].get('excused')) for e in batch), today, engine.end - engine.start + 1
+        )
+        runs = engine.main_streaks(g, *_MAIN_SPLIT, excused=excused)
+        streaks.update(zip(batch, runs.tolist()))
+    return streaks
+
 # ── APP ────────────────────────────────────────────────────────────────────────
 st.set_page_config(page_title=PAGE_TITLE, page_icon=PAGE_ICON, layout='wide')
-db = load_data()
+if config.WEB_CONCURRENCY > 1:
+    # Each worker would hold its own copy of the document and overwrite the others' saves
+    st.error('habits_tracker_web.py keeps its JSON store in one process; run it with WEB_CONCURRENCY=1.')
+    st.stop()
+db, store = load_store()
+memory.check()
 # Auth
 if 'email' not in st.session_state:
     st.sidebar.header('Login')
@@ -143,37 +185,41 @@ if 'email' not in st.session_state:
     if st.sidebar.button('Login') and login_email:
         email = login_email.strip().lower()
         st.session_state.email = email
-        if email not in db['users']:
-            db['users'][email] = {
-                'name': email.split('@')[0],
-                'goals': DEFAULT_GOALS.copy(),
-                'logs': [],
-                'follows': []
-            }
-            save_data(db)
+        with store.lock:
+            if email not in db['users']:
+                db['users'][email] = {
+                    'name': email.split('@')[0],
+                    'goals': DEFAULT_GOALS.copy(),
+                    'logs': [],
+                    'follows': []
+                }
+                save_data(db)
         st.rerun()
     st.stop()
 email = st.session_state.email
 user = db['users'].get(email)
 if user is None:
-    db['users'][email] = {
-        'name': email.split('@')[0],
-        'goals': DEFAULT_GOALS.copy(),
-        'logs': [],
-        'follows': []
-    }
-    user = db['users'][email]
-    save_data(db)
+    with store.lock:
+        user = db['users'].setdefault(email, {
+            'name': email.split('@')[0],
+            'goals': DEFAULT_GOALS.copy(),
+            'logs': [],
+            'follows': []
+        })
+        save_data(db)
 st.sidebar.write(f"Logged in: {email}")
-user['name'] = st.sidebar.text_input('Name', user.get('name',''))
+# ``user`` is the live record in the process-wide store; only rewrite the
+# file when the sidebar actually changed it, not on every rerun
+name = st.sidebar.text_input('Name', user.get('name',''))
 other_users = [e for e in db['users'] if e != email]
-user['follows'] = st.sidebar.multiselect('Follow', other_users, default=user.get('follows', []))
-save_data(db)
+follows = st.sidebar.multiselect('Follow', other_users, default=user.get('follows', []))
+profile_changed = name != user.get('name') or follows != user.get('follows', [])
 if st.sidebar.button('Logout'):
     del st.session_state.email
     st.rerun()
 # Goals
 st.sidebar.subheader('Your Goals')
+new_goals = {}
 for act, val in user['goals'].items():
     if act in ['Sleep', 'Studying']:
         new_val = st.sidebar.number_input(
@@ -187,8 +233,28 @@ for act, val in user['goals'].items():
         new_val = st.sidebar.number_input(
             f"{act} (units)", min_value=0, value=int(val), step=1
         )
-    user['goals'][act] = new_val
-save_data(db)
+    if new_val != val:
+        new_goals[act] = new_val
+if profile_changed or new_goals:
+    # ``user`` is shared with every session thread; save_data serializes the whole document
+    with store.lock:
+        user['name'], user['follows'] = name, follows
+        user['goals'].update(new_goals)
+        save_data(db)
+# Excused days
+with st.sidebar.expander('Excused Days'):
+    excuse_range = st.date_input('Days', (date.today(), date.today()), key='excuse_range')
+    excuse_reason = st.selectbox('Reason', EXCUSE_REASONS, key='excuse_reason')
+    if st.button('Excuse these days') and len(excuse_range) == 2 and excuse_range[0] <= excuse_range[1]:
+        with store.lock:
+            user.setdefault('excused', []).append({
+                'start': excuse_range[0].isoformat(),
+                'end': excuse_range[1].isoformat(),
+                'reason': excuse_reason,
+            })
+            save_data(db)
+    for e in user.get('excused', [])[-5:]:
+        st.write(f"{e['start']} – {e['end']}: {e.get('reason', '')}")
 # Tabs
 tabs = st.tabs([
     '🏠 Home',
@@ -232,28 +298,31 @@ with tabs[1]:
             pth = os.path.join(UPLOAD_DIR, fn)
             with open(pth,'wb') as f:
                 f.write(proof.getbuffer())
-        user['logs'].append({
+            images.submit(pth)
+        new_log = {
             'id': uuid.uuid4().hex,
             'timestamp': ts,
             'activity': act,
             'value': val,
             'proof': pth,
             'cheers': 0
-        })
-        save_data(db)
+        }
+        with store.lock:
+            user['logs'].append(new_log)
+            store.append(email, new_log)
+            save_data(db)
         st.success('Saved')
         st.rerun()
 # Dashboard
 with tabs[2]:
     st.header('Dashboard')
-    comp, streaks, main = compute_compliance(user)
+    df = store.frame(email)
+    comp, streaks, main = compute_compliance(user, df)
     st.metric('Main Streak', main)
     cols = st.columns(len(ACTIVITIES))
     for i, act in enumerate(ACTIVITIES):
         cols[i].metric(act, f"{comp.get(act,0)}%", streaks.get(act,0))
-    if user['logs']:
-        df = pd.DataFrame(user['logs'])
-        df['date'] = pd.to_datetime(df['timestamp']).apply(effective_date)
+    if not df.empty:
         pivot = df.pivot_table(index='date', columns='activity', values='value', aggfunc='sum').fillna(0)
         st.line_chart(pivot)
         csv = df.to_csv(index=False)
@@ -262,49 +331,44 @@ with tabs[2]:
 with tabs[3]:
     st.header('Social Feed')
     show_all = st.checkbox('Show all users')
-    all_logs = []
-    for ue, ud in db['users'].items():
-        for l in ud.get('logs', []):
-            all_logs.append({**l, 'user': ue, 'date': effective_date(datetime.fromisoformat(l['timestamp']))})
-    df_all = pd.DataFrame(all_logs)
+    # Only the 20 newest rows become a DataFrame, not the whole store
+    recent = store.recent_rows(20, None if show_all else user.get('follows', []) + [email])
+    df_all = store.frame(rows=recent)
     if df_all.empty:
         st.write('No entries.')
     else:
-        if not show_all:
-            df_all = df_all[df_all['user'].isin(user.get('follows', []) + [email])]
-        for _, r in df_all.sort_values('date', ascending=False).head(20).iterrows():
+        for _, r in df_all.iterrows():
             st.subheader(f"{db['users'][r['user']].get('name', r['user'])}: {r['activity']}")
             st.write(r['value'])
             if r.get('proof'):
-                st.image(r['proof'])
+                st.image(images.display_path(r['proof']))
             st.write(f"Cheers: {r.get('cheers',0)}")
             if st.button('Cheer', key=f"cheer_{r['id']}"):
-                for l in db['users'][r['user']]['logs']:
-                    if l.get('id') == r['id']:
-                        l['cheers'] = l.get('cheers', 0) + 1
-                        save_data(db)
-                        st.experimental_rerun()
+                with store.lock:
+                    cheers = store.cheer(r['id'])
+                    for l in db['users'][r['user']]['logs']:
+                        if l.get('id') == r['id']:
+                            l['cheers'] = cheers
+                            save_data(db)
+                            break
+                st.rerun()
 # History
 with tabs[4]:
     st.header('History')
     sel = st.date_input('Date', date.today(), key='history_date')
-    hist = [
-        (ue, l)
-        for ue, ud in db['users'].items()
-        for l in ud.get('logs', [])
-        if effective_date(datetime.fromisoformat(l['timestamp'])) == sel
-    ]
-    if not hist:
+    hist = store.frame(rows=store.day_rows(sel))
+    if hist.empty:
         st.write('No logs.')
     else:
-        for ue, l in hist:
+        for _, l in hist.iterrows():
+            ue = l['user']
             st.subheader(f"{db['users'][ue].get('name', ue)}: {l['activity']}")
             st.write(l['value'])
             if l.get('proof'):
-                st.image(l['proof'])
+                st.image(images.display_path(l['proof']))
             st.write(f"Cheers: {l.get('cheers',0)}")
 # Leaderboard
 with tabs[5]:
     st.header('Leaderboard')
-    board = [{'user':ue,'streak':compute_compliance(ud)[2]} for ue,ud in db['users'].items()]
+    board = [{'user':ue,'streak':streak} for ue,streak in main_streaks(db['users'], store.frame()).items()]
     st.table(pd.DataFrame(board).sort_values('streak',ascending=False))
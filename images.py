@@ -0,0 +1,323 @@
+# images.py
+"""Proof image pipeline: renditions made outside the web server process.
+
+``process_image`` rewrites the upload itself without EXIF and other metadata
+(GPS position, camera serial), copying the image data rather than
+re-encoding it, so the stored original no longer carries them either.  It
+then fixes orientation from EXIF and writes one JPEG per entry in
+``config.IMAGE_RENDITIONS`` (e.g.
+``uploads/display/<name>.jpg`` and ``uploads/thumbs/<name>.jpg``).  Each JPEG
+is lowered in quality until it fits ``config.IMAGE_TARGET_KB``.
+
+Pillow work is CPU-bound, so the apps hand it to ``submit``, which runs
+``python images.py --one PATH`` in a fresh interpreter from a small thread
+pool, and the Streamlit server threads stay responsive.  (A multiprocessing
+pool would not do: spawn and forkserver workers re-run the parent's
+``__main__`` file before anything else, and under Streamlit that is the page
+script.)  ``display_path`` returns the display rendition once it exists,
+otherwise the original upload.
+
+Reprocess an existing uploads directory with a ``ProcessPoolExecutor``::
+
+    python images.py [uploads] [--workers N] [--force]
+"""
+
+import argparse
+import io
+import json
+import multiprocessing
+import os
+import subprocess
+import sys
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+
+import config
+import memory
+
+IMAGE_SUFFIXES = {".jpg", ".jpeg", ".png", ".webp"}
+_MIN_QUALITY = 40
+_EXIF_HEADER = b"Exif\0\0"
+_ORIENTATION = 0x0112
+# ``Image.info`` keys that hold metadata rather than pixels
+_METADATA_KEYS = {"exif", "xmp", "XML:com.adobe.xmp", "comment", "photoshop"}
+
+_pool = None
+
+
+def rendition_path(path, rendition: str) -> Path:
+    path = Path(path)
+    return path.parent / rendition / f"{path.stem}.jpg"
+
+
+def display_path(path):
+    """The display rendition of an upload if it has been made, else the upload itself."""
+    if not path:
+        return path
+    rendition = rendition_path(path, "display")
+    return str(rendition) if rendition.exists() else path
+
+
+def _encode(img, quality: int, target_bytes: int) -> bytes:
+    while True:
+        buf = io.BytesIO()
+        # No exif/icc_profile arguments, so the output carries no metadata
+        img.save(buf, "JPEG", quality=quality, optimize=True, progressive=True)
+        if buf.tell() <= target_bytes or quality <= _MIN_QUALITY:
+            return buf.getvalue()
+        quality -= 10
+
+
+def _has_metadata(img) -> bool:
+    return bool(img.getexif()) or bool(_METADATA_KEYS & img.info.keys()) or bool(getattr(img, "text", None))
+
+
+def _orientation_exif(orientation) -> bytes:
+    """TIFF-format EXIF holding only the orientation tag, or nothing if upright."""
+    if orientation in (None, 1):
+        return b""
+    from PIL import Image
+
+    exif = Image.Exif()
+    exif[_ORIENTATION] = orientation
+    return exif.tobytes()[len(_EXIF_HEADER):]
+
+
+def _strip_jpeg(data: bytes, exif: bytes) -> bytes:
+    """Copy a JPEG's segments and scans, dropping metadata segments and any MPO frames after the first."""
+    out = [data[:2]]
+    if exif:
+        exif = _EXIF_HEADER + exif
+        out.append(b"\xff\xe1" + (len(exif) + 2).to_bytes(2, "big") + exif)
+    pos = 2
+    while pos < len(data):
+        if data[pos] != 0xFF:
+            raise ValueError("corrupt JPEG marker")
+        marker = data[pos + 1]
+        if marker == 0xFF:  # fill byte
+            pos += 1
+            continue
+        if marker == 0xD9:  # EOI: the first image ends here, MPO depth maps follow
+            out.append(data[pos:pos + 2])
+            break
+        end = pos + 2 + int.from_bytes(data[pos + 2:pos + 4], "big")
+        body = data[pos + 4:end]
+        # Comments and APP1-APP15 go, except ICC profiles (APP2) and APP14's
+        # Adobe colour transform, which describe the pixels
+        metadata = marker == 0xFE or (
+            0xE1 <= marker <= 0xEF and marker != 0xEE and not (marker == 0xE2 and body.startswith(b"ICC_PROFILE\0"))
+        )
+        if not metadata:
+            out.append(data[pos:end])
+        pos = end
+        if marker == 0xDA:
+            # Entropy-coded data runs to the next marker that isn't a stuffed 0xFF00 or RSTn
+            scan = pos
+            while True:
+                pos = data.index(b"\xff", pos)
+                if data[pos + 1] != 0 and not 0xD0 <= data[pos + 1] <= 0xD7:
+                    break
+                pos += 2
+            out.append(data[scan:pos])
+    return b"".join(out)
+
+
+def _strip_png(data: bytes, exif: bytes) -> bytes:
+    """Copy a PNG's chunks without its text, time and EXIF chunks."""
+    out = [data[:8]]
+    pos = 8
+    while pos < len(data):
+        end = pos + 12 + int.from_bytes(data[pos:pos + 4], "big")
+        kind = data[pos + 4:pos + 8]
+        if kind == b"IDAT" and exif:
+            out.append(len(exif).to_bytes(4, "big") + b"eXIf" + exif + zlib.crc32(b"eXIf" + exif).to_bytes(4, "big"))
+            exif = b""
+        if kind not in (b"tEXt", b"zTXt", b"iTXt", b"tIME", b"eXIf"):
+            out.append(data[pos:end])
+        pos = end
+    return b"".join(out)
+
+
+def _strip_webp(data: bytes, exif: bytes) -> bytes:
+    """Copy a WebP's RIFF chunks without its EXIF and XMP chunks."""
+    chunks = []
+    pos = 12
+    while pos < len(data):
+        size = int.from_bytes(data[pos + 4:pos + 8], "little")
+        end = pos + 8 + size + (size & 1)
+        if data[pos:pos + 4] not in (b"EXIF", b"XMP "):
+            chunks.append(bytearray(data[pos:end]))
+        pos = end
+    if chunks and chunks[0][:4] == b"VP8X":
+        # Extended-format flags: bit 3 says EXIF follows, bit 2 XMP
+        chunks[0][8] = chunks[0][8] & ~0x0C | (0x08 if exif else 0)
+        if exif:
+            chunks.append(bytearray(b"EXIF" + len(exif).to_bytes(4, "little") + exif + b"\0" * (len(exif) & 1)))
+    body = b"WEBP" + b"".join(chunks)
+    return b"RIFF" + len(body).to_bytes(4, "little") + body
+
+
+_STRIPPERS = {"JPEG": _strip_jpeg, "MPO": _strip_jpeg, "PNG": _strip_png, "WEBP": _strip_webp}
+
+
+def _strip_original(path: Path, src) -> int:
+    """Rewrite ``path`` without its metadata and return its new size.
+
+    The image data is copied, not re-encoded, so a JPEG or WebP original loses
+    nothing and can only get smaller.  Only the orientation tag survives,
+    so viewers still show the photo the right way up.
+    """
+    if src.format not in _STRIPPERS:
+        raise ValueError(f"can't strip metadata from {src.format} images")
+    orientation = src.getexif().get(_ORIENTATION)
+    data = _STRIPPERS[src.format](path.read_bytes(), _orientation_exif(orientation))
+    tmp = path.with_name(f".{path.name}.tmp")
+    tmp.write_bytes(data)
+    os.replace(tmp, path)
+    return len(data)
+
+
+def process_image(path) -> dict:
+    """Strip ``path`` and write every rendition; return the sizes in bytes.
+
+    ``original_bytes`` is the upload as received, ``stripped_bytes`` the
+    original as now stored, ``display_bytes`` the display rendition the apps
+    show instead of it and ``rendition_bytes`` all renditions written for it.
+    """
+    from PIL import Image, ImageOps
+
+    path = Path(path)
+    original_bytes = stripped_bytes = path.stat().st_size
+    rendition_bytes = display_bytes = 0
+    with Image.open(path) as src:
+        img = ImageOps.exif_transpose(src)
+        if _has_metadata(src):
+            stripped_bytes = _strip_original(path, src)
+        if img.mode in ("RGBA", "LA", "P"):
+            # Screenshots often carry alpha; flatten onto white rather than black
+            img = img.convert("RGBA")
+            background = Image.new("RGB", img.size, "white")
+            background.paste(img, mask=img.getchannel("A"))
+            img = background
+        else:
+            img = img.convert("RGB")
+        for rendition, size in config.IMAGE_RENDITIONS.items():
+            copy = img.copy()
+            copy.thumbnail((size, size), Image.LANCZOS)
+            data = _encode(copy, config.IMAGE_QUALITY, config.IMAGE_TARGET_KB * 1024)
+            target = rendition_path(path, rendition)
+            target.parent.mkdir(exist_ok=True)
+            target.write_bytes(data)
+            rendition_bytes += len(data)
+            if rendition == "display":
+                display_bytes = len(data)
+    return {
+        "path": str(path),
+        "original_bytes": original_bytes,
+        "stripped_bytes": stripped_bytes,
+        "display_bytes": display_bytes,
+        "rendition_bytes": rendition_bytes,
+    }
+
+
+def _process_in_subprocess(path) -> dict:
+    """Run ``process_image`` on ``path`` in a new interpreter and return its result."""
+    proc = subprocess.run(
+        [sys.executable, str(Path(__file__).resolve()), "--one", str(path)],
+        capture_output=True,
+        text=True,
+    )
+    if proc.returncode:
+        lines = proc.stderr.strip().splitlines()
+        raise RuntimeError(f"{path}: {lines[-1] if lines else f'exit status {proc.returncode}'}")
+    return json.loads(proc.stdout)
+
+
+def get_pool() -> ThreadPoolExecutor:
+    """Process-wide pool of threads that each wait on one image subprocess, created on first use."""
+    global _pool
+    if _pool is None:
+        _pool = ThreadPoolExecutor(max_workers=config.IMAGE_WORKERS, thread_name_prefix="images")
+    return _pool
+
+
+@memory.evictor("image pool")
+def shutdown_pool():
+    """Let the threads exit once queued images are done; the next ``submit`` starts a new pool."""
+    global _pool
+    pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=False)
+
+
+def submit(path):
+    """Queue ``path`` for processing and return the ``Future`` without waiting."""
+    return get_pool().submit(_process_in_subprocess, str(path))
+
+
+def is_processed(path) -> bool:
+    return all(rendition_path(path, r).exists() for r in config.IMAGE_RENDITIONS)
+
+
+def reprocess(directory="uploads", workers: int = None, force: bool = False) -> dict:
+    """Process every upload in ``directory`` (skipping finished ones unless ``force``).
+
+    Meant for the command line, where ``__main__`` is this file; the workers
+    re-import it harmlessly.
+    """
+    paths = [
+        p for p in sorted(Path(directory).iterdir())
+        if p.is_file() and p.suffix.lower() in IMAGE_SUFFIXES and (force or not is_processed(p))
+    ]
+    started = time.perf_counter()
+    done = failed = original_bytes = stripped_bytes = display_bytes = rendition_bytes = 0
+    method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+    with ProcessPoolExecutor(workers or config.IMAGE_WORKERS, multiprocessing.get_context(method)) as pool:
+        for path, future in [(p, pool.submit(process_image, str(p))) for p in paths]:
+            try:
+                result = future.result()
+            except Exception as exc:
+                failed += 1
+                print(f"{path}: {exc}")
+                continue
+            done += 1
+            original_bytes += result["original_bytes"]
+            stripped_bytes += result["stripped_bytes"]
+            display_bytes += result["display_bytes"]
+            rendition_bytes += result["rendition_bytes"]
+    elapsed = time.perf_counter() - started
+    return {
+        "images": done,
+        "failed": failed,
+        "seconds": elapsed,
+        "images_per_sec": done / elapsed if elapsed else 0.0,
+        "original_bytes": original_bytes,
+        "rendition_bytes": rendition_bytes,
+        # Metadata stripped from the stored originals
+        "metadata_bytes": original_bytes - stripped_bytes,
+        # Saved each time the apps show the display rendition instead of the upload
+        "bytes_saved": original_bytes - display_bytes,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Make renditions for every image in an uploads directory.")
+    parser.add_argument("directory", nargs="?", default="uploads")
+    parser.add_argument("--workers", type=int, default=config.IMAGE_WORKERS)
+    parser.add_argument("--force", action="store_true", help="redo images that already have renditions")
+    parser.add_argument("--one", metavar="IMAGE", help="process only IMAGE and print its sizes as JSON")
+    args = parser.parse_args()
+    if args.one:
+        print(json.dumps(process_image(args.one)))
+    else:
+        stats = reprocess(args.directory, args.workers, args.force)
+        print(
+            f"{stats['images']} images ({stats['failed']} failed) in {stats['seconds']:.1f}s "
+            f"with {args.workers} workers: {stats['images_per_sec']:.1f} images/s, "
+            f"{stats['original_bytes'] / 1e6:.1f} MB of originals "
+            f"({stats['metadata_bytes'] / 1e6:.1f} MB of metadata removed), "
+            f"{stats['rendition_bytes'] / 1e6:.1f} MB of renditions; "
+            f"display renditions {stats['bytes_saved'] / 1e6:.1f} MB smaller than the originals"
+        )
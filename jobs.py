@@ -0,0 +1,232 @@
+# jobs.py
+"""SQLite-backed background job queue for work that follows a save.
+
+``enqueue`` records a job and returns immediately; worker threads (started by
+the app, or ``python jobs.py`` as a standalone worker) claim jobs atomically,
+retry failures with exponential backoff and mark them done.  An idempotency key
+makes re-enqueueing the same work a no-op, so handlers may also be retried
+safely.  ``metrics`` reports queue depth and enqueue-to-finish latency.
+"""
+
+import json
+import sqlite3
+import threading
+import time
+import traceback
+
+import config
+
+HANDLERS = {}
+# A running job whose worker died becomes claimable again after this long
+LEASE_SECONDS = 300
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY,
+    kind TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    idem_key TEXT UNIQUE,
+    status TEXT NOT NULL DEFAULT 'queued',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL DEFAULT 3,
+    run_at REAL NOT NULL,
+    enqueued_at REAL NOT NULL,
+    finished_at REAL,
+    last_error TEXT
+);
+CREATE INDEX IF NOT EXISTS ix_jobs_status_run_at ON jobs (status, run_at);
+"""
+
+
+def handler(kind: str):
+    """Register ``func(payload)`` as the handler for jobs of ``kind``."""
+    def register(func):
+        HANDLERS[kind] = func
+        return func
+    return register
+
+
+class JobQueue:
+    def __init__(self, path: str = None):
+        self.path = path or config.JOB_QUEUE_PATH
+        self._local = threading.local()
+        self._threads = []
+        self._stop = threading.Event()
+        self._conn().executescript(_SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def enqueue(self, kind: str, payload: dict, key: str = None, max_attempts: int = 3, delay: float = 0):
+        """Queue a job; return its id, or ``None`` if ``key`` was already queued."""
+        now = time.time()
+        cur = self._conn().execute(
+            "INSERT OR IGNORE INTO jobs (kind, payload, idem_key, max_attempts, run_at, enqueued_at) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (kind, json.dumps(payload), key, max_attempts, now + delay, now),
+        )
+        return cur.lastrowid if cur.rowcount == 1 else None
+
+    def _claim(self):
+        conn = self._conn()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            now = time.time()
+            # An expired lease counts as a failed attempt: once those are used
+            # up the job is dead rather than handed to yet another worker
+            conn.execute(
+                "UPDATE jobs SET status = 'failed', last_error = 'lease expired' "
+                "WHERE status = 'running' AND run_at <= ? AND attempts >= max_attempts",
+                (now,),
+            )
+            row = conn.execute(
+                "SELECT id, kind, payload, attempts, max_attempts FROM jobs "
+                "WHERE (status = 'queued' OR (status = 'running' AND attempts < max_attempts)) "
+                "AND run_at <= ? ORDER BY run_at LIMIT 1",
+                (now,),
+            ).fetchone()
+            if row is not None:
+                conn.execute(
+                    "UPDATE jobs SET status = 'running', attempts = attempts + 1, run_at = ? WHERE id = ?",
+                    (now + LEASE_SECONDS, row[0]),
+                )
+        return row
+
+    def run_one(self) -> bool:
+        """Run the next due job, if any; return whether one was run."""
+        row = self._claim()
+        if row is None:
+            return False
+        job_id, kind, payload, attempts, max_attempts = row
+        try:
+            HANDLERS[kind](json.loads(payload))
+        except Exception:
+            attempts += 1
+            retry = attempts < max_attempts
+            self._conn().execute(
+                "UPDATE jobs SET status = ?, run_at = ?, last_error = ? WHERE id = ?",
+                ("queued" if retry else "failed", time.time() + 2 ** attempts, traceback.format_exc(), job_id),
+            )
+        else:
+            self._conn().execute(
+                "UPDATE jobs SET status = 'done', finished_at = ? WHERE id = ?", (time.time(), job_id)
+            )
+        return True
+
+    def _work(self, poll_interval: float):
+        while not self._stop.is_set():
+            if not self.run_one():
+                self._stop.wait(poll_interval)
+
+    def start(self, workers: int = None, poll_interval: float = 0.2):
+        """Start worker threads (daemon, so they never block interpreter exit)."""
+        self._stop.clear()
+        for _ in range(workers or config.JOB_WORKERS):
+            thread = threading.Thread(target=self._work, args=(poll_interval,), daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        self._stop.set()
+        for thread in self._threads:
+            thread.join()
+        self._threads.clear()
+
+    def metrics(self, window: int = 200) -> dict:
+        """Queue depth per status and latency percentiles of the last ``window`` jobs."""
+        conn = self._conn()
+        depth = dict(conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+        latencies = sorted(
+            row[0]
+            for row in conn.execute(
+                "SELECT finished_at - enqueued_at FROM jobs WHERE status = 'done' "
+                "ORDER BY finished_at DESC LIMIT ?",
+                (window,),
+            )
+        )
+
+        def pct(p):
+            return latencies[min(int(p * len(latencies)), len(latencies) - 1)] if latencies else None
+
+        return {
+            "queued": depth.get("queued", 0),
+            "running": depth.get("running", 0),
+            "failed": depth.get("failed", 0),
+            "done": depth.get("done", 0),
+            "latency_p50": pct(0.5),
+            "latency_p95": pct(0.95),
+        }
+
+
+_queue = None
+
+
+def get_queue() -> JobQueue:
+    """Process-wide queue instance."""
+    global _queue
+    if _queue is None:
+        _queue = JobQueue()
+    return _queue
+
+
+# Handlers -------------------------------------------------------------------
+
+@handler("feed_fanout")
+def _feed_fanout(payload):
+    from db import SessionLocal, Log, FeedEntry, fanout_log
+
+    session = SessionLocal()
+    try:
+        log = session.get(Log, payload["log_id"])
+        if log is None:
+            return
+        # Re-running must not duplicate timeline rows
+        session.query(FeedEntry).filter_by(log_id=log.id).delete()
+        fanout_log(session, log)
+        session.commit()
+    finally:
+        session.close()
+
+
+@handler("proof_images")
+def _proof_images(payload):
+    import images
+
+    # The worker thread only waits; Pillow runs in the image process pool
+    images.submit(payload["path"]).result()
+
+
+# Jobs queued before renditions replaced the single thumbnail
+HANDLERS["thumbnail"] = _proof_images
+
+
+def enqueue_log_followups(log_id: int, proof_path: str = None):
+    """Queue the work that follows saving a log."""
+    queue = get_queue()
+    if config.FEED_FANOUT:
+        queue.enqueue("feed_fanout", {"log_id": log_id}, key=f"feed_fanout:{log_id}")
+    if proof_path:
+        queue.enqueue("proof_images", {"path": proof_path}, key=f"proof_images:{proof_path}")
+
+
+if __name__ == "__main__":
+    import sys
+
+    q = get_queue()
+    if "--stats" in sys.argv:
+        print(json.dumps(q.metrics(), indent=2))
+    else:
+        print(f"Processing jobs from {q.path} with {config.JOB_WORKERS} workers (Ctrl+C to stop)")
+        q.start()
+        try:
+            while True:
+                time.sleep(10)
+                print(q.metrics())
+        except KeyboardInterrupt:
+            q.stop()
@@ -0,0 +1,227 @@
+# log_store.py
+"""Columnar in-memory log store for the JSON-backed app (``habits_tracker_web.py``)."""
+
+import threading
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+from config import CUTOFF_HOUR
+
+_DAY = 86400
+_EPOCH = date(1970, 1, 1)
+_COLUMNS = {
+    "ts": "int64",        # epoch seconds of the (naive, local) timestamp
+    "day": "int64",       # effective date as days since epoch (cutoff applied)
+    "user": "int32",      # code into ``LogStore.users``
+    "activity": "int32",  # code into ``LogStore.activities``
+    "value": "float32",
+    "cheers": "int32",
+    "id": object,
+    "proof": object,
+}
+
+
+def _epoch_seconds(timestamps) -> np.ndarray:
+    parsed = pd.to_datetime(pd.Index(timestamps, dtype=object), format="ISO8601")
+    return parsed.as_unit("s").asi8
+
+
+def _effective_day(ts: np.ndarray) -> np.ndarray:
+    """Vectorized ``effective_date``: roll logs before the cutoff into the previous day."""
+    return (ts - CUTOFF_HOUR * 3600) // _DAY
+
+
+class LogStore:
+    """Logs held as parallel NumPy arrays instead of one dict per log.
+
+    Users and activities are interned to integer codes, timestamps are int64
+    epoch seconds and values float32.  ``rows`` maps a log id to its row.  The
+    arrays grow geometrically so ``append`` is amortized O(1), and ``frame``
+    wraps the live arrays in a DataFrame without copying them.  ``by_day`` is a
+    secondary index from effective date (days since epoch) to rows.  Both
+    indexes are built on first use and can be dropped with ``drop_indexes``
+    when memory is short.
+
+    One store is shared by every session thread: ``append`` and ``cheer`` hold
+    ``lock``, and callers that also change the JSON document hold it around
+    both so the two stay in step.
+    """
+
+    def __init__(self, capacity: int = 1024):
+        self._cols = {name: np.empty(capacity, dtype=dtype) for name, dtype in _COLUMNS.items()}
+        self.size = 0
+        self._rows = {}
+        self._by_day = {}
+        self.users = []
+        self.activities = []
+        self._user_codes = {}
+        self._activity_codes = {}
+        self.lock = threading.RLock()
+
+    @classmethod
+    def from_users(cls, users: dict) -> "LogStore":
+        """Build a store from the ``users`` mapping of ``habits_data.json``."""
+        pairs = [(email, log) for email, u in users.items() for log in u.get("logs", [])]
+        store = cls(max(len(pairs), 1024))
+        if not pairs:
+            return store
+        n = len(pairs)
+        cols = store._cols
+        cols["ts"][:n] = _epoch_seconds([log["timestamp"] for _, log in pairs])
+        cols["day"][:n] = _effective_day(cols["ts"][:n])
+        cols["user"][:n] = [store._intern_user(email) for email, _ in pairs]
+        cols["activity"][:n] = [store._intern_activity(log["activity"]) for _, log in pairs]
+        cols["value"][:n] = [log.get("value", 0) for _, log in pairs]
+        cols["cheers"][:n] = [log.get("cheers", 0) for _, log in pairs]
+        for row, (_, log) in enumerate(pairs):
+            cols["id"][row] = log["id"]
+            cols["proof"][row] = log.get("proof")
+        store.size = n
+        store.drop_indexes()
+        return store
+
+    # The evictor may reset _rows/_by_day to None at any time, so the
+    # properties and ``append`` read them once into a local.  Building holds
+    # the lock so an ``append`` can't land between the scan and the publish.
+
+    @property
+    def rows(self) -> dict:
+        rows = self._rows
+        if rows is None:
+            with self.lock:
+                rows = {log_id: row for row, log_id in enumerate(self._cols["id"][: self.size])}
+                self._rows = rows
+        return rows
+
+    @property
+    def by_day(self) -> dict:
+        by_day = self._by_day
+        if by_day is None:
+            with self.lock:
+                by_day = {}
+                for row, day in enumerate(self._cols["day"][: self.size].tolist()):
+                    by_day.setdefault(day, []).append(row)
+                self._by_day = by_day
+        return by_day
+
+    def drop_indexes(self):
+        """Free ``rows`` and ``by_day``; the next lookup rebuilds them from the columns."""
+        self._rows = None
+        self._by_day = None
+
+    def _intern_user(self, email: str) -> int:
+        code = self._user_codes.get(email)
+        if code is None:
+            code = self._user_codes[email] = len(self.users)
+            self.users.append(email)
+        return code
+
+    def _intern_activity(self, activity: str) -> int:
+        code = self._activity_codes.get(activity)
+        if code is None:
+            code = self._activity_codes[activity] = len(self.activities)
+            self.activities.append(activity)
+        return code
+
+    def _grow(self):
+        capacity = len(self._cols["ts"]) * 2
+        for name, col in self._cols.items():
+            grown = np.empty(capacity, dtype=col.dtype)
+            grown[: self.size] = col[: self.size]
+            self._cols[name] = grown
+
+    def append(self, email: str, log: dict) -> int:
+        """Add one log (as stored in the JSON file) and return its row."""
+        with self.lock:
+            if self.size == len(self._cols["ts"]):
+                self._grow()
+            row = self.size
+            cols = self._cols
+            cols["ts"][row] = _epoch_seconds([log["timestamp"]])[0]
+            cols["day"][row] = _effective_day(cols["ts"][row])
+            cols["user"][row] = self._intern_user(email)
+            cols["activity"][row] = self._intern_activity(log["activity"])
+            cols["value"][row] = log.get("value", 0)
+            cols["cheers"][row] = log.get("cheers", 0)
+            cols["id"][row] = log["id"]
+            cols["proof"][row] = log.get("proof")
+            rows, by_day = self._rows, self._by_day
+            if rows is not None:
+                rows[log["id"]] = row
+            if by_day is not None:
+                by_day.setdefault(int(cols["day"][row]), []).append(row)
+            # Readers slice ``[:size]``, so the row is complete before it counts
+            self.size += 1
+            return row
+
+    def cheer(self, log_id: str) -> int:
+        """Increment the cheer count of ``log_id`` and return the new count."""
+        with self.lock:
+            row = self.rows[log_id]
+            self._cols["cheers"][row] += 1
+            return int(self._cols["cheers"][row])
+
+    def user_rows(self, email: str) -> np.ndarray:
+        code = self._user_codes.get(email)
+        if code is None:
+            return np.empty(0, dtype=np.intp)
+        return np.flatnonzero(self._cols["user"][: self.size] == code)
+
+    def recent_rows(self, n: int, users=None) -> np.ndarray:
+        """The ``n`` latest rows by timestamp, newest first, optionally for ``users`` only."""
+        ts = self._cols["ts"][: self.size]
+        if users is None:
+            rows = np.arange(self.size)
+        else:
+            codes = [self._user_codes[u] for u in users if u in self._user_codes]
+            rows = np.flatnonzero(np.isin(self._cols["user"][: self.size], codes))
+        if len(rows) > n:
+            rows = rows[np.argpartition(-ts[rows], n - 1)[:n]]
+        return rows[np.argsort(-ts[rows], kind="stable")]
+
+    def day_rows(self, start: date, end: date = None, users=None) -> np.ndarray:
+        """Rows whose effective date is in ``[start, end]``, optionally for ``users`` only.
+
+        Cost is proportional to the days in the range and the logs on them,
+        not to the size of the store.
+        """
+        first = (start - _EPOCH).days
+        last = first if end is None else (end - _EPOCH).days
+        by_day = self.by_day
+        rows = [row for day in range(first, last + 1) for row in by_day.get(day, ())]
+        rows = np.asarray(rows, dtype=np.intp)
+        if users is not None and len(rows):
+            codes = [self._user_codes[u] for u in users if u in self._user_codes]
+            rows = rows[np.isin(self._cols["user"][rows], codes)]
+        return rows
+
+    def frame(self, user: str = None, rows=None) -> pd.DataFrame:
+        """Return logs as a DataFrame, optionally restricted to one user or to ``rows``.
+
+        Columns: ``id``, ``user``, ``timestamp``, ``date`` (effective date),
+        ``activity``, ``value``, ``cheers`` and ``proof``.  For the whole store
+        the numeric columns are zero-copy views of the underlying arrays.
+        """
+        if rows is not None:
+            idx = np.asarray(rows, dtype=np.intp)
+        elif user is not None:
+            idx = self.user_rows(user)
+        else:
+            idx = slice(0, self.size)
+        cols = {name: col[idx] for name, col in self._cols.items()}
+        return pd.DataFrame(
+            {
+                "id": cols["id"],
+                "user": pd.Categorical.from_codes(cols["user"], categories=self.users),
+                "timestamp": cols["ts"].view("datetime64[s]"),
+                "date": cols["day"].view("datetime64[D]"),
+                "activity": pd.Categorical.from_codes(cols["activity"], categories=self.activities),
+                "value": cols["value"],
+                "cheers": cols["cheers"],
+                # object dtype keeps missing proofs None (pandas would infer strings and NaN)
+                "proof": pd.Series(cols["proof"], dtype=object, copy=False),
+            },
+            copy=False,
+        )
@@ -55,17 +55,19 @@ import streamlit as st
 from db_utils import (
     get_user_habits,
     add_user_habit,
-    get_user_logs,
+    get_log_months,
+    get_user_logs_month,
     log_habit,
-    get_user_friends,
+    get_latest_activities,
+    get_user_index,
     add_friend,
     get_user_profile,
     update_user_name,
     update_service_token,
-    get_service_token,
     db,
 )
 from utils.auth import hash_password, verify_password
+import images
 
 os.makedirs("uploads", exist_ok=True)
 port = int(os.environ.get("PORT", 8501))
@@ -91,14 +93,8 @@ def valid_credentials(email: str, password: str) -> bool:
 
 
 def show_leaderboard():
-    rows = []
-    for key in list(db.keys()):
-        if key.endswith(":profile"):
-            uid = key.split(":")[1]
-            profile = get_user_profile(uid)
-            logs = get_user_logs(uid)
-            total = sum(len(v) for v in logs.values())
-            rows.append({"User": profile.get("name", uid), "Logs": total})
+    # One index record instead of every profile and log key
+    rows = [{"User": entry["name"], "Logs": entry["logs"]} for entry in get_user_index().values()]
     if rows:
         st.table(pd.DataFrame(rows).sort_values("Logs", ascending=False))
     else:
@@ -128,7 +124,7 @@ if "email" not in st.session_state:
                 else:
                     create_user(email.lower().strip(), name.strip(), hash_password(password))
                     st.success("Account created! Please log in.")
-                    st.experimental_rerun()
+                    st.rerun()
     else:
         st.title("🔒 Please Log In")
         with st.form("login_form"):
@@ -138,7 +134,7 @@ if "email" not in st.session_state:
             if submit:
                 if valid_credentials(email.lower().strip(), password):
                     st.session_state["email"] = email.lower().strip()
-                    st.experimental_rerun()
+                    st.rerun()
                 else:
                     st.error("Invalid email or password")
     st.header("🏆 Leaderboard")
@@ -149,6 +145,7 @@ user_id = st.session_state["email"]
 user_name = user_id.split("@")[0]
 st.sidebar.header(f"👋 Hello, {user_name}!")
 
+# Read once per rerun and shared by every page below (each read is a request on Replit DB)
 profile = get_user_profile(user_id)
 if not profile:
     update_user_name(user_id, user_name)
@@ -156,7 +153,7 @@ if not profile:
 
 if st.sidebar.button("Logout"):
     st.session_state.clear()
-    st.experimental_rerun()
+    st.rerun()
 
 # Sidebar menu for navigation
 menu = [
@@ -211,15 +208,18 @@ elif choice == "Log Today's Habits":
             with open(path, "wb") as f:
                 f.write(proof.getbuffer())
             log_habit(user_id, habit, value, today, path)
+            images.submit(path)
             st.success("Logged!")
 
 # --- Past Logs ---
 elif choice == "Past Logs":
     st.title("Past Logs")
-    logs = get_user_logs(user_id)
-    if not logs:
+    months = get_log_months(user_id)
+    if not months:
         st.info("No logs found yet.")
     else:
+        month = st.selectbox("Month", list(reversed(months)))
+        logs = get_user_logs_month(user_id, month)
         for log_date, entries in sorted(logs.items(), reverse=True):
             st.subheader(log_date)
             for habit, data in entries.items():
@@ -227,7 +227,7 @@ elif choice == "Past Logs":
                 proof = data.get("proof") if isinstance(data, dict) else None
                 st.write(f"- **{habit}**: {val}")
                 if proof:
-                    st.image(proof)
+                    st.image(images.display_path(proof))
 
 # --- Friends ---
 elif choice == "Friends":
@@ -237,20 +237,21 @@ elif choice == "Friends":
     if st.button("Add Friend"):
         if friend_id:
             add_friend(user_id, friend_id)
+            profile = get_user_profile(user_id)
             st.success(f"Friend with ID {friend_id} added!")
         else:
             st.error("Please enter a valid friend ID.")
-    friends = get_user_friends(user_id)
+    friends = profile.get("friends", [])
     if friends:
         st.write("**Your friends:**", ", ".join(friends))
+        # One small summary record per friend, fetched together
+        latest_by_friend = get_latest_activities(friends)
         for fid in friends:
             st.subheader(f"Friend ID: {fid}")
-            flog = get_user_logs(fid)
-            if flog:
-                latest = sorted(flog.keys(), reverse=True)[0]
-                st.write(f"Last logged date: {latest}")
-                for habit, data in flog[latest].items():
-                    val = data.get("value") if isinstance(data, dict) else data
+            latest = latest_by_friend.get(fid)
+            if latest:
+                st.write(f"Last logged date: {latest['date']}")
+                for habit, val in latest["habits"].items():
                     st.write(f"- {habit}: {val}")
             else:
                 st.write("No logs for this friend yet.")
@@ -258,17 +259,18 @@ elif choice == "Friends":
 # --- Services ---
 elif choice == "Services":
     st.title("Connect External Services")
+    services = profile.get("services", {})
     strava_tok = st.text_input(
         "Strava Access Token",
-        value=get_service_token(user_id, "strava") or "",
+        value=services.get("strava") or "",
     )
     garmin_tok = st.text_input(
         "Garmin Token",
-        value=get_service_token(user_id, "garmin") or "",
+        value=services.get("garmin") or "",
     )
     apple_tok = st.text_input(
         "Apple Health Token",
-        value=get_service_token(user_id, "apple") or "",
+        value=services.get("apple") or "",
     )
     if st.button("Save Tokens"):
         update_service_token(user_id, "strava", strava_tok)
@@ -0,0 +1,113 @@
+# memory.py
+"""Per-process memory high-water mark, and a cap that evicts caches before the OOM killer.
+
+``check`` is cheap (one read of ``/proc/self/statm``), so the apps call it at
+the top of every rerun.  Once resident memory passes ``config.MEMORY_CAP_MB``
+it runs every registered evictor, collects garbage and hands freed heap back
+to the OS (glibc's ``malloc_trim``; otherwise freed arenas stay mapped).
+Evictors drop things that can be rebuilt on demand::
+
+    @memory.evictor("images")
+    def _drop_pool():
+        ...
+
+``stats()`` reports current RSS, the high-water mark the kernel keeps for the
+process and how often the cap was hit.
+"""
+
+import ctypes
+import ctypes.util
+import gc
+import logging
+import os
+import resource
+import sys
+import threading
+import time
+
+import config
+
+EVICTORS = {}
+# Don't evict again within this many seconds: the trim needs a moment to show in RSS
+EVICT_INTERVAL_SECONDS = 30
+
+log = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_state = {"evictions": 0, "last_eviction": 0.0}
+_PAGE_MB = os.sysconf("SC_PAGE_SIZE") / 2**20 if hasattr(os, "sysconf") else 4096 / 2**20
+
+
+def evictor(name: str):
+    """Register ``func()`` to drop a rebuildable cache when memory passes the cap."""
+    def register(func):
+        EVICTORS[name] = func
+        return func
+    return register
+
+
+def rss_mb() -> float:
+    """Resident memory of this process now."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * _PAGE_MB
+    except OSError:
+        # No procfs (macOS): the peak is the best we can get cheaply
+        return peak_rss_mb()
+
+
+def peak_rss_mb() -> float:
+    """Highest resident memory this process has reached (the kernel's count)."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return peak / 2**20 if sys.platform == "darwin" else peak / 1024
+
+
+def _trim():
+    libc_name = ctypes.util.find_library("c")
+    if not libc_name:
+        return
+    try:
+        trim = ctypes.CDLL(libc_name).malloc_trim
+    except (OSError, AttributeError):
+        return  # not glibc
+    trim(0)
+
+
+def evict() -> float:
+    """Run every evictor, collect and trim; return the MB released."""
+    before = rss_mb()
+    for name, func in list(EVICTORS.items()):
+        try:
+            func()
+        except Exception:
+            log.exception("Evictor %s failed", name)
+    gc.collect()
+    _trim()
+    return before - rss_mb()
+
+
+def check(cap_mb: int = None) -> bool:
+    """Evict if resident memory is over ``cap_mb``; return whether it did."""
+    cap = config.MEMORY_CAP_MB if cap_mb is None else cap_mb
+    if not cap:
+        return False
+    current = rss_mb()
+    with _lock:
+        if current < cap or time.time() - _state["last_eviction"] < EVICT_INTERVAL_SECONDS:
+            return False
+        _state["evictions"] += 1
+        _state["last_eviction"] = time.time()
+    released = evict()
+    log.warning("RSS %.0f MB over the %d MB cap; evicted %s, released %.0f MB",
+                current, cap, ", ".join(EVICTORS) or "nothing", released)
+    return True
+
+
+def stats() -> dict:
+    return {
+        "rss_mb": round(rss_mb(), 1),
+        "peak_mb": round(peak_rss_mb(), 1),
+        "cap_mb": config.MEMORY_CAP_MB,
+        "evictions": _state["evictions"],
+    }
@@ -0,0 +1,285 @@
+# migrate_json.py
+"""Stream JSON stores into the SQLAlchemy schema in ``db.py``.
+
+Handles both JSON layouts in this repo, in any combination within one file:
+
+* ``habits_data.json`` (``habits_tracker_web.py``): ``{"users": {email: {...}}}``
+  (and the legacy ``"players"`` object), each user with goals, logs and follows.
+* ``habits_local.json`` (``db_utils.py``): flat ``user:{id}:profile``,
+  ``user:{id}:habits`` and ``user:{id}:logs[:{YYYY-MM}]`` keys.
+
+The file is never loaded whole: values are decoded one user (or one KV key) at
+a time.  Rows are bulk-inserted and committed in chunks together with a
+checkpoint row, so an interrupted run resumes after the last committed chunk.
+
+Usage::
+
+    python migrate_json.py habits_data.json habits_local.json [--database-url URL] [--chunk 5000]
+"""
+
+import argparse
+import json
+import time
+from datetime import datetime, date, time as dtime
+from pathlib import Path
+
+from sqlalchemy import Column, Integer, MetaData, String, Table, insert, select
+from sqlalchemy.orm import sessionmaker
+
+import config
+from db import Base, User, Goal, Log, Follow, make_engine
+
+CHUNK_ROWS = 5000
+
+_checkpoints = Table(
+    "migration_checkpoints",
+    MetaData(),
+    Column("source", String, primary_key=True),
+    Column("units_done", Integer, nullable=False),
+    Column("rows", Integer, nullable=False),
+)
+
+
+class _Reader:
+    """Incremental JSON reader: walks objects key by key, decoding values on demand."""
+
+    _WS = " \t\r\n"
+
+    def __init__(self, fp, chunk_size: int = 1 << 20):
+        self.fp = fp
+        self.chunk_size = chunk_size
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def _fill(self, size: int = None) -> bool:
+        chunk = self.fp.read(size or self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in self._WS:
+                self.pos += 1
+            if self.pos < len(self.buf) or not self._fill():
+                return self.buf[self.pos] if self.pos < len(self.buf) else ""
+
+    def expect(self, char: str):
+        if self.peek() != char:
+            raise ValueError(f"Expected {char!r} at {self.pos}, found {self.peek()!r}")
+        self.pos += 1
+
+    def value(self):
+        """Decode the next complete JSON value, reading more input as needed."""
+        self.peek()
+        size = self.chunk_size
+        while True:
+            try:
+                obj, end = self.decoder.raw_decode(self.buf, self.pos)
+                # A number ending at the buffer edge may continue in the next chunk
+                if end < len(self.buf) or self.eof:
+                    self.pos = end
+                    return obj
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            self._fill(size)
+            size *= 2
+
+    def items(self):
+        """Yield ``(key, reader)`` for each member of the object at the cursor.
+
+        The consumer must either call ``value()`` or ``items()`` on the reader
+        before advancing the generator.
+        """
+        self.expect("{")
+        if self.peek() == "}":
+            self.pos += 1
+            return
+        while True:
+            key = self.value()
+            self.expect(":")
+            yield key, self
+            if self.peek() == ",":
+                self.pos += 1
+            else:
+                self.expect("}")
+                return
+
+
+def iter_units(fp):
+    """Yield ``("web", email, user_dict)`` or ``("kv", key, value)`` units in file order."""
+    reader = _Reader(fp)
+    for key, sub in reader.items():
+        if key in ("users", "players") and sub.peek() == "{":
+            for email, user_reader in sub.items():
+                yield "web", email, user_reader.value()
+        elif key.startswith("user:"):
+            yield "kv", key, sub.value()
+        else:
+            sub.value()
+
+
+def _kv_number(value):
+    """KV values are numbers or ``{unit: number}`` dicts (duration first, then distance)."""
+    if isinstance(value, dict):
+        numbers = list(value.values())
+        return float(numbers[0]) if numbers else 0.0, float(numbers[1]) if len(numbers) > 1 else None
+    return float(value), None
+
+
+class Migrator:
+    def __init__(self, session, chunk_rows: int = CHUNK_ROWS):
+        self.session = session
+        self.chunk_rows = chunk_rows
+        self.user_ids = dict(session.execute(select(User.email, User.id)).all())
+        self.goals = set(session.execute(select(Goal.user_id, Goal.activity)).all())
+        self.follows = []  # (follower email, followed email), inserted at the end
+        self.pending = {Log: [], Goal: []}
+        self.rows = 0
+        self.started = time.perf_counter()
+
+    def user_id(self, email: str, name: str = None, hashed_password: str = "") -> int:
+        uid = self.user_ids.get(email)
+        if uid is None:
+            user = User(email=email, name=name or email.split("@")[0], hashed_password=hashed_password or "")
+            self.session.add(user)
+            self.session.flush()
+            uid = self.user_ids[email] = user.id
+            self.rows += 1
+        return uid
+
+    def add_goal(self, uid: int, activity: str, target):
+        if (uid, activity) not in self.goals:
+            self.goals.add((uid, activity))
+            self.pending[Goal].append({"user_id": uid, "activity": activity, "target": float(target)})
+
+    def migrate_web_user(self, email: str, data: dict, apply: bool):
+        if not isinstance(data, dict):
+            data = {}
+        for followed in data.get("follows", []):
+            self.follows.append((email, followed))
+        if not apply:
+            return
+        uid = self.user_id(email, data.get("name"))
+        for activity, target in data.get("goals", {}).items():
+            self.add_goal(uid, activity, target)
+        for log in data.get("logs", []):
+            self.pending[Log].append({
+                "user_id": uid,
+                "activity": log["activity"],
+                "value": float(log.get("value", 0)),
+                "timestamp": datetime.fromisoformat(log["timestamp"]),
+                "proof_url": log.get("proof"),
+                "cheers": log.get("cheers", 0),
+            })
+
+    def migrate_kv_key(self, key: str, value, apply: bool):
+        _, user_key, kind = key.split(":", 2)
+        if kind == "profile":
+            for friend in value.get("friends", []):
+                self.follows.append((user_key, friend))
+            if apply:
+                self.user_id(user_key, value.get("name"), value.get("hashed_password", ""))
+        elif not apply:
+            return
+        elif kind == "habits":
+            uid = self.user_id(user_key)
+            for habit, info in value.items():
+                self.add_goal(uid, habit, _kv_number(info.get("goal", 0))[0])
+        elif kind == "logs" or (kind.startswith("logs:") and kind != "logs:index"):
+            uid = self.user_id(user_key)
+            for day, entries in value.items():
+                timestamp = datetime.combine(date.fromisoformat(day), dtime(12))
+                for habit, entry in entries.items():
+                    raw = entry.get("value") if isinstance(entry, dict) else entry
+                    amount, distance = _kv_number(raw)
+                    self.pending[Log].append({
+                        "user_id": uid,
+                        "activity": habit,
+                        "value": amount,
+                        "distance": distance,
+                        "timestamp": timestamp,
+                        "proof_url": entry.get("proof") if isinstance(entry, dict) else None,
+                    })
+
+    def pending_rows(self) -> int:
+        return sum(len(rows) for rows in self.pending.values())
+
+    def flush(self, source: str, units_done: int):
+        """Insert pending rows and the checkpoint in one transaction."""
+        for model, rows in self.pending.items():
+            if rows:
+                self.session.execute(insert(model), rows)
+                self.rows += len(rows)
+                rows.clear()
+        self.session.execute(_checkpoints.delete().where(_checkpoints.c.source == source))
+        self.session.execute(insert(_checkpoints), [{"source": source, "units_done": units_done, "rows": self.rows}])
+        self.session.commit()
+        elapsed = time.perf_counter() - self.started
+        print(f"{source}: {units_done} units, {self.rows} rows, {self.rows / max(elapsed, 1e-9):,.0f} rows/s")
+
+    def finish_follows(self):
+        existing = set(self.session.execute(select(Follow.follower_id, Follow.followed_id)).all())
+        rows = []
+        for follower, followed in self.follows:
+            pair = (self.user_ids.get(follower), self.user_ids.get(followed))
+            if None not in pair and pair[0] != pair[1] and pair not in existing:
+                existing.add(pair)
+                rows.append({"follower_id": pair[0], "followed_id": pair[1]})
+        if rows:
+            self.session.execute(insert(Follow), rows)
+        self.session.commit()
+        self.rows += len(rows)
+
+
+def migrate_file(migrator: Migrator, path: Path):
+    source = str(path.resolve())
+    done = migrator.session.execute(
+        select(_checkpoints.c.units_done).where(_checkpoints.c.source == source)
+    ).scalar() or 0
+    if done:
+        print(f"{source}: resuming after {done} units")
+    units = 0
+    with path.open(encoding="utf-8") as fp:
+        for kind, key, value in iter_units(fp):
+            units += 1
+            apply = units > done
+            if kind == "web":
+                migrator.migrate_web_user(key, value, apply)
+            else:
+                migrator.migrate_kv_key(key, value, apply)
+            if apply and migrator.pending_rows() >= migrator.chunk_rows:
+                migrator.flush(source, units)
+    migrator.flush(source, units)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("files", nargs="+", type=Path)
+    parser.add_argument("--database-url", default=config.DATABASE_URL)
+    parser.add_argument("--chunk", type=int, default=CHUNK_ROWS, help="rows per transaction")
+    args = parser.parse_args(argv)
+
+    engine = make_engine(args.database_url)
+    Base.metadata.create_all(bind=engine)
+    _checkpoints.create(bind=engine, checkfirst=True)
+    session = sessionmaker(bind=engine)()
+    migrator = Migrator(session, args.chunk)
+    try:
+        for path in args.files:
+            migrate_file(migrator, path)
+        migrator.finish_follows()
+    finally:
+        session.close()
+    elapsed = time.perf_counter() - migrator.started
+    print(f"Done: {migrator.rows} rows in {elapsed:.1f}s ({migrator.rows / max(elapsed, 1e-9):,.0f} rows/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+# rankings.py
+"""Per-activity leaderboards kept up to date incrementally.
+
+``Rankings`` holds one ``SortedList`` score index per ``(activity, window)``,
+where a window is the current ISO week, the current month or all time.  New
+logs are applied with ``add`` (or picked up from the database by ``catch_up``,
+which reads only logs newer than the last one seen), so updating a score is
+O(log n) and serving the top ``k`` is a slice of an already sorted index.  ``refresh`` also rebuilds everything from
+the database every ``config.RANKINGS_RECOMPUTE_SECONDS`` and logs any drift
+between the incremental and recomputed scores.
+"""
+
+import logging
+import threading
+import time
+from datetime import date
+
+from sortedcontainers import SortedList
+from sqlalchemy import func
+
+import config
+from db import Log, DailyRollup, stream_query
+
+WINDOWS = ("week", "month", "all")
+
+log = logging.getLogger(__name__)
+
+
+def window_keys(day: date) -> dict:
+    """Which week, month and all-time board a log on ``day`` counts towards."""
+    year, week, _ = day.isocalendar()
+    return {"week": f"{year}-W{week:02d}", "month": day.strftime("%Y-%m"), "all": "all"}
+
+
+class _Board:
+    """Scores by user plus an index of ``(-score, user_id)`` kept in rank order."""
+
+    def __init__(self):
+        self.scores = {}
+        self.order = SortedList()
+
+    def add(self, user_id: int, amount: float):
+        old = self.scores.get(user_id)
+        if old is not None:
+            self.order.remove((-old, user_id))
+        new = (old or 0.0) + amount
+        self.scores[user_id] = new
+        self.order.add((-new, user_id))
+
+    def top(self, k: int):
+        return [(user_id, -neg) for neg, user_id in self.order[:k]]
+
+
+class Rankings:
+    def __init__(self):
+        self.boards = {}
+        self.last_log_id = 0
+        self.built_at = 0.0
+        self._lock = threading.Lock()
+
+    def add(self, user_id: int, activity: str, value: float, day: date):
+        current = window_keys(date.today())
+        for window, key in window_keys(day).items():
+            # Past weeks and months are never served, so don't keep boards for them
+            if key >= current[window]:
+                self.boards.setdefault((activity, window, key), _Board()).add(user_id, value or 0.0)
+
+    def _board(self, activity: str, window: str, today: date = None):
+        return self.boards.get((activity, window, window_keys(today or date.today())[window]))
+
+    def top(self, activity: str, window: str, k: int = 10, today: date = None):
+        """``[(user_id, score)]`` for the best ``k`` users, best first."""
+        board = self._board(activity, window, today)
+        return board.top(k) if board else []
+
+    def among(self, activity: str, window: str, user_ids, today: date = None):
+        """Scores of ``user_ids`` only (e.g. a user and the people they follow), best first."""
+        board = self._board(activity, window, today)
+        scores = board.scores if board else {}
+        return sorted(((uid, scores.get(uid, 0.0)) for uid in dict.fromkeys(user_ids)), key=lambda row: (-row[1], row[0]))
+
+    def catch_up(self, db_session) -> int:
+        """Apply logs added since the last call; return how many were applied."""
+        count = 0
+        for row in stream_query(db_session.query(Log).filter(Log.id > self.last_log_id).order_by(Log.id)):
+            self.add(row.user_id, row.activity, row.value, row.timestamp.date())
+            self.last_log_id = row.id
+            count += 1
+        return count
+
+    @classmethod
+    def build(cls, db_session) -> "Rankings":
+        """Recompute every board from hot logs and archived daily totals."""
+        rankings = cls()
+        # Read the watermark first so a log committed mid-build is caught up later, not lost
+        rankings.last_log_id = db_session.query(func.max(Log.id)).scalar() or 0
+        for rollup in stream_query(db_session.query(DailyRollup)):
+            rankings.add(rollup.user_id, rollup.activity, rollup.total, rollup.day)
+        for row in stream_query(db_session.query(Log).filter(Log.id <= rankings.last_log_id)):
+            rankings.add(row.user_id, row.activity, row.value, row.timestamp.date())
+        rankings.built_at = time.time()
+        return rankings
+
+    def drift(self, other: "Rankings", tolerance: float = 1e-6):
+        """``[(board, user_id, ours, theirs)]`` wherever the two disagree."""
+        mismatches = []
+        current = window_keys(date.today())
+        for key in self.boards.keys() | other.boards.keys():
+            if key[2] < current[key[1]]:
+                continue
+            ours = self.boards[key].scores if key in self.boards else {}
+            theirs = other.boards[key].scores if key in other.boards else {}
+            for user_id in ours.keys() | theirs.keys():
+                a, b = ours.get(user_id, 0.0), theirs.get(user_id, 0.0)
+                if abs(a - b) > tolerance:
+                    mismatches.append((key, user_id, a, b))
+        return mismatches
+
+    def refresh(self, db_session):
+        """Catch up with new logs, or recompute from scratch when the last build is old."""
+        with self._lock:
+            if time.time() - self.built_at < config.RANKINGS_RECOMPUTE_SECONDS:
+                self.catch_up(db_session)
+                return
+            fresh = Rankings.build(db_session)
+            fresh.catch_up(db_session)
+            if self.built_at:
+                self.catch_up(db_session)
+                mismatches = self.drift(fresh)
+                if mismatches:
+                    log.warning("Rankings drifted on %d scores, e.g. %s", len(mismatches), mismatches[:5])
+            self.boards, self.last_log_id, self.built_at = fresh.boards, fresh.last_log_id, fresh.built_at
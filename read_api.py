@@ -0,0 +1,320 @@
+# read_api.py
+"""Read-only JSON API over the models in ``db.py`` for mobile clients and widgets.
+
+Routes (GET/HEAD only)::
+
+    /users/<id>/stats                       compliance, sub-streaks and main streak
+    /users/<id>/feed?limit=20&before=<id>   followed users' logs, newest first
+    /leaderboard                            main-streak board
+    /leaderboard?activity=Running&window=week[&friends_of=<id>]
+
+Every response carries an ETag derived from the ``user_versions`` rows it
+depends on (plus today's date, since streaks roll over at midnight).
+Last-Modified comes from the same token: it is the second the server first
+saw the resource at that ETag, and moves forward at least a second every time
+the ETag changes, so If-Modified-Since can't hide a write made in the same
+second.  Checking costs one small query, so a poll with a matching
+If-None-Match or If-Modified-Since gets a 304 without recomputing anything;
+recently built bodies are also kept in memory by ETag.
+
+Run it with ``python read_api.py [--host 0.0.0.0] [--port 8600]``, or
+exercise it in-process with ``TestClient``.
+"""
+
+import argparse
+import hashlib
+import json
+import re
+import socketserver
+import threading
+from collections import OrderedDict
+from datetime import date, datetime, timedelta, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from io import BytesIO
+from urllib.parse import parse_qs
+from wsgiref.simple_server import WSGIServer, make_server
+from wsgiref.util import setup_testing_defaults
+
+from sqlalchemy import func
+
+import config
+from archive import user_history
+from db import ReadSessionLocal, User, Log, Follow, UserVersion, init_db
+from rankings import Rankings, WINDOWS
+from stats import logs_frame, load_goals, load_excused, user_stats, main_streak_board
+
+MAX_FEED_PAGE = 100
+MAX_BOARD_PAGE = 100
+_MEMO_SIZE = 256
+_VALIDATORS_SIZE = 4096
+
+_memo = OrderedDict()
+# ``path?query`` -> (etag, last_modified) of the newest version served
+_validators = OrderedDict()
+_memo_lock = threading.Lock()
+_rankings = Rankings()
+
+
+class HTTPError(Exception):
+    def __init__(self, status: str, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+def _int_param(params, name, default=None):
+    raw = params.get(name, [None])[0]
+    if raw is None:
+        return default
+    try:
+        return int(raw)
+    except ValueError:
+        raise HTTPError("400 Bad Request", f"{name} must be an integer")
+
+
+def _limit_param(params, default: int, maximum: int) -> int:
+    # LIMIT 0 would return nothing and a negative LIMIT means "no limit" on SQLite
+    return max(1, min(_int_param(params, "limit", default), maximum))
+
+
+def _get_user(session, user_id: int) -> User:
+    user = session.get(User, user_id)
+    if user is None:
+        raise HTTPError("404 Not Found", f"no user {user_id}")
+    return user
+
+
+def _followed_ids(session, user_id: int):
+    return [row[0] for row in session.query(Follow.followed_id).filter(Follow.follower_id == user_id)]
+
+
+def _version(session, user_ids=None) -> str:
+    """Version token for the data of ``user_ids`` (all users if ``None``)."""
+    query = session.query(func.count(UserVersion.user_id), func.coalesce(func.sum(UserVersion.version), 0))
+    if user_ids is not None:
+        query = query.filter(UserVersion.user_id.in_(user_ids))
+    count, total = query.one()
+    tag = f"{count}.{total}"
+    if user_ids is None:
+        # Sign-ups add users to boards without touching user_versions
+        tag += f".{session.query(func.max(User.id)).scalar() or 0}"
+    return tag
+
+
+def _last_modified(resource: str, etag: str) -> datetime:
+    """When ``resource`` was first served at ``etag``, strictly later than its previous ETag."""
+    with _memo_lock:
+        seen = _validators.get(resource)
+        if seen is not None and seen[0] == etag:
+            _validators.move_to_end(resource)
+            return seen[1]
+        modified = datetime.now(timezone.utc).replace(microsecond=0)
+        if seen is not None:
+            modified = max(modified, seen[1] + timedelta(seconds=1))
+        _validators[resource] = (etag, modified)
+        _validators.move_to_end(resource)
+        while len(_validators) > _VALIDATORS_SIZE:
+            _validators.popitem(last=False)
+        return modified
+
+
+# Routes: each returns ``(version, compute)``; compute is only called when the
+# client's copy is stale and the memo has no body for the ETag.
+
+def _stats(session, params, user_id):
+    _get_user(session, user_id)
+    tag = _version(session, [user_id])
+
+    def compute():
+        today = date.today()
+        goals = load_goals(session, [user_id])[user_id]
+        excused = load_excused(session, [user_id])[user_id]
+        compliance, streaks, main = user_stats(logs_frame(user_history(session, user_id)), goals, today, excused)
+        return {"user_id": user_id, "date": today.isoformat(), "main_streak": main,
+                "compliance": compliance, "streaks": streaks}
+
+    return tag, compute
+
+
+def _feed(session, params, user_id):
+    _get_user(session, user_id)
+    limit = _limit_param(params, 20, MAX_FEED_PAGE)
+    before = _int_param(params, "before")
+    followed = _followed_ids(session, user_id)
+    tag = _version(session, [user_id] + followed)
+
+    def compute():
+        query = session.query(Log, User.name).join(User, User.id == Log.user_id).filter(Log.user_id.in_(followed))
+        anchor = session.get(Log, before) if before is not None else None
+        if anchor is not None:
+            # Keyset pagination on (timestamp, id), newest first
+            query = query.filter(
+                (Log.timestamp < anchor.timestamp) | ((Log.timestamp == anchor.timestamp) & (Log.id < anchor.id))
+            )
+        rows = query.order_by(Log.timestamp.desc(), Log.id.desc()).limit(limit).all()
+        items = [
+            {"id": log.id, "user_id": log.user_id, "user": name, "activity": log.activity,
+             "value": log.value, "distance": log.distance, "timestamp": log.timestamp.isoformat(),
+             "cheers": log.cheers or 0, "proof": log.proof_url}
+            for log, name in rows
+        ]
+        return {"items": items, "next_before": items[-1]["id"] if len(items) == limit else None}
+
+    return tag, compute
+
+
+def _leaderboard(session, params):
+    activity = params.get("activity", [None])[0]
+    if activity is None:
+        return _version(session), lambda: {"board": main_streak_board(session, date.today())}
+
+    window = params.get("window", ["week"])[0]
+    if window not in WINDOWS:
+        raise HTTPError("400 Bad Request", f"window must be one of {', '.join(WINDOWS)}")
+    friends_of = _int_param(params, "friends_of")
+    if friends_of is not None:
+        _get_user(session, friends_of)
+    limit = _limit_param(params, 10, MAX_BOARD_PAGE)
+    tag = _version(session)
+
+    def compute():
+        _rankings.refresh(session)
+        if friends_of is not None:
+            rows = _rankings.among(activity, window, [friends_of] + _followed_ids(session, friends_of))
+        else:
+            rows = _rankings.top(activity, window, k=limit)
+        names = dict(session.query(User.id, User.name).filter(User.id.in_([uid for uid, _ in rows])))
+        return {"activity": activity, "window": window,
+                "board": [{"user_id": uid, "user": names.get(uid), "total": score} for uid, score in rows]}
+
+    return tag, compute
+
+
+ROUTES = [
+    (re.compile(r"^/users/(\d+)/stats$"), _stats),
+    (re.compile(r"^/users/(\d+)/feed$"), _feed),
+    (re.compile(r"^/leaderboard$"), _leaderboard),
+]
+
+
+def _json_default(value):
+    # numpy scalars from the pandas-based stats
+    if hasattr(value, "item"):
+        return value.item()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def _not_modified(environ, etag: str, modified: datetime) -> bool:
+    if_none_match = environ.get("HTTP_IF_NONE_MATCH")
+    if if_none_match is not None:
+        return if_none_match.strip() == "*" or etag in [t.strip() for t in if_none_match.split(",")]
+    since = environ.get("HTTP_IF_MODIFIED_SINCE")
+    if since:
+        try:
+            since = parsedate_to_datetime(since)
+        except (TypeError, ValueError):
+            return False
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+        return modified <= since
+    return False
+
+
+def _respond(start_response, status: str, headers: list, body: bytes = b""):
+    start_response(status, headers + [("Content-Length", str(len(body)))])
+    return [body]
+
+
+def application(environ, start_response):
+    method = environ.get("REQUEST_METHOD", "GET")
+    if method not in ("GET", "HEAD"):
+        return _respond(start_response, "405 Method Not Allowed", [("Allow", "GET, HEAD")])
+    if config.READ_API_KEY and environ.get("HTTP_AUTHORIZATION") != f"Bearer {config.READ_API_KEY}":
+        return _respond(start_response, "401 Unauthorized", [("WWW-Authenticate", "Bearer")])
+
+    path = environ.get("PATH_INFO", "/")
+    params = parse_qs(environ.get("QUERY_STRING", ""))
+    session = ReadSessionLocal()
+    try:
+        for pattern, route in ROUTES:
+            match = pattern.match(path)
+            if match:
+                version, compute = route(session, params, *(int(g) for g in match.groups()))
+                break
+        else:
+            raise HTTPError("404 Not Found", f"no route {path}")
+
+        query = environ.get("QUERY_STRING", "")
+        digest = hashlib.sha1(f"{path}?{query}|{version}|{date.today()}".encode()).hexdigest()[:20]
+        etag = f'W/"{digest}"'
+        modified = _last_modified(f"{path}?{query}", etag)
+        headers = [
+            ("ETag", etag),
+            ("Last-Modified", format_datetime(modified, usegmt=True)),
+            ("Cache-Control", "no-cache"),
+        ]
+        if _not_modified(environ, etag, modified):
+            return _respond(start_response, "304 Not Modified", headers)
+
+        with _memo_lock:
+            body = _memo.get(etag)
+            if body is not None:
+                _memo.move_to_end(etag)
+        if body is None:
+            body = json.dumps(compute(), separators=(",", ":"), default=_json_default).encode()
+            with _memo_lock:
+                _memo[etag] = body
+                while len(_memo) > _MEMO_SIZE:
+                    _memo.popitem(last=False)
+        headers.append(("Content-Type", "application/json"))
+        return _respond(start_response, "200 OK", headers, b"" if method == "HEAD" else body)
+    except HTTPError as exc:
+        body = json.dumps({"error": str(exc)}).encode()
+        return _respond(start_response, exc.status, [("Content-Type", "application/json")], body)
+    finally:
+        session.close()
+
+
+class Response:
+    def __init__(self, status: str, headers: list, body: bytes):
+        self.status_code = int(status.split()[0])
+        self.headers = dict(headers)
+        self.body = body
+
+    def json(self):
+        return json.loads(self.body)
+
+
+class TestClient:
+    """Call a WSGI app in-process: ``TestClient().get("/leaderboard", {"If-None-Match": etag})``."""
+
+    def __init__(self, app=application):
+        self.app = app
+
+    def get(self, url: str, headers: dict = None, method: str = "GET") -> Response:
+        path, _, query = url.partition("?")
+        environ = {"REQUEST_METHOD": method, "PATH_INFO": path, "QUERY_STRING": query, "wsgi.input": BytesIO()}
+        for name, value in (headers or {}).items():
+            environ["HTTP_" + name.upper().replace("-", "_")] = value
+        setup_testing_defaults(environ)
+        captured = {}
+
+        def start_response(status, response_headers, exc_info=None):
+            captured["status"], captured["headers"] = status, response_headers
+
+        body = b"".join(self.app(environ, start_response))
+        return Response(captured["status"], captured["headers"], body)
+
+
+class ThreadingWSGIServer(socketserver.ThreadingMixIn, WSGIServer):
+    daemon_threads = True
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve the read-only JSON API.")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=config.READ_API_PORT)
+    args = parser.parse_args()
+    init_db()
+    with make_server(args.host, args.port, application, server_class=ThreadingWSGIServer) as server:
+        print(f"Read API on http://{args.host}:{args.port}")
+        server.serve_forever()
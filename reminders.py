@@ -0,0 +1,275 @@
+# reminders.py
+"""Streak-at-risk reminders, fired only for users whose deadline is near.
+
+Days follow the streak code in ``stats.py``/``weekly.py``: a log counts for
+its timestamp's calendar date, so a user's day ends at midnight.
+``config.REMINDER_LEAD_MINUTES`` before that, a user whose main-streak goals
+for the day (Sleep and Anki for the day, Running for the week) are still
+unmet gets a reminder with the streak they are about to lose.
+
+``ReminderScheduler`` keeps a heap with one entry per active user at their
+next reminder moment, plus each user's main-activity totals for the last
+seven days.  New logs are read past a ``Log.id`` watermark (as
+``Rankings.catch_up`` does) or passed to ``on_log``; they update the totals
+and move users who have met the day's goals to tomorrow.  So at the reminder
+moment only users still short are popped, and only their streaks are
+computed.  Users with no log in the last week aren't scheduled until they log
+again.
+
+Notifiers are callables taking a reminder dict: ``OutboxNotifier`` appends
+JSON lines to ``config.REMINDER_OUTBOX_PATH``; ``LogNotifier`` logs them.
+Run the service with ``python reminders.py [--once]``.
+"""
+
+import argparse
+import heapq
+import json
+import logging
+import threading
+import time as _time
+from datetime import date, datetime, time, timedelta
+
+from sqlalchemy import func
+
+import config
+from db import SessionLocal, User, Log, UserVersion, init_db
+from stats import MAIN_STREAK_ACTIVITIES, load_goals, load_excused, user_main_streaks
+
+# Sleep and Anki are due every day; Running over the week
+DAILY_REMINDER_ACTIVITIES = MAIN_STREAK_ACTIVITIES[:2]
+WEEKLY_REMINDER_ACTIVITIES = MAIN_STREAK_ACTIVITIES[2:]
+WINDOW_DAYS = 7
+
+log = logging.getLogger(__name__)
+
+
+class OutboxNotifier:
+    """Append reminders as JSON lines to a file another process (or a test) drains."""
+
+    def __init__(self, path: str = None):
+        self.path = path or config.REMINDER_OUTBOX_PATH
+        self._lock = threading.Lock()
+
+    def __call__(self, reminder: dict):
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(reminder) + "\n")
+
+
+class LogNotifier:
+    def __call__(self, reminder: dict):
+        log.info("Reminder for %s: %s", reminder["email"], reminder["message"])
+
+
+NOTIFIERS = {"outbox": OutboxNotifier, "log": LogNotifier}
+
+
+def effective_day(ts: datetime) -> date:
+    """The day a log at ``ts`` counts for, as in ``main_streak``: its calendar date."""
+    return ts.date()
+
+
+def deadline(day: date) -> datetime:
+    return datetime.combine(day + timedelta(days=1), time.min)
+
+
+class ReminderScheduler:
+    def __init__(self, notifier=None, lead_minutes: int = None):
+        self.notifier = notifier or NOTIFIERS[config.REMINDER_NOTIFIER]()
+        lead = config.REMINDER_LEAD_MINUTES if lead_minutes is None else lead_minutes
+        self.lead = timedelta(minutes=lead)
+        self.heap = []
+        self.due = {}      # user_id -> (reminder time, day ordinal) of their live heap entry
+        self.totals = {}   # user_id -> {day ordinal: [total per MAIN_STREAK_ACTIVITIES]}
+        self.goals = {}
+        self.excused = {}
+        self.last_log_id = 0
+        self.versions_seen = datetime.min
+        self._lock = threading.Lock()
+
+    def reminder_time(self, day: date) -> datetime:
+        return deadline(day) - self.lead
+
+    def _schedule(self, user_id: int, day: date):
+        at = self.reminder_time(day)
+        self.due[user_id] = (at, day.toordinal())
+        heapq.heappush(self.heap, (at, user_id, day.toordinal()))
+
+    def _load_rules(self, db_session, user_ids):
+        self.goals.update(load_goals(db_session, user_ids))
+        self.excused.update(load_excused(db_session, user_ids))
+
+    def on_log(self, user_id: int, activity: str, value: float, timestamp: datetime, today: date = None):
+        """Count a new log; reschedule the user if it completes today's goals."""
+        if activity not in MAIN_STREAK_ACTIVITIES:
+            return
+        today = today or effective_day(datetime.now())
+        day = effective_day(timestamp).toordinal()
+        if day <= today.toordinal() - WINDOW_DAYS:
+            return
+        days = self.totals.setdefault(user_id, {})
+        days.setdefault(day, [0.0] * len(MAIN_STREAK_ACTIVITIES))[MAIN_STREAK_ACTIVITIES.index(activity)] += value or 0.0
+        current = self.due.get(user_id)
+        if current is None or current[1] < today.toordinal():
+            self._schedule(user_id, today if self.missing(user_id, today) else today + timedelta(days=1))
+        elif current[1] == today.toordinal() and not self.missing(user_id, today):
+            self._schedule(user_id, today + timedelta(days=1))
+
+    def missing(self, user_id: int, day: date) -> list:
+        """Main-streak activities still short on ``day`` (nothing on excused days)."""
+        excused = self.excused.get(user_id)
+        if excused and day in excused:
+            return []
+        goals = self.goals.get(user_id)
+        days = self.totals.get(user_id, {})
+        first = day.toordinal() - WINDOW_DAYS + 1
+        if config.WEEK_BOUNDARY == "iso":
+            first = max(first, day.toordinal() - day.weekday())
+        zero = [0.0] * len(MAIN_STREAK_ACTIVITIES)
+        short = []
+        for activity in DAILY_REMINDER_ACTIVITIES:
+            i = MAIN_STREAK_ACTIVITIES.index(activity)
+            if days.get(day.toordinal(), zero)[i] < (goals.target(activity) if goals else 0):
+                short.append(activity)
+        # An ISO week only lapses on its last day
+        if config.WEEK_BOUNDARY == "rolling" or day.weekday() == 6:
+            for activity in WEEKLY_REMINDER_ACTIVITIES:
+                i = MAIN_STREAK_ACTIVITIES.index(activity)
+                total = sum(days.get(d, zero)[i] for d in range(first, day.toordinal() + 1))
+                if total < (goals.target(activity) if goals else 0):
+                    short.append(activity)
+        return short
+
+    def load(self, db_session, now: datetime = None):
+        """Schedule every user who logged in the last week; read nothing older."""
+        now = now or datetime.now()
+        today = effective_day(now)
+        with self._lock:
+            self.last_log_id = db_session.query(func.max(Log.id)).scalar() or 0
+            self.versions_seen = db_session.query(func.max(UserVersion.updated_at)).scalar() or datetime.min
+            since = datetime.combine(today - timedelta(days=WINDOW_DAYS - 1), time.min)
+            recent = (
+                db_session.query(Log.user_id, Log.activity, Log.value, Log.timestamp)
+                .filter(Log.timestamp >= since, Log.id <= self.last_log_id, Log.activity.in_(MAIN_STREAK_ACTIVITIES))
+                .all()
+            )
+            self._load_rules(db_session, list({row.user_id for row in recent}))
+            for row in recent:
+                self.on_log(row.user_id, row.activity, row.value, row.timestamp, today)
+
+    def catch_up(self, db_session, now: datetime = None) -> int:
+        """Apply logs and goal/excuse changes since the last call; return logs applied."""
+        today = effective_day(now or datetime.now())
+        with self._lock:
+            changed = (
+                db_session.query(UserVersion.user_id, UserVersion.updated_at)
+                .filter(UserVersion.updated_at >= self.versions_seen)
+                .all()
+            )
+            stale = [uid for uid, _ in changed if uid in self.goals]
+            if stale:
+                self._load_rules(db_session, stale)
+            if changed:
+                self.versions_seen = max(updated for _, updated in changed)
+            rows = (
+                db_session.query(Log.id, Log.user_id, Log.activity, Log.value, Log.timestamp)
+                .filter(Log.id > self.last_log_id)
+                .order_by(Log.id)
+                .all()
+            )
+            new_users = list({row.user_id for row in rows} - self.goals.keys())
+            if new_users:
+                self._load_rules(db_session, new_users)
+            for row in rows:
+                self.on_log(row.user_id, row.activity, row.value, row.timestamp, today)
+                self.last_log_id = row.id
+            # Goal or excuse changes can settle (or reopen) today for a scheduled user
+            for uid in stale:
+                current = self.due.get(uid)
+                if current and current[1] == today.toordinal() and not self.missing(uid, today):
+                    self._schedule(uid, today + timedelta(days=1))
+            return len(rows)
+
+    def fire_due(self, db_session, now: datetime = None) -> list:
+        """Send reminders whose moment has come; return them."""
+        now = now or datetime.now()
+        with self._lock:
+            popped = []
+            while self.heap and self.heap[0][0] <= now:
+                at, uid, day = heapq.heappop(self.heap)
+                if self.due.get(uid) == (at, day):
+                    popped.append((uid, date.fromordinal(day)))
+            due = []
+            for uid, day in popped:
+                del self.due[uid]
+                days = self.totals.get(uid, {})
+                for old in [d for d in days if d <= day.toordinal() - WINDOW_DAYS]:
+                    del days[old]
+                if not days:
+                    # Inactive for a week: not scheduled again until they log
+                    self.totals.pop(uid, None)
+                    continue
+                self._schedule(uid, day + timedelta(days=1))
+                short = self.missing(uid, day)
+                if short and now < deadline(day):
+                    due.append((uid, day, short))
+            if not due:
+                return []
+            users = {u.id: u for u in db_session.query(User).filter(User.id.in_([uid for uid, _, _ in due]))}
+            reminders = []
+            for day in sorted({day for _, day, _ in due}):
+                ids = [uid for uid, d, _ in due if d == day]
+                streaks = user_main_streaks(db_session, day - timedelta(days=1), ids)
+                for uid, d, short in due:
+                    if d != day or uid not in users:
+                        continue
+                    streak = streaks.get(uid, 0)
+                    at_risk = f"your {streak}-day streak ends" if streak else "today's goals lapse"
+                    reminders.append({
+                        "user_id": uid,
+                        "email": users[uid].email,
+                        "name": users[uid].name,
+                        "day": day.isoformat(),
+                        "deadline": deadline(day).isoformat(),
+                        "missing": short,
+                        "streak": streak,
+                        "message": f"Still to do: {', '.join(short)}. At {deadline(day):%H:%M} {at_risk}.",
+                    })
+        for reminder in reminders:
+            try:
+                self.notifier(reminder)
+            except Exception:
+                log.exception("Notifier failed for user %s", reminder["user_id"])
+        return reminders
+
+    def tick(self, db_session, now: datetime = None) -> list:
+        self.catch_up(db_session, now)
+        return self.fire_due(db_session, now)
+
+
+def run(interval: float = None, once: bool = False):
+    init_db()
+    scheduler = ReminderScheduler()
+    session = SessionLocal()
+    try:
+        scheduler.load(session)
+        while True:
+            sent = scheduler.tick(session)
+            session.rollback()  # end the read transaction so the next tick sees new rows
+            if sent:
+                log.info("Sent %d reminders", len(sent))
+            if once:
+                return sent
+            _time.sleep(interval or config.REMINDER_POLL_SECONDS)
+    finally:
+        session.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Send streak-at-risk reminders.")
+    parser.add_argument("--once", action="store_true", help="send what is due now and exit")
+    parser.add_argument("--interval", type=float, default=config.REMINDER_POLL_SECONDS)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    sent = run(args.interval, args.once)
+    if args.once:
+        print(f"Sent {len(sent)} reminders")
@@ -0,0 +1,111 @@
+# serve.py
+"""Run ``WEB_CONCURRENCY`` Streamlit workers behind a single port.
+
+Each worker listens on a private port and a small TCP proxy on ``$PORT`` hands
+connections to them.  Streamlit keeps session state in the worker that owns
+the websocket, so clients are pinned to a worker by their address
+(``Fly-Client-IP`` / ``X-Forwarded-For`` when behind a proxy).  Shared
+aggregates live in ``shared_cache.SharedCache`` so every worker sees the same
+leaderboard.
+
+Usage::
+
+    WEB_CONCURRENCY=4 PORT=8080 python serve.py [app.py]
+"""
+
+import asyncio
+import os
+import signal
+import subprocess
+import sys
+import zlib
+
+import config
+
+HEADER_LIMIT = 64 * 1024
+
+# Apps that keep their data in process memory and can't share it between workers
+SINGLE_PROCESS_APPS = {"habits_tracker_web.py"}
+
+
+def streamlit_command(script: str, port: int, address: str):
+    return [
+        sys.executable, "-m", "streamlit", "run", script,
+        "--server.port", str(port),
+        "--server.address", address,
+        "--server.headless", "true",
+    ]
+
+
+def _client_key(head: bytes, peer: str) -> str:
+    for line in head.split(b"\r\n")[1:]:
+        name, _, value = line.partition(b":")
+        if name.strip().lower() in (b"fly-client-ip", b"x-forwarded-for"):
+            return value.split(b",")[0].strip().decode(errors="replace")
+    return peer
+
+
+async def _pipe(reader, writer):
+    try:
+        while data := await reader.read(65536):
+            writer.write(data)
+            await writer.drain()
+    except ConnectionError:
+        pass
+    finally:
+        writer.close()
+
+
+def make_handler(ports):
+    async def handle(client_reader, client_writer):
+        head = b""
+        while b"\r\n\r\n" not in head and len(head) < HEADER_LIMIT:
+            chunk = await client_reader.read(4096)
+            if not chunk:
+                break
+            head += chunk
+        peer = client_writer.get_extra_info("peername")[0]
+        port = ports[zlib.crc32(_client_key(head, peer).encode()) % len(ports)]
+        try:
+            upstream_reader, upstream_writer = await asyncio.open_connection("127.0.0.1", port)
+        except OSError:
+            client_writer.close()
+            return
+        upstream_writer.write(head)
+        await asyncio.gather(
+            _pipe(client_reader, upstream_writer),
+            _pipe(upstream_reader, client_writer),
+        )
+    return handle
+
+
+async def _serve(port: int, worker_ports):
+    server = await asyncio.start_server(make_handler(worker_ports), "0.0.0.0", port)
+    async with server:
+        await server.serve_forever()
+
+
+def main(script: str = "app.py"):
+    port = int(os.environ.get("PORT", 8501))
+    workers = max(config.WEB_CONCURRENCY, 1)
+    if workers > 1 and os.path.basename(script) in SINGLE_PROCESS_APPS:
+        sys.exit(f"{script} keeps its data in one process; run it with WEB_CONCURRENCY=1")
+    if workers == 1:
+        os.execvp(sys.executable, streamlit_command(script, port, "0.0.0.0"))
+    worker_ports = [port + 1 + i for i in range(workers)]
+    procs = [subprocess.Popen(streamlit_command(script, p, "127.0.0.1")) for p in worker_ports]
+
+    def stop(*_):
+        for proc in procs:
+            proc.terminate()
+        sys.exit(0)
+
+    signal.signal(signal.SIGTERM, stop)
+    try:
+        asyncio.run(_serve(port, worker_ports))
+    finally:
+        stop()
+
+
+if __name__ == "__main__":
+    main(*sys.argv[1:2])
@@ -0,0 +1,106 @@
+# shared_cache.py
+"""Cache shared by every app worker on a machine, stored in one SQLite file.
+
+The interface mirrors the handful of Redis commands we need (``get``, ``set``,
+``incr``, ``delete`` and ``add`` for SET NX) so a Redis client wrapper can
+stand in for multi-machine deployments.  Entries are grouped into namespaces with a version counter: a
+writer on any worker calls ``bump(namespace)`` and every worker's next
+``cached`` lookup misses, because the version is part of the key.  Only one
+worker recomputes a missed entry; the others keep serving the previous value
+until it is ready.
+"""
+
+import json
+import sqlite3
+import threading
+import time
+
+import config
+
+
+class SharedCache:
+    def __init__(self, path: str = None):
+        self.path = path or config.SHARED_CACHE_PATH
+        self._local = threading.local()
+        self._conn().execute(
+            "CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value TEXT, expires REAL)"
+        )
+
+    def _conn(self) -> sqlite3.Connection:
+        # sqlite3 connections can't be shared across Streamlit's script threads
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str):
+        row = self._conn().execute("SELECT value, expires FROM cache WHERE key = ?", (key,)).fetchone()
+        if row is None or (row[1] is not None and row[1] < time.time()):
+            return None
+        return json.loads(row[0])
+
+    def set(self, key: str, value, ttl: float = None):
+        expires = time.time() + ttl if ttl else None
+        self._conn().execute(
+            "INSERT OR REPLACE INTO cache (key, value, expires) VALUES (?, ?, ?)",
+            (key, json.dumps(value), expires),
+        )
+
+    def add(self, key: str, value, ttl: float = None) -> bool:
+        """Set ``key`` only if it is absent (or expired); return whether it was set."""
+        conn = self._conn()
+        now = time.time()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("DELETE FROM cache WHERE key = ? AND expires < ?", (key, now))
+            cur = conn.execute(
+                "INSERT OR IGNORE INTO cache (key, value, expires) VALUES (?, ?, ?)",
+                (key, json.dumps(value), now + ttl if ttl else None),
+            )
+            return cur.rowcount == 1
+
+    def delete(self, key: str):
+        self._conn().execute("DELETE FROM cache WHERE key = ?", (key,))
+
+    def incr(self, key: str) -> int:
+        conn = self._conn()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(
+                "INSERT INTO cache (key, value) VALUES (?, '1') "
+                "ON CONFLICT(key) DO UPDATE SET value = CAST(value AS INTEGER) + 1",
+                (key,),
+            )
+            return int(conn.execute("SELECT value FROM cache WHERE key = ?", (key,)).fetchone()[0])
+
+    def version(self, namespace: str) -> int:
+        return self.get(f"version:{namespace}") or 0
+
+    def bump(self, namespace: str) -> int:
+        """Invalidate every entry in ``namespace`` on all workers."""
+        new_version = self.incr(f"version:{namespace}")
+        self._conn().execute(
+            "DELETE FROM cache WHERE key LIKE ? AND key NOT LIKE ?",
+            (f"{namespace}:v%", f"{namespace}:v{new_version}:%"),
+        )
+        return new_version
+
+    def cached(self, namespace: str, key: str, compute, ttl: float = None, lock_ttl: float = 30):
+        """Return ``compute()`` memoized under the namespace's current version."""
+        full_key = f"{namespace}:v{self.version(namespace)}:{key}"
+        value = self.get(full_key)
+        if value is not None:
+            return value
+        stale_key = f"{namespace}:stale:{key}"
+        if not self.add(f"lock:{full_key}", 1, lock_ttl):
+            stale = self.get(stale_key)
+            if stale is not None:
+                return stale
+        value = compute()
+        self.set(full_key, value, ttl)
+        self.set(stale_key, value)
+        self.delete(f"lock:{full_key}")
+        return value
@@ -0,0 +1,254 @@
+# stats.py
+"""Compliance, streak and leaderboard calculations for the SQLAlchemy app."""
+
+import heapq
+from datetime import date, timedelta
+from itertools import groupby
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import Date, func
+
+import config
+from db import User, Goal, GoalHistory, Log, DailyRollup, ExcusedPeriod, stream_query
+from excused import Intervals, masks
+from weekly import WeeklyEngine, compliance_pct, skip_run
+
+DAILY_ACTIVITIES = ["Sleep", "Meditation", "Anki", "Journaling", "Reading"]
+WEEKLY_ACTIVITIES = ["Running", "Walking", "Cycling", "Strength Training", "Yoga"]
+# The main streak needs Sleep and Anki every day and the Running goal each week
+MAIN_STREAK_ACTIVITIES = ["Sleep", "Anki", "Running"]
+_MAIN_STREAK_SPLIT = ([0, 1], [2])
+BOARD_BATCH_USERS = config.BOARD_BATCH_USERS
+
+
+def compact_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """Categorical ``activity`` and float32 ``value``/``distance``: a fraction of the memory."""
+    df["activity"] = df["activity"].astype("category")
+    for col in ("value", "distance"):
+        if col in df:
+            df[col] = df[col].astype(np.float32)
+    return df
+
+
+def logs_frame(logs) -> pd.DataFrame:
+    """Turn ``Log`` rows into the DataFrame used by the dashboard and charts.
+
+    Compact dtypes (``compact_frame``) with ``config.MEMORY_BUDGET``.
+    """
+    df = pd.DataFrame(
+        [(log.timestamp, log.activity, log.value, log.distance) for log in logs],
+        columns=["timestamp", "activity", "value", "distance"],
+    )
+    return compact_frame(df) if config.MEMORY_BUDGET else df
+
+
+def _log_day():
+    # date() works on SQLite and PostgreSQL; type_ turns SQLite's string into a date
+    return func.date(Log.timestamp, type_=Date)
+
+
+def daily_totals(db_session, user_id: int) -> pd.DataFrame:
+    """One row per day and activity with its total, summed in SQL over hot logs and rollups.
+
+    ``user_stats`` and ``main_streak`` only look at daily totals, so this
+    stands in for ``logs_frame(user_history(...))`` without loading every log.
+    """
+    day = _log_day()
+    hot = (
+        db_session.query(day, Log.activity, func.sum(Log.value))
+        .filter(Log.user_id == user_id)
+        .group_by(day, Log.activity)
+    )
+    rollups = db_session.query(DailyRollup.day, DailyRollup.activity, DailyRollup.total).filter(
+        DailyRollup.user_id == user_id
+    )
+    df = pd.DataFrame(list(rollups) + list(hot), columns=["timestamp", "activity", "value"])
+    df["timestamp"] = pd.to_datetime(df["timestamp"])
+    return compact_frame(df)
+
+
+class UserGoals:
+    """One user's goal targets, current and historical.
+
+    ``history`` maps an activity to ``[(effective_from, target), ...]`` sorted
+    by date (``GoalHistory`` rows); activities without history use their
+    current target for every day.
+    """
+
+    def __init__(self, current: dict, history: dict = None):
+        self.current = current
+        self.history = history or {}
+
+    def target(self, activity: str) -> float:
+        return self.current.get(activity, 0)
+
+    def schedule(self, activities, end: date, n_days: int) -> np.ndarray:
+        """Target in force on each of the ``n_days`` days up to ``end``, most recent first."""
+        days = end.toordinal() - np.arange(n_days)
+        out = np.empty((len(activities), n_days))
+        for i, act in enumerate(activities):
+            rows = self.history.get(act)
+            if not rows:
+                out[i] = self.target(act)
+                continue
+            starts = np.array([d.toordinal() for d, _ in rows])
+            targets = np.array([t for _, t in rows])
+            out[i] = targets[np.maximum(np.searchsorted(starts, days, side="right") - 1, 0)]
+        return out
+
+
+def load_goals(db_session, user_ids=None) -> dict:
+    """``{user_id: UserGoals}`` for ``user_ids`` (all users if ``None``) in two queries."""
+    goals = db_session.query(Goal.user_id, Goal.activity, Goal.target)
+    history = db_session.query(GoalHistory.user_id, GoalHistory.activity, GoalHistory.effective_from, GoalHistory.target)
+    if user_ids is not None:
+        goals = goals.filter(Goal.user_id.in_(user_ids))
+        history = history.filter(GoalHistory.user_id.in_(user_ids))
+    result = {uid: UserGoals({}) for uid in user_ids or ()}
+    for uid, activity, target in goals:
+        result.setdefault(uid, UserGoals({})).current[activity] = target
+    for uid, activity, day, target in history.order_by(GoalHistory.effective_from):
+        result.setdefault(uid, UserGoals({})).history.setdefault(activity, []).append((day, target))
+    return result
+
+
+def load_excused(db_session, user_ids=None) -> dict:
+    """``{user_id: Intervals}`` of excused days for ``user_ids`` (all users if ``None``)."""
+    query = db_session.query(ExcusedPeriod.user_id, ExcusedPeriod.start_date, ExcusedPeriod.end_date)
+    if user_ids is not None:
+        query = query.filter(ExcusedPeriod.user_id.in_(user_ids))
+    result = {uid: Intervals() for uid in user_ids or ()}
+    for uid, start, end in query:
+        result.setdefault(uid, Intervals()).add(start, end)
+    return result
+
+
+def main_streak(df_logs: pd.DataFrame, goals: UserGoals, today: date, excused: Intervals = None) -> int:
+    """Consecutive days ending ``today`` meeting Sleep+Anki daily and Running weekly.
+
+    Excused days are skipped: they neither break nor extend the streak.
+    """
+    if df_logs.empty:
+        return 0
+    engine, _ = WeeklyEngine.from_frame(df_logs, MAIN_STREAK_ACTIVITIES, today)
+    n_days = engine.end - engine.start + 1
+    schedule = goals.schedule(MAIN_STREAK_ACTIVITIES, today, n_days)
+    return int(engine.main_streaks(schedule[None], *_MAIN_STREAK_SPLIT, excused=masks([excused], today, n_days))[0])
+
+
+def user_stats(df_logs: pd.DataFrame, goals: UserGoals, today: date, excused: Intervals = None):
+    """Return ``(compliance, streaks, main_streak)`` for the dashboard.
+
+    Each day (or week, by its last day) is judged against the goal in force
+    then.  Excused days don't count towards compliance or break streaks, and
+    weekly targets shrink by a seventh per excused day in the week.
+    """
+    compliance = {}
+    streaks = {}
+    if df_logs.empty:
+        return compliance, streaks, 0
+    activities = DAILY_ACTIVITIES + WEEKLY_ACTIVITIES
+    engine, _ = WeeklyEngine.from_frame(df_logs, activities, today, start=today - timedelta(days=7 * 12))
+    n_days = engine.end - engine.start + 1
+    schedule = goals.schedule(activities, today, 7 * 11 + 1)
+    n_daily = len(DAILY_ACTIVITIES)
+    excused_days = excused.mask(today, n_days) if excused else np.zeros(n_days, dtype=bool)
+    excused_in_week = engine.excused_weeks(excused_days[None], 12)[0]
+    # Last 7 days for daily goals, last 12 weeks for weekly goals, most recent first
+    daily_met = engine.day_totals(7)[0, :n_daily] >= schedule[:n_daily, :7]
+    weekly_met = engine.weekly_totals(12)[0, n_daily:] >= schedule[n_daily:, ::7] * (1 - excused_in_week / 7)
+    day_counted, week_counted = ~excused_days[:7], excused_in_week < 7
+    for met, runs, counted, acts in (
+        (daily_met, skip_run(daily_met, ~day_counted), day_counted, DAILY_ACTIVITIES),
+        (weekly_met, engine.week_streaks(weekly_met, ~week_counted), week_counted, WEEKLY_ACTIVITIES),
+    ):
+        for i, act in enumerate(acts):
+            compliance[act] = compliance_pct(met[i], counted)
+            streaks[act] = int(runs[i])
+    return compliance, streaks, main_streak(df_logs, goals, today, excused)
+
+
+def _board_batch(batch, goals, today, excused=None):
+    """Main streaks for a batch of ``(user_id, logs)`` in one vectorized pass."""
+    user_codes, act_codes, days, values = [], [], [], []
+    act_index = {act: i for i, act in enumerate(MAIN_STREAK_ACTIVITIES)}
+    for code, (_, u_logs) in enumerate(batch):
+        for log in u_logs:
+            a = act_index.get(log.activity)
+            if a is not None:
+                user_codes.append(code)
+                act_codes.append(a)
+                days.append(log.timestamp.toordinal())
+                values.append(log.value or 0.0)
+    if not days:
+        return dict.fromkeys((uid for uid, _ in batch), 0)
+    engine = WeeklyEngine.from_codes(
+        user_codes, act_codes, days, values, len(batch), len(MAIN_STREAK_ACTIVITIES), today
+    )
+    n_days = engine.end - engine.start + 1
+    empty = UserGoals({})
+    schedules = np.stack([
+        goals.get(uid, empty).schedule(MAIN_STREAK_ACTIVITIES, today, n_days) for uid, _ in batch
+    ])
+    excused_days = masks(((excused or {}).get(uid) for uid, _ in batch), today, n_days)
+    runs = engine.main_streaks(schedules, *_MAIN_STREAK_SPLIT, excused=excused_days)
+    # Users without logs have nothing to streak over, whatever their goals
+    return {uid: int(runs[code]) if u_logs else 0 for code, (uid, u_logs) in enumerate(batch)}
+
+
+def user_main_streaks(db_session, today: date = None, user_ids=None) -> dict:
+    """``{user_id: main streak}`` for ``user_ids`` (all users if ``None``).
+
+    Hot logs and archived daily totals are read in two streamed scans ordered
+    by user and merged; streaks are computed ``BOARD_BATCH_USERS`` users at a
+    time in one vectorized pass, so memory stays bounded.
+    """
+    today = today or date.today()
+    user_ids = list(user_ids) if user_ids is not None else None
+    goals = load_goals(db_session, user_ids)
+    excused = load_excused(db_session, user_ids)
+    # Plain column rows: hydrating full ORM objects dominated the scan
+    rollups = db_session.query(
+        DailyRollup.user_id, DailyRollup.activity, DailyRollup.total.label("value"), DailyRollup.day.label("timestamp")
+    ).filter(DailyRollup.activity.in_(MAIN_STREAK_ACTIVITIES))
+    if config.MEMORY_BUDGET:
+        # One row per user, activity and day instead of one per log
+        day = _log_day()
+        hot = db_session.query(
+            Log.user_id, Log.activity, func.sum(Log.value).label("value"), day.label("timestamp")
+        ).group_by(Log.user_id, Log.activity, day)
+    else:
+        hot = db_session.query(Log.user_id, Log.activity, Log.value, Log.timestamp)
+    hot = hot.filter(Log.activity.in_(MAIN_STREAK_ACTIVITIES))
+    if user_ids is not None:
+        rollups = rollups.filter(DailyRollup.user_id.in_(user_ids))
+        hot = hot.filter(Log.user_id.in_(user_ids))
+    logs = heapq.merge(
+        stream_query(rollups.order_by(DailyRollup.user_id)),
+        stream_query(hot.order_by(Log.user_id)),
+        key=lambda l: l.user_id,
+    )
+    streaks = dict.fromkeys(user_ids or (), 0)
+    batch = []
+    for user_id, u_logs in groupby(logs, key=lambda l: l.user_id):
+        batch.append((user_id, list(u_logs)))
+        if len(batch) >= BOARD_BATCH_USERS:
+            streaks.update(_board_batch(batch, goals, today, excused))
+            batch = []
+    if batch:
+        streaks.update(_board_batch(batch, goals, today, excused))
+    return streaks
+
+
+def main_streak_board(db_session, today: date = None, streaks: dict = None):
+    """Return ``[{"User": ..., "MainStreak": ...}]`` for every user, best first.
+
+    ``streaks`` (from ``user_main_streaks``) skips the log scan, e.g. when a
+    warm-start snapshot already holds them.
+    """
+    users = db_session.query(User.id, User.name, User.email).all()
+    if streaks is None:
+        streaks = user_main_streaks(db_session, today)
+    board = [{"User": name or email, "MainStreak": streaks.get(uid, 0)} for uid, name, email in users]
+    return sorted(board, key=lambda row: row["MainStreak"], reverse=True)
@@ -0,0 +1,25 @@
+# tests/conftest.py
+"""Make the top-level modules importable and keep tests off the real database."""
+
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# config reads the environment on import; db.engine must not open ./habits.db
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+import pytest
+
+
+@pytest.fixture
+def app_db():
+    """A session on ``db.engine`` with a fresh schema, dropped afterwards."""
+    import db
+
+    db.init_db()
+    session = db.SessionLocal()
+    yield session
+    session.close()
+    db.Base.metadata.drop_all(bind=db.engine)
@@ -0,0 +1,46 @@
+# tests/test_backup.py
+import sqlite3
+from datetime import datetime
+
+import pytest
+
+import backup
+from backup import BackupStore
+
+
+@pytest.fixture
+def source(tmp_path):
+    db_path = tmp_path / "habits.db"
+    conn = sqlite3.connect(db_path)
+    conn.execute("create table logs (id integer primary key, activity text)")
+    conn.executemany("insert into logs (activity) values (?)", [("Sleep",)] * 50)
+    conn.commit()
+    conn.close()
+    uploads = tmp_path / "uploads"
+    uploads.mkdir()
+    (uploads / "proof.png").write_bytes(b"not really a png")
+    return str(db_path), str(uploads)
+
+
+def test_back_to_back_snapshots_get_distinct_names(tmp_path, source):
+    store = BackupStore(tmp_path / "backups")
+    first = store.create(*source)
+    second = store.create(*source)
+    assert first != second
+    assert store.list() == [first, second]
+    result = store.verify(second)
+    assert result["counts"]["logs"] == 50
+    assert result["files"] == 1
+
+
+def test_snapshot_name_clash_gets_a_suffix(tmp_path, source, monkeypatch):
+    class FrozenClock(datetime):
+        @classmethod
+        def utcnow(cls):
+            return datetime(2026, 1, 1, 3, 0, 0, 123456)
+
+    monkeypatch.setattr(backup, "datetime", FrozenClock)
+    store = BackupStore(tmp_path / "backups")
+    names = [store.create(*source) for _ in range(3)]
+    assert names == ["20260101T030000123456Z", "20260101T030000123456Z-1", "20260101T030000123456Z-2"]
+    assert store.list() == names
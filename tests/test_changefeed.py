@@ -0,0 +1,60 @@
+# tests/test_changefeed.py
+from datetime import datetime, timedelta
+
+import pytest
+
+from changefeed import ChangeConsumer, latest_seq, read_changes
+from db import ChangeEvent, add_log, create_user, follow_user
+
+
+@pytest.fixture
+def changes(app_db):
+    alice = create_user(app_db, "alice@x.com", "Alice")
+    bob = create_user(app_db, "bob@x.com", "Bob")
+    follow_user(app_db, alice, bob)
+    for day in range(1, 4):
+        add_log(app_db, bob, "Running", 30, datetime(2024, 3, day, 8))
+    return app_db
+
+
+def test_consume_advances_the_checkpoint_and_seek_replays(changes):
+    consumer = ChangeConsumer("test", batch_size=2)
+    seen = []
+
+    assert consumer.consume(changes, seen.extend) == 4
+    assert [c.kind for c in seen] == ["follow.created"] + ["log.created"] * 3
+    assert seen[1].payload["activity"] == "Running"
+    assert consumer.position(changes) == latest_seq(changes)
+    assert consumer.consume(changes, seen.extend) == 0
+
+    consumer.seek(changes, seen[1].seq)
+    assert [c.seq for c in consumer.poll(changes)] == [c.seq for c in seen[2:]]
+    consumer.seek(changes, 0)
+    assert consumer.consume(changes, lambda batch: None, max_batches=1) == 2
+    assert consumer.position(changes) == seen[1].seq
+
+
+def test_failed_handler_leaves_the_checkpoint(changes):
+    consumer = ChangeConsumer("test")
+
+    def fail(batch):
+        raise RuntimeError("downstream unavailable")
+
+    with pytest.raises(RuntimeError):
+        consumer.consume(changes, fail)
+    assert consumer.position(changes) == 0
+    # Consumers are independent
+    assert ChangeConsumer("other").consume(changes, lambda batch: None) == 4
+
+
+def test_reads_stop_at_a_gap_until_it_settles(changes):
+    last = latest_seq(changes)
+    # A transaction that took seq last + 1 hasn't committed (or rolled back)
+    changes.add(ChangeEvent(seq=last + 2, kind="log.cheered", user_id=1, created_at=datetime.utcnow()))
+    changes.commit()
+
+    assert [c.seq for c in read_changes(changes, last - 1, settle_seconds=60)] == [last]
+    changes.query(ChangeEvent).filter_by(seq=last + 2).update(
+        {ChangeEvent.created_at: datetime.utcnow() - timedelta(seconds=120)}
+    )
+    assert [c.seq for c in read_changes(changes, last - 1, settle_seconds=60)] == [last, last + 2]
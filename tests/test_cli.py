@@ -0,0 +1,78 @@
+# tests/test_cli.py
+import csv
+from datetime import date
+
+import pytest
+
+import cli
+import db_utils
+
+pytestmark = pytest.mark.skipif(db_utils._USING_REPLIT, reason="needs the local JSON store")
+
+ROWS = [
+    ("alice", "2024-03-01", "Sleep", "8", ""),
+    ("alice", "2024-03-02", "Sleep", "6", ""),
+    ("alice", "2024-03-03", "Sleep", "7.5", "uploads/a.png"),
+    ("bob", "2024-03-01", "Yoga", "30", ""),
+]
+
+
+@pytest.fixture(autouse=True)
+def local_store(tmp_path, monkeypatch):
+    monkeypatch.setattr(db_utils, "_DATA_FILE", tmp_path / "habits_local.json")
+    monkeypatch.setattr(db_utils, "db", db_utils._LocalDB({}))
+    return db_utils.db
+
+
+def run(*argv):
+    args = cli.build_parser().parse_args(argv)
+    return args.func(args)
+
+
+def write_csv(path, rows, header=cli.CSV_FIELDS):
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(header)
+        writer.writerows(rows)
+    return str(path)
+
+
+def test_log_persists_once_and_export_round_trips(tmp_path, local_store, monkeypatch, capsys):
+    writes = []
+    replace = db_utils.os.replace
+    monkeypatch.setattr(db_utils.os, "replace", lambda src, dst: (writes.append(dst), replace(src, dst)))
+    # A bad row is skipped, not fatal
+    src = write_csv(tmp_path / "in.csv", ROWS + [("alice", "not a date", "Sleep", "1", "")])
+
+    assert run("log", "--file", src) == 0
+    assert writes == [db_utils._DATA_FILE]
+    assert "Logged 4 entries for 2 users" in capsys.readouterr().out
+
+    out = tmp_path / "out.csv"
+    assert run("export", "--user", "alice", "--output", str(out)) == 0
+    with open(out, newline="") as f:
+        exported = [(r["user_id"], r["date"], r["habit"], float(r["value"]), r["proof"]) for r in csv.DictReader(f)]
+    assert exported == [(u, d, h, float(v), p) for u, d, h, v, p in ROWS if u == "alice"]
+
+
+def test_report_counts_goal_days_and_streak(tmp_path):
+    db_utils.add_user_habit("alice", "Sleep", 7)
+    run("log", "--file", write_csv(tmp_path / "in.csv", ROWS))
+
+    [row] = cli.summarize("alice", "2024-03-01", "2024-03-03")
+
+    assert row["habit"] == "Sleep" and row["total"] == 21.5
+    assert (row["days_logged"], row["days_met"], row["streak"]) == (3, 2, 1)
+    assert row["compliance"] == round(2 / 3 * 100, 1)
+
+
+def test_excused_day_doesnt_break_the_report_streak(tmp_path):
+    db_utils.add_user_habit("alice", "Sleep", 7)
+    run("log", "--file", write_csv(tmp_path / "in.csv", ROWS[:1] + ROWS[2:3]))
+    run("excuse", "--user", "alice", "--start", "2024-03-02")
+
+    [row] = cli.summarize("alice", "2024-03-01", "2024-03-03")
+
+    assert row["streak"] == 2
+    assert row["compliance"] == 100.0
+    assert db_utils.get_user_excused("alice")[0]["start"] == date(2024, 3, 2).isoformat()
@@ -0,0 +1,81 @@
+# tests/test_db_engine.py
+"""``db.make_engine`` and ``db.stream_query`` on SQLite, and on PostgreSQL when
+``TEST_POSTGRES_URL`` points at a throwaway database."""
+
+import os
+import threading
+
+import pytest
+from sqlalchemy.orm import sessionmaker
+
+import config
+from db import Base, User, make_engine, stream_query
+
+TEST_POSTGRES_URL = os.environ.get("TEST_POSTGRES_URL", "")
+
+
+@pytest.fixture(params=["sqlite", "postgresql"])
+def engine(request, tmp_path):
+    if request.param == "sqlite":
+        url = f"sqlite:///{tmp_path / 'test.db'}"
+    elif TEST_POSTGRES_URL:
+        url = TEST_POSTGRES_URL
+    else:
+        pytest.skip("TEST_POSTGRES_URL is not set")
+    engine = make_engine(url)
+    Base.metadata.create_all(bind=engine)
+    yield engine
+    Base.metadata.drop_all(bind=engine)
+    engine.dispose()
+
+
+@pytest.fixture
+def db_session(engine):
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+
+
+def test_make_engine_pools_server_connections(engine):
+    if engine.dialect.name == "sqlite":
+        pytest.skip("SQLite keeps SQLAlchemy's default pool")
+    assert engine.pool.size() == config.DB_POOL_SIZE
+    assert engine.pool._max_overflow == config.DB_MAX_OVERFLOW
+    assert engine.pool._recycle == config.DB_POOL_RECYCLE
+    assert engine.pool._pre_ping
+
+
+def test_sqlite_engine_allows_other_threads(tmp_path):
+    # Streamlit reruns and job workers use connections from other threads
+    engine = make_engine(f"sqlite:///{tmp_path / 'threads.db'}")
+    conn = engine.raw_connection()
+    errors = []
+
+    def use():
+        try:
+            conn.cursor().execute("select 1")
+        except Exception as exc:
+            errors.append(exc)
+
+    thread = threading.Thread(target=use)
+    thread.start()
+    thread.join()
+    conn.close()
+    assert errors == []
+
+
+def test_stream_query_yields_every_row_in_batches(db_session):
+    db_session.add_all(User(email=f"u{i}@x.com", hashed_password="") for i in range(25))
+    db_session.commit()
+
+    query = db_session.query(User.email).order_by(User.id)
+    streamed = stream_query(query, batch_size=4)
+
+    assert streamed.load_options._yield_per == 4
+    assert [email for email, in streamed] == [f"u{i}@x.com" for i in range(25)]
+
+
+def test_stream_query_defaults_to_configured_batch(db_session):
+    query = stream_query(db_session.query(User))
+    assert query.load_options._yield_per == config.DB_STREAM_BATCH
+    assert query.all() == []
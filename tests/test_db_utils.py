@@ -0,0 +1,96 @@
+# tests/test_db_utils.py
+import pytest
+
+import db_utils
+
+pytestmark = pytest.mark.skipif(db_utils._USING_REPLIT, reason="needs the local JSON store")
+
+
+@pytest.fixture(autouse=True)
+def local_store(tmp_path, monkeypatch):
+    monkeypatch.setattr(db_utils, "_DATA_FILE", tmp_path / "habits_local.json")
+    monkeypatch.setattr(db_utils, "db", db_utils._LocalDB({}))
+    return db_utils.db
+
+
+def test_user_index_rebuild_matches_incremental_updates():
+    db_utils.update_user_name("alice", "Alice")
+    db_utils.log_habit("alice", "Sleep", 8, "2024-03-01")
+    # cli.py log writes logs for ids that have no profile
+    db_utils.log_habits([("bob", "Sleep", 7, "2024-03-01", None), ("bob", "Yoga", 30, "2024-03-01", None)])
+
+    assert db_utils.rebuild_user_index() == {"alice": {"name": "Alice", "logs": 1}}
+
+    db_utils.log_habit("alice", "Yoga", 20, "2024-03-02")
+    db_utils.log_habit("alice", "Yoga", 25, "2024-03-02")  # overwrites, not a new log
+    db_utils.log_habit("bob", "Reading", 10, "2024-03-02")
+    incremental = db_utils.get_user_index()
+    assert incremental == {"alice": {"name": "Alice", "logs": 2}}
+    assert db_utils.rebuild_user_index() == incremental
+
+    # A profile makes bob a member, with the logs he already had
+    db_utils.update_user_name("bob", "Bob")
+    incremental = db_utils.get_user_index()
+    assert incremental["bob"] == {"name": "Bob", "logs": 3}
+    db_utils.log_habits([("bob", "Sleep", 8, "2024-03-03", None)])
+    assert db_utils.get_user_index()["bob"]["logs"] == 4
+    assert db_utils.rebuild_user_index() == db_utils.get_user_index()
+
+
+def test_user_index_is_built_on_first_read():
+    db_utils.update_user_name("carol", "Carol")
+    db_utils.log_habit("carol", "Sleep", 8, "2024-03-01")
+    del db_utils.db["index:users"]
+    assert db_utils.list_user_ids() == ["carol"]
+    assert db_utils.get_user_index()["carol"]["logs"] == 1
+
+
+def test_local_store_writes_the_file_whole(local_store):
+    db_utils.update_user_name("dave", "Dave")
+    with db_utils.batched():
+        db_utils.log_habit("dave", "Sleep", 8, "2024-03-01")
+        # Nothing is written until the batch ends
+        assert "user:dave:logs:2024-03" not in db_utils.json.loads(db_utils._DATA_FILE.read_text())
+
+    assert db_utils.json.loads(db_utils._DATA_FILE.read_text()) == local_store
+    # The temp file was renamed over the store, not left behind
+    assert [p.name for p in db_utils._DATA_FILE.parent.iterdir()] == [db_utils._DATA_FILE.name]
+
+
+def test_latest_record_follows_log_habit():
+    db_utils.log_habit("erin", "Sleep", 8, "2024-03-02")
+    db_utils.log_habit("erin", "Yoga", {"min": 30}, "2024-03-02")
+    assert db_utils.get_latest_activity("erin") == {"date": "2024-03-02", "habits": {"Sleep": 8, "Yoga": {"min": 30}}}
+
+    # A backfilled earlier day leaves it alone; a later day replaces it
+    db_utils.log_habit("erin", "Sleep", 6, "2024-02-28")
+    assert db_utils.get_latest_activity("erin")["date"] == "2024-03-02"
+    db_utils.log_habit("erin", "Anki", 20, "2024-03-05")
+    assert db_utils.get_latest_activity("erin") == {"date": "2024-03-05", "habits": {"Anki": 20}}
+
+
+def test_latest_record_follows_log_habits():
+    db_utils.log_habits([
+        ("erin", "Sleep", 8, "2024-03-02", None),
+        ("erin", "Sleep", 7, "2024-04-01", "uploads/p.png"),
+        ("erin", "Yoga", 30, "2024-04-01", None),
+        ("frank", "Anki", 10, "2024-03-09", None),
+    ])
+
+    assert db_utils.get_latest_activities(["erin", "frank", "nobody"]) == {
+        "erin": {"date": "2024-04-01", "habits": {"Sleep": 7, "Yoga": 30}},
+        "frank": {"date": "2024-03-09", "habits": {"Anki": 10}},
+        "nobody": None,
+    }
+
+
+def test_latest_record_is_built_for_users_logged_before_it_existed(local_store):
+    db_utils.log_habit("gina", "Sleep", 8, "2024-02-10")
+    db_utils.log_habit("gina", "Sleep", 7, "2024-03-01")
+    db_utils.log_habit("gina", "Yoga", 30, "2024-03-01")
+    del local_store["user:gina:latest"]
+
+    assert db_utils.get_latest_activities(["gina"])["gina"] == {"date": "2024-03-01", "habits": {"Sleep": 7, "Yoga": 30}}
+    assert "user:gina:latest" in local_store
+    db_utils.log_habit("gina", "Anki", 5, "2024-03-01")
+    assert local_store["user:gina:latest"]["habits"] == {"Sleep": 7, "Yoga": 30, "Anki": 5}
@@ -0,0 +1,83 @@
+# tests/test_excused.py
+from datetime import date
+
+import numpy as np
+import pytest
+
+from excused import Intervals, masks
+
+
+def ranges(intervals):
+    return list(zip(intervals.starts, intervals.ends))
+
+
+def test_add_merges_overlapping_ranges():
+    iv = Intervals([(1, 5), (3, 8)])
+    assert ranges(iv) == [(1, 8)]
+
+
+def test_add_merges_adjacent_ranges():
+    iv = Intervals([(1, 5), (6, 9)])
+    assert ranges(iv) == [(1, 9)]
+
+
+def test_add_keeps_ranges_a_day_apart():
+    iv = Intervals([(7, 9), (1, 5)])
+    assert ranges(iv) == [(1, 5), (7, 9)]
+
+
+def test_add_bridges_several_ranges():
+    iv = Intervals([(1, 2), (5, 6), (9, 10), (20, 21)])
+    iv.add(3, 8)
+    assert ranges(iv) == [(1, 10), (20, 21)]
+
+
+def test_add_inside_existing_range_changes_nothing():
+    iv = Intervals([(1, 10)])
+    iv.add(4, 6)
+    assert ranges(iv) == [(1, 10)]
+
+
+def test_add_rejects_reversed_range():
+    with pytest.raises(ValueError):
+        Intervals().add(5, 4)
+
+
+def test_add_accepts_dates_iso_strings_and_ordinals():
+    iv = Intervals([(date(2024, 2, 28), "2024-03-01")])
+    assert ranges(iv) == [(date(2024, 2, 28).toordinal(), date(2024, 3, 1).toordinal())]
+    assert date(2024, 2, 29) in iv
+    assert "2024-03-02" not in iv
+    assert date(2024, 2, 28).toordinal() in iv
+
+
+def test_from_records_reads_json_store_layout():
+    iv = Intervals.from_records([
+        {"start": "2023-12-30", "end": "2024-01-02", "reason": "Travel"},
+        {"start": "2024-01-03", "end": "2024-01-03", "reason": "Sick"},
+    ])
+    assert list(iv) == [(date(2023, 12, 30), date(2024, 1, 3))]
+    assert len(Intervals.from_records(None)) == 0
+
+
+def test_mask_is_most_recent_first():
+    iv = Intervals([(8, 9)])
+    # Days 10, 9, ..., 1
+    assert iv.mask(10, 10).tolist() == [False, True, True] + [False] * 7
+
+
+def test_mask_clips_ranges_at_both_window_edges():
+    iv = Intervals([(1, 4), (9, 15)])
+    # Window is days 3..10: 3 and 4 from the first range, 9 and 10 from the second
+    assert np.flatnonzero(iv.mask(10, 8)).tolist() == [0, 1, 6, 7]
+
+
+def test_mask_ignores_ranges_outside_window():
+    iv = Intervals([(1, 2), (20, 30)])
+    assert not iv.mask(10, 5).any()
+
+
+def test_masks_stacks_users_and_skips_when_none_excused():
+    assert masks([None, Intervals()], 10, 3) is None
+    stacked = masks([None, Intervals([(10, 10)])], 10, 3)
+    assert stacked.tolist() == [[False, False, False], [True, False, False]]
@@ -0,0 +1,87 @@
+# tests/test_images.py
+import io
+
+import pytest
+from PIL import Image, ImageChops, PngImagePlugin
+
+import images
+
+
+def exif_with_gps(orientation=1):
+    exif = Image.Exif()
+    exif[0x0112] = orientation
+    exif[0x010F] = "PhoneMaker"
+    exif.get_ifd(0x8825)[2] = (51.0, 30.0, 0.0)  # GPS latitude
+    return exif
+
+
+def photo(fmt, **params):
+    img = Image.new("RGB", (64, 48))
+    img.putdata([(x * 4, y * 5, (x * y) % 256) for y in range(48) for x in range(64)])
+    buf = io.BytesIO()
+    img.save(buf, fmt, **params)
+    return buf.getvalue()
+
+
+def strip(tmp_path, name, data):
+    path = tmp_path / name
+    path.write_bytes(data)
+    with Image.open(path) as src:
+        src.load()
+        before = src.copy()
+    size = images._strip_original(path, Image.open(path))
+    assert size == path.stat().st_size <= len(data)
+    return before, Image.open(path)
+
+
+@pytest.mark.parametrize("progressive", [False, True])
+def test_jpeg_is_stripped_without_reencoding(tmp_path, progressive):
+    data = photo("JPEG", quality=90, progressive=progressive, exif=exif_with_gps(), comment=b"serial 1234")
+    before, after = strip(tmp_path, "a.jpg", data)
+
+    assert not after.getexif() and "comment" not in after.info
+    assert ImageChops.difference(before, after.convert("RGB")).getbbox() is None
+    assert b"PhoneMaker" not in (tmp_path / "a.jpg").read_bytes()
+
+
+def test_jpeg_keeps_only_its_orientation(tmp_path):
+    _, after = strip(tmp_path, "a.jpg", photo("JPEG", exif=exif_with_gps(orientation=6)))
+
+    assert dict(after.getexif()) == {0x0112: 6}
+    assert images._has_metadata(after)  # orientation alone still counts, so renditions rotate
+
+
+def test_mpo_keeps_only_the_first_frame(tmp_path):
+    data = photo("JPEG", exif=exif_with_gps())
+    # An MPO is the primary JPEG with further JPEGs (depth maps) appended
+    _, after = strip(tmp_path, "a.jpg", data + photo("JPEG"))
+
+    assert (tmp_path / "a.jpg").read_bytes().endswith(b"\xff\xd9")
+    after.load()
+
+
+def test_png_drops_text_chunks(tmp_path):
+    info = PngImagePlugin.PngInfo()
+    info.add_text("Comment", "taken at home")
+    before, after = strip(tmp_path, "a.png", photo("PNG", pnginfo=info, exif=exif_with_gps()))
+
+    assert not after.text and not after.getexif()
+    assert ImageChops.difference(before, after).getbbox() is None
+
+
+def test_webp_drops_exif_chunk(tmp_path):
+    before, after = strip(tmp_path, "a.webp", photo("WEBP", quality=80, exif=exif_with_gps()))
+
+    assert not after.getexif()
+    assert ImageChops.difference(before, after.convert("RGB")).getbbox() is None
+
+
+def test_process_image_reports_sizes(tmp_path, monkeypatch):
+    monkeypatch.setattr(images.config, "IMAGE_RENDITIONS", {"thumbs": 16, "display": 32})
+    path = tmp_path / "a.jpg"
+    path.write_bytes(photo("JPEG", exif=exif_with_gps()))
+
+    result = images.process_image(path)
+
+    assert result["stripped_bytes"] == path.stat().st_size < result["original_bytes"]
+    assert 0 < result["display_bytes"] < result["rendition_bytes"]
@@ -0,0 +1,39 @@
+# tests/test_jobs.py
+import time
+
+import pytest
+
+import jobs
+
+
+@pytest.fixture
+def queue(tmp_path, monkeypatch):
+    monkeypatch.setitem(jobs.HANDLERS, "noop", lambda payload: None)
+    return jobs.JobQueue(str(tmp_path / "jobs.db"))
+
+
+def expire_leases(queue):
+    queue._conn().execute("UPDATE jobs SET run_at = ? WHERE status = 'running'", (time.time() - 1,))
+
+
+def status(queue, job_id):
+    return queue._conn().execute("SELECT status, attempts FROM jobs WHERE id = ?", (job_id,)).fetchone()
+
+
+def test_expired_lease_is_reclaimed_while_attempts_remain(queue):
+    job_id = queue.enqueue("noop", {}, max_attempts=2)
+    assert queue._claim()[0] == job_id
+    expire_leases(queue)
+
+    assert queue.run_one()
+    assert status(queue, job_id) == ("done", 2)
+
+
+def test_expired_lease_past_max_attempts_is_failed_not_reclaimed(queue):
+    job_id = queue.enqueue("noop", {}, max_attempts=1)
+    assert queue._claim()[0] == job_id
+    expire_leases(queue)
+
+    assert not queue.run_one()
+    assert status(queue, job_id) == ("failed", 1)
+    assert queue.metrics()["failed"] == 1
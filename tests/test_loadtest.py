@@ -0,0 +1,36 @@
+# tests/test_loadtest.py
+import random
+
+import pytest
+
+from benchmarks import loadtest
+
+
+def test_seed_rows_are_deterministic_and_keep_core_habits_together():
+    rows = list(loadtest._seed_rows(5, 30, ["Sleep", "Running"], random.Random(7)))
+
+    assert rows == list(loadtest._seed_rows(5, 30, ["Sleep", "Running"], random.Random(7)))
+    assert {u for u, *_ in rows} == set(range(5))
+    core = [(u, at) for u, act, _, at in rows if act == "Sleep"]
+    assert core == [(u, at) for u, act, _, at in rows if act == "Running"]
+    assert {act for _, act, _, _ in rows} - {"Sleep", "Running"} <= set(loadtest.SEED_EXTRAS)
+
+
+def test_last_json_takes_the_final_line_and_reports_stderr_otherwise():
+    # Apps may print while importing; the result is the last line
+    assert loadtest._last_json('noise\n{"seconds": 1.5}\n', "", "seeding") == {"seconds": 1.5}
+    with pytest.raises(RuntimeError, match="seeding app.py failed:\nTraceback"):
+        loadtest._last_json("noise\n", "Traceback ...", "seeding app.py")
+
+
+def test_report_lists_percentiles_per_step(capsys):
+    loadtest.report({
+        "app": "app.py", "sessions": 2, "wall": 1.0, "sql": 30,
+        "steps": {"login": [0.1, 0.2], "feed": [0.3]}, "latency": [0.1, 0.2, 0.3],
+        "peak_rss_mb": 150, "total_rss_mb": 290, "errors": ["KeyError: 'Save'\nTraceback"],
+    })
+    out = capsys.readouterr().out
+
+    assert "3 reruns" in out and "(10.0/rerun)" in out
+    assert "login" in out and "all reruns" in out
+    assert "1 errors" in out and "KeyError: 'Save'" in out and "Traceback" not in out
@@ -0,0 +1,97 @@
+# tests/test_read_api.py
+from datetime import datetime, timedelta
+
+import pytest
+
+import read_api
+from db import add_log, create_user, follow_user
+from rankings import Rankings
+
+
+@pytest.fixture
+def client(app_db, monkeypatch):
+    monkeypatch.setattr(read_api, "_memo", type(read_api._memo)())
+    monkeypatch.setattr(read_api, "_validators", type(read_api._validators)())
+    monkeypatch.setattr(read_api, "_rankings", Rankings())
+    return read_api.TestClient()
+
+
+@pytest.fixture
+def people(app_db):
+    viewer = create_user(app_db, "viewer@x.com", "Viewer")
+    friend = create_user(app_db, "friend@x.com", "Friend")
+    follow_user(app_db, viewer, friend)
+    start = datetime(2024, 3, 1, 8)
+    # Two logs share a timestamp so pagination has to break the tie by id
+    stamps = [start + timedelta(hours=i) for i in range(5)] + [start + timedelta(hours=2)]
+    logs = [add_log(app_db, friend, "Running", 10 + i, ts) for i, ts in enumerate(stamps)]
+    return viewer, friend, logs
+
+
+def test_feed_etag_round_trip(client, people, app_db):
+    viewer, friend, _ = people
+    url = f"/users/{viewer.id}/feed"
+    first = client.get(url)
+    assert first.status_code == 200
+    etag = first.headers["ETag"]
+
+    again = client.get(url, {"If-None-Match": etag})
+    assert again.status_code == 304
+    assert again.body == b""
+    assert again.headers["ETag"] == etag
+
+    add_log(app_db, friend, "Yoga", 30, datetime(2024, 3, 2, 8))
+    changed = client.get(url, {"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["ETag"] != etag
+    assert changed.json()["items"][0]["activity"] == "Yoga"
+
+
+def test_last_modified_moves_with_the_etag_within_a_second(client, people, app_db):
+    viewer, friend, _ = people
+    url = f"/users/{viewer.id}/feed"
+    first = client.get(url)
+    modified = first.headers["Last-Modified"]
+    assert client.get(url, {"If-Modified-Since": modified}).status_code == 304
+
+    # A write in the same second must not be hidden behind If-Modified-Since
+    add_log(app_db, friend, "Yoga", 30, datetime(2024, 3, 2, 8))
+    changed = client.get(url, {"If-Modified-Since": modified})
+    assert changed.status_code == 200
+    assert changed.headers["Last-Modified"] != modified
+    assert client.get(url, {"If-Modified-Since": changed.headers["Last-Modified"]}).status_code == 304
+
+
+def test_feed_pages_through_every_log_once(client, people):
+    viewer, _, logs = people
+    seen, before = [], None
+    while True:
+        url = f"/users/{viewer.id}/feed?limit=2" + (f"&before={before}" if before else "")
+        page = client.get(url).json()
+        seen += [item["id"] for item in page["items"]]
+        before = page["next_before"]
+        if before is None:
+            break
+    by_time = sorted(logs, key=lambda log: (log.timestamp, log.id), reverse=True)
+    assert seen == [log.id for log in by_time]
+
+
+@pytest.mark.parametrize("limit, expected", [("0", 1), ("-5", 1), ("1000", 6)])
+def test_feed_limit_is_clamped(client, people, limit, expected):
+    viewer, _, _ = people
+    response = client.get(f"/users/{viewer.id}/feed?limit={limit}")
+    assert response.status_code == 200
+    assert len(response.json()["items"]) == expected
+
+
+def test_leaderboard_limit_is_clamped(client, people):
+    response = client.get("/leaderboard?activity=Running&window=all&limit=-1")
+    assert response.status_code == 200
+    assert len(response.json()["board"]) == 1
+
+
+def test_bad_parameters_are_400(client, people):
+    viewer, _, _ = people
+    assert client.get(f"/users/{viewer.id}/feed?limit=lots").status_code == 400
+    assert client.get("/leaderboard?activity=Running&window=year").status_code == 400
+    assert client.get("/users/999/feed").status_code == 404
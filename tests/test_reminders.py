@@ -0,0 +1,35 @@
+# tests/test_reminders.py
+from datetime import date, datetime
+
+import pytest
+
+import config
+from reminders import ReminderScheduler, deadline, effective_day
+from stats import UserGoals
+
+DAY = date(2024, 3, 10)
+
+
+@pytest.fixture
+def scheduler(monkeypatch):
+    monkeypatch.setattr(config, "WEEK_BOUNDARY", "rolling")
+    scheduler = ReminderScheduler(notifier=[].append, lead_minutes=180)
+    scheduler.goals[1] = UserGoals({"Sleep": 7, "Anki": 1, "Running": 0})
+    return scheduler
+
+
+def test_days_match_the_streak_rule():
+    # main_streak counts a log at 01:00 for that calendar date
+    assert effective_day(datetime(2024, 3, 10, 1, 0)) == DAY
+    assert deadline(DAY) == datetime(2024, 3, 11, 0, 0)
+
+
+def test_early_morning_log_settles_that_day(scheduler):
+    scheduler.on_log(1, "Sleep", 8, datetime(2024, 3, 10, 1, 0), today=DAY)
+    assert scheduler.missing(1, DAY) == ["Anki"]
+    assert scheduler.due[1][1] == DAY.toordinal()
+
+    scheduler.on_log(1, "Anki", 1, datetime(2024, 3, 10, 1, 5), today=DAY)
+    assert scheduler.missing(1, DAY) == []
+    # Nothing left today: the next reminder is tomorrow's
+    assert scheduler.due[1] == (datetime(2024, 3, 11, 21, 0), DAY.toordinal() + 1)
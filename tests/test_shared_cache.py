@@ -0,0 +1,17 @@
+# tests/test_shared_cache.py
+import shared_cache
+from shared_cache import SharedCache
+
+
+def test_cached_entry_expires_without_a_bump(tmp_path, monkeypatch):
+    # A write the app didn't see (cli.py, archive.py) never bumps the namespace
+    cache = SharedCache(str(tmp_path / "cache.db"))
+    now = [1000.0]
+    monkeypatch.setattr(shared_cache.time, "time", lambda: now[0])
+    board = [[["a@x.com", 3]]]
+
+    assert cache.cached("leaderboard", "day", lambda: board[0], ttl=60) == [["a@x.com", 3]]
+    board[0] = [["a@x.com", 4]]
+    assert cache.cached("leaderboard", "day", lambda: board[0], ttl=60) == [["a@x.com", 3]]
+    now[0] += 61
+    assert cache.cached("leaderboard", "day", lambda: board[0], ttl=60) == [["a@x.com", 4]]
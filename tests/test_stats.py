@@ -0,0 +1,116 @@
+# tests/test_stats.py
+"""Main streaks and dashboard stats over multi-year histories with excused days."""
+
+from datetime import date, timedelta
+
+import pandas as pd
+import pytest
+
+import config
+from excused import Intervals
+from stats import UserGoals, main_streak, user_stats
+
+TODAY = date(2024, 3, 10)
+FIRST_DAY = date(2021, 11, 1)
+HISTORY_DAYS = (TODAY - FIRST_DAY).days + 1
+# Running 2 a day against a weekly goal of 10: the rolling week first reaches
+# it on the fifth day of the history
+WARM_UP_DAYS = 4
+GOALS = UserGoals({"Sleep": 7, "Anki": 1, "Running": 10})
+
+
+@pytest.fixture(autouse=True)
+def rolling_weeks(monkeypatch):
+    monkeypatch.setattr(config, "WEEK_BOUNDARY", "rolling")
+
+
+def history(skip=(), no_sleep=()):
+    """Sleep 8, Anki 1 and Running 2 every day from FIRST_DAY to TODAY.
+
+    ``skip`` days have no logs at all; ``no_sleep`` days lack only Sleep.
+    """
+    rows = []
+    day = FIRST_DAY
+    while day <= TODAY:
+        if day not in skip:
+            ts = pd.Timestamp(day) + pd.Timedelta(hours=12)
+            if day not in no_sleep:
+                rows.append((ts, "Sleep", 8.0))
+            rows.append((ts, "Anki", 1.0))
+            rows.append((ts, "Running", 2.0))
+        day += timedelta(days=1)
+    return pd.DataFrame(rows, columns=["timestamp", "activity", "value"])
+
+
+def days(first: date, last: date) -> set:
+    return {first + timedelta(days=i) for i in range((last - first).days + 1)}
+
+
+def test_main_streak_spans_years():
+    assert main_streak(history(), GOALS, TODAY) == HISTORY_DAYS - WARM_UP_DAYS
+
+
+def test_main_streak_breaks_on_missed_day():
+    missed = date(2023, 6, 15)
+    assert main_streak(history(no_sleep={missed}), GOALS, TODAY) == (TODAY - missed).days
+
+
+def test_main_streak_skips_excused_gap():
+    gap = days(date(2023, 6, 10), date(2023, 6, 20))
+    excused = Intervals([(min(gap), max(gap))])
+    df = history(skip=gap)
+    # Unexcused, the streak restarts after the gap and Running needs its warm-up again
+    assert main_streak(df, GOALS, TODAY) == (TODAY - max(gap)).days - WARM_UP_DAYS
+    # Running's weekly goal shrinks by a seventh per excused day, so the
+    # first days back don't break the streak either
+    assert main_streak(df, GOALS, TODAY, excused) == HISTORY_DAYS - WARM_UP_DAYS - len(gap)
+
+
+def test_main_streak_excused_through_today():
+    away = days(TODAY - timedelta(days=2), TODAY)
+    excused = Intervals([(TODAY - timedelta(days=2), TODAY + timedelta(days=5))])
+    df = history(skip=away)
+    assert main_streak(df, GOALS, TODAY) == 0
+    assert main_streak(df, GOALS, TODAY, excused) == HISTORY_DAYS - WARM_UP_DAYS - len(away)
+
+
+def test_main_streak_excused_across_first_log():
+    excused = Intervals([(FIRST_DAY - timedelta(days=7), FIRST_DAY + timedelta(days=2))])
+    # The first three days are excused; the fourth has 8 of a 10 * 4/7 target
+    assert main_streak(history(), GOALS, TODAY, excused) == HISTORY_DAYS - 3
+
+
+def test_user_stats_excused_at_both_window_edges():
+    # The 12-week window is TODAY-83..TODAY.  One absence straddles its start,
+    # one runs from yesterday past its end.
+    early = days(TODAY - timedelta(days=90), TODAY - timedelta(days=80))
+    late = days(TODAY - timedelta(days=1), TODAY)
+    excused = Intervals([(min(early), max(early)), (min(late), TODAY + timedelta(days=3))])
+    df = history(skip=early | late)
+
+    compliance, streaks, main = user_stats(df, GOALS, TODAY)
+    assert compliance["Sleep"] == round(5 / 7 * 100, 1)
+    assert streaks["Sleep"] == 0
+    # The oldest week has 3 days of Running: 6 < 10
+    assert compliance["Running"] == round(11 / 12 * 100, 1)
+    assert streaks["Running"] == 11
+    assert main == 0
+
+    compliance, streaks, main = user_stats(df, GOALS, TODAY, excused)
+    assert compliance["Sleep"] == 100.0
+    assert streaks["Sleep"] == 5
+    # Four of the oldest week's days are excused: 6 >= 10 * 3/7
+    assert compliance["Running"] == 100.0
+    assert streaks["Running"] == 12
+    assert main == HISTORY_DAYS - WARM_UP_DAYS - len(early) - len(late)
+
+
+def test_user_stats_whole_week_excused():
+    away = days(TODAY - timedelta(days=6), TODAY)
+    excused = Intervals([(min(away), max(away))])
+    compliance, streaks, main = user_stats(history(skip=away), GOALS, TODAY, excused)
+    # Nothing left to judge this week is no miss
+    assert compliance["Sleep"] == 100.0
+    assert compliance["Running"] == 100.0
+    assert streaks["Running"] == 11
+    assert main == HISTORY_DAYS - WARM_UP_DAYS - len(away)
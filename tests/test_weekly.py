@@ -0,0 +1,43 @@
+# tests/test_weekly.py
+import numpy as np
+
+from weekly import compliance_pct, leading_run, skip_run
+
+
+def test_skip_run_without_skips_is_leading_run():
+    ok = np.array([True, True, False, True])
+    assert skip_run(ok, np.zeros(4, dtype=bool)) == leading_run(ok) == 2
+
+
+def test_skip_run_excused_day_neither_breaks_nor_counts():
+    ok = np.array([True, False, True, True, False])
+    skip = np.array([False, True, False, False, False])
+    assert skip_run(ok, skip) == 3
+
+
+def test_skip_run_with_leading_excused_days():
+    ok = np.array([False, False, True, False])
+    skip = np.array([True, True, False, False])
+    assert skip_run(ok, skip) == 1
+
+
+def test_skip_run_all_excused_is_zero():
+    ok = np.array([False, True, False])
+    assert skip_run(ok, np.ones(3, dtype=bool)) == 0
+
+
+def test_skip_run_per_row():
+    ok = np.array([[True, False, True], [False, True, True]])
+    skip = np.array([[False, True, False], [False, False, False]])
+    assert skip_run(ok, skip).tolist() == [2, 0]
+
+
+def test_compliance_pct_leaves_out_excused_days():
+    met = np.array([True, False, True, True])
+    assert compliance_pct(met) == 75.0
+    assert compliance_pct(met, np.array([True, False, True, True])) == 100.0
+
+
+def test_compliance_pct_with_everything_excused_is_full():
+    met = np.array([False, False])
+    assert compliance_pct(met, np.zeros(2, dtype=bool)) == 100.0
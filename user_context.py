@@ -0,0 +1,75 @@
+# user_context.py
+"""The logged-in user of a Streamlit session, loaded once and reused across reruns.
+
+Every rerun used to fetch the ``User`` row by email and then lazy-load
+``goals`` and ``following``, i.e. three queries before anything was drawn.
+``current_user`` keeps a detached ``UserContext`` (id, email, name, goals,
+followed ids) in the session state instead.  Each rerun reads only the user's
+``user_versions`` row, which every write path bumps (logs, goal edits,
+follows, excused days, cheers), and reloads the context with eager loads when
+the version has moved.
+
+``UserContext`` is read-only.  Writes still go through ``db.py``.  When a
+write needs the ORM object (``follow_user``), load it with
+``db_session.get(User, ctx.id)``.
+"""
+
+from collections import namedtuple
+
+from sqlalchemy.orm import selectinload
+
+from db import User, UserVersion
+
+UserContext = namedtuple("UserContext", "id email name version goals followed_ids")
+
+_STATE_KEY = "_user_context"
+
+
+def user_version(db_session, user_id: int) -> int:
+    return db_session.query(UserVersion.version).filter_by(user_id=user_id).scalar() or 0
+
+
+def load_user_context(db_session, email: str):
+    """Load ``email``'s context with goals and follows in one round of queries, or ``None``."""
+    # Read the version first: a write landing mid-load then leaves the context
+    # newer than its version, and it is simply reloaded next time
+    version = (
+        db_session.query(UserVersion.version)
+        .join(User, User.id == UserVersion.user_id)
+        .filter(User.email == email)
+        .scalar()
+    ) or 0
+    user = (
+        db_session.query(User)
+        .options(selectinload(User.goals), selectinload(User.following))
+        .filter_by(email=email)
+        .one_or_none()
+    )
+    if user is None:
+        return None
+    return UserContext(
+        id=user.id,
+        email=user.email,
+        name=user.name,
+        version=version,
+        goals={goal.activity: goal.target for goal in user.goals},
+        followed_ids=frozenset(follow.followed_id for follow in user.following),
+    )
+
+
+def current_user(db_session, email: str, state):
+    """The session's ``UserContext`` for ``email``, reloaded only if its version changed.
+
+    ``state`` is ``st.session_state`` (any mutable mapping works).
+    """
+    ctx = state.get(_STATE_KEY)
+    if ctx is not None and ctx.email == email and user_version(db_session, ctx.id) == ctx.version:
+        return ctx
+    ctx = load_user_context(db_session, email)
+    state[_STATE_KEY] = ctx
+    return ctx
+
+
+def forget_user(state):
+    """Drop the cached context, e.g. after a write that doesn't bump the version."""
+    state.pop(_STATE_KEY, None)
@@ -0,0 +1,197 @@
+# weekly.py
+"""Vectorized daily and weekly goal evaluation.
+
+``WeeklyEngine`` holds per-day totals as a ``users x activities x days``
+array and its prefix sums along the day axis, so the total of any day range
+(a trailing 7 days, a calendar week) is a single subtraction.  Every method
+works on all users and activities at once.
+
+Week boundaries are ``"rolling"`` (the 7 days ending on a given day) or
+``"iso"`` (Monday to Sunday; the current week counts up to the end day);
+the default comes from ``config.WEEK_BOUNDARY``.  Days are proleptic
+ordinals (``date.toordinal()``).
+"""
+
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+import config
+
+BOUNDARIES = ("rolling", "iso")
+_UNIX_EPOCH = date(1970, 1, 1).toordinal()
+
+
+def leading_run(ok: np.ndarray) -> np.ndarray:
+    """Length of the run of ``True`` at the start of the last axis."""
+    n = ok.shape[-1]
+    return np.where(ok.all(axis=-1), n, ok.argmin(axis=-1))
+
+
+def skip_run(ok: np.ndarray, skip: np.ndarray) -> np.ndarray:
+    """Like ``leading_run``, but ``skip`` positions neither break the run nor count."""
+    run = leading_run(ok | skip)
+    counted = np.cumsum(ok & ~skip, axis=-1)
+    last = np.take_along_axis(counted, np.maximum(run - 1, 0)[..., None], axis=-1)[..., 0]
+    return np.where(run > 0, last, 0)
+
+
+def compliance_pct(met: np.ndarray, counted: np.ndarray = None) -> float:
+    """Percentage of ``counted`` days (or weeks) that were met; all of them by default."""
+    if counted is not None:
+        met = met[counted]
+    # Nothing to judge (e.g. the whole window excused) is no miss
+    return round(float(met.mean()) * 100, 1) if met.size else 100.0
+
+
+class WeeklyEngine:
+    def __init__(self, daily: np.ndarray, start: int, boundary: str = None):
+        boundary = boundary or config.WEEK_BOUNDARY
+        if boundary not in BOUNDARIES:
+            raise ValueError(f"boundary must be one of {BOUNDARIES}, not {boundary!r}")
+        self.daily = daily
+        self.start = start
+        self.end = start + daily.shape[-1] - 1
+        self.boundary = boundary
+        zeros = np.zeros(daily.shape[:-1] + (1,), dtype=daily.dtype)
+        self.cum = np.concatenate([zeros, np.cumsum(daily, axis=-1)], axis=-1)
+
+    @classmethod
+    def from_codes(cls, users, activities, days, values, n_users: int, n_activities: int,
+                   end: date, start: date = None, boundary: str = None) -> "WeeklyEngine":
+        """Build from parallel arrays of user codes, activity codes, day ordinals and values.
+
+        Rows outside ``[start, end]`` are ignored; ``start`` defaults to the
+        earliest day present.
+        """
+        users = np.asarray(users, dtype=np.int64)
+        activities = np.asarray(activities, dtype=np.int64)
+        days = np.asarray(days, dtype=np.int64)
+        values = np.asarray(values, dtype=np.float64)
+        last = end.toordinal()
+        first = start.toordinal() if start else (int(days.min()) if len(days) else last)
+        first = min(first, last)
+        n_days = last - first + 1
+        keep = (days >= first) & (days <= last) & (activities >= 0) & (users >= 0)
+        flat = ((users[keep] * n_activities + activities[keep]) * n_days) + (days[keep] - first)
+        daily = np.bincount(flat, weights=values[keep], minlength=n_users * n_activities * n_days)
+        return cls(daily.reshape(n_users, n_activities, n_days), first, boundary)
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, activities, end: date, date_col: str = "timestamp",
+                   user_col: str = None, users=None, start: date = None, boundary: str = None):
+        """Build from a logs DataFrame; return ``(engine, users)``.
+
+        Without ``user_col`` all rows belong to one user.  ``users`` fixes the
+        order of the user axis (default: order of first appearance).
+        """
+        days = df[date_col].values.astype("datetime64[D]").astype(np.int64) + _UNIX_EPOCH
+        acts = pd.Categorical(df["activity"], categories=list(activities)).codes
+        if user_col is None:
+            users = [None]
+            codes = np.zeros(len(df), dtype=np.int64)
+        else:
+            users = list(users) if users is not None else list(pd.unique(df[user_col]))
+            codes = pd.Categorical(df[user_col], categories=users).codes
+        engine = cls.from_codes(codes, acts, days, df["value"].to_numpy(dtype=np.float64),
+                                len(users), len(activities), end, start, boundary)
+        return engine, users
+
+    def _range(self, first, last, cum: np.ndarray = None) -> np.ndarray:
+        """Totals over days ``first..last`` (ordinals, inclusive, broadcastable arrays)."""
+        cum = self.cum if cum is None else cum
+        first = np.clip(np.asarray(first) - self.start, 0, self.end - self.start + 1)
+        last = np.clip(np.asarray(last) - self.start + 1, 0, self.end - self.start + 1)
+        return cum[..., last] - cum[..., np.minimum(first, last)]
+
+    def _excused_cum(self, excused: np.ndarray) -> np.ndarray:
+        """Prefix sums of an excused mask given most recent first, like ``cum``."""
+        chrono = np.asarray(excused, dtype=np.int64)[..., ::-1]
+        zeros = np.zeros(chrono.shape[:-1] + (1,), dtype=np.int64)
+        return np.concatenate([zeros, np.cumsum(chrono, axis=-1)], axis=-1)
+
+    def _week_of(self, days: np.ndarray):
+        """First and last day of the week each of ``days`` falls in."""
+        if self.boundary == "iso":
+            first = days - (days - 1) % 7
+            return first, np.minimum(first + 6, self.end)
+        return days - 6, days
+
+    def day_totals(self, count: int) -> np.ndarray:
+        """Totals for the last ``count`` days, most recent first: ``(users, activities, count)``."""
+        days = self.end - np.arange(count)
+        return self._range(days, days)
+
+    def weekly_totals(self, weeks: int) -> np.ndarray:
+        """Totals for the last ``weeks`` weeks, current first: ``(users, activities, weeks)``."""
+        return self._range(*self._week_of(self.end - 7 * np.arange(weeks)))
+
+    def week_by_day(self, count: int = None) -> np.ndarray:
+        """For each of the last ``count`` days (most recent first), its week's total."""
+        days = self.end - np.arange(count if count is not None else self.end - self.start + 1)
+        return self._range(*self._week_of(days))
+
+    def excused_weeks(self, excused: np.ndarray, weeks: int) -> np.ndarray:
+        """Excused days in each of the last ``weeks`` weeks, as ``weekly_totals``.
+
+        ``excused`` is ``(users, days)``, most recent first, covering the
+        engine's whole range.
+        """
+        return self._range(*self._week_of(self.end - 7 * np.arange(weeks)), cum=self._excused_cum(excused))
+
+    def excused_by_day(self, excused: np.ndarray) -> np.ndarray:
+        """For each day (most recent first), the excused days in its week."""
+        days = self.end - np.arange(self.end - self.start + 1)
+        return self._range(*self._week_of(days), cum=self._excused_cum(excused))
+
+    def main_streaks(self, goals: np.ndarray, daily: list, weekly: list, excused: np.ndarray = None) -> np.ndarray:
+        """Consecutive days up to the end day on which every goal was met, per user.
+
+        ``goals`` is ``(users, activities)``, or ``(users, activities, days)``
+        with a target per day most recent first (as ``day_totals``) when goals
+        change over time.  ``daily`` and ``weekly`` are activity indexes
+        checked against the day's and the week's total.  ``excused`` is an
+        optional ``(users, days)`` mask, most recent first: excused days are
+        skipped, and weekly targets shrink by a seventh per excused day.
+        """
+        if goals.ndim == 2:
+            goals = goals[..., None]
+        n_days = self.end - self.start + 1
+        days_back = self.day_totals(n_days)
+        weeks_back = self.week_by_day(n_days)
+        week_goals = goals
+        if excused is not None and weekly:
+            week_goals = goals * (1 - self.excused_by_day(excused)[:, None, :] / 7)
+        ok = np.ones((self.daily.shape[0], n_days), dtype=bool)
+        for a in daily:
+            ok &= days_back[:, a, :] >= goals[:, a, :]
+        week_ok = np.ones_like(ok)
+        for a in weekly:
+            week_ok &= weeks_back[:, a, :] >= week_goals[:, a, :]
+        if self.boundary == "iso" and weekly:
+            # The current week isn't over: until its goal is met, last week's result stands
+            so_far = (self.end - 1) % 7 + 1
+            monday = self.end - so_far + 1
+            last_week = self._range(monday - 7, monday - 1)
+            # Judged against the goal in force on last week's Sunday
+            sunday = min(so_far, week_goals.shape[-1] - 1)
+            last_ok = np.all([last_week[:, a] >= week_goals[:, a, sunday] for a in weekly], axis=0)
+            week_ok[:, :so_far] |= last_ok[:, None]
+        if excused is None:
+            return leading_run(ok & week_ok)
+        return skip_run(ok & week_ok, excused)
+
+    def week_streaks(self, met: np.ndarray, skip: np.ndarray = None) -> np.ndarray:
+        """Runs of met weeks from ``weekly_totals`` order (current first).
+
+        With ISO weeks an unmet current week doesn't break the streak yet.
+        ``skip`` marks weeks (e.g. fully excused ones) that neither break nor
+        count.
+        """
+        if skip is None:
+            skip = np.zeros_like(met)
+        runs = skip_run(met, skip)
+        if self.boundary == "iso":
+            runs = np.where(met[..., 0], runs, skip_run(met[..., 1:], skip[..., 1:]))
+        return runs